@@ -0,0 +1,15 @@
+# Fixtures shared by the regio protocol tests (see pytest.ini).
+import pytest
+
+from proxy_sim import SimRawBlock
+
+@pytest.fixture(params=[False, True], ids=['proxy', 'raw'])
+def raw(request):
+    # Protocol tests taking this fixture run twice: through the regio proxy of the model, and on the
+    # mapped register (reg_mmap) path of the protocol.
+    return request.param
+
+@pytest.fixture
+def as_proxy(raw):
+    # Wraps a behavioural model for the path selected by raw.
+    return SimRawBlock if raw else (lambda sim: sim)
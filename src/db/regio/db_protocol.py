@@ -0,0 +1,292 @@
+__all__ = (
+    'DbProtocol',
+)
+
+import enum
+import os
+import sys
+
+try:
+    from proxy_wait import WaitPolicy
+    from reg_shadow import RegShadow
+    from reg_window import RegWindow
+except ImportError:
+    # Callers with only this directory on the module search path: add the shared protocol modules
+    # (src/reg/proxy/regio) from their location in the repository.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(here, '..', '..', 'reg', 'proxy', 'regio'))
+    from proxy_wait import WaitPolicy
+    from reg_shadow import RegShadow
+    from reg_window import RegWindow
+
+class DbProtocol():
+
+    class CommandCode(enum.IntEnum):
+        NOP = 0
+        GET = 1
+        GET_NEXT = 2
+        SET = 3
+        UNSET = 4
+        UNSET_NEXT = 5
+        REPLACE = 6
+        CLEAR = 7
+    class StatusCode(enum.IntEnum):
+        RESET = 0
+        READY = 1
+        BUSY = 2
+    class DbType(enum.IntEnum):
+        UNSPECIFIED = 0
+        STASH = 1
+        HTABLE = 2
+        STATE = 3
+
+    def __init__(self, proxy, name='DB', timeout=100e-3, delay=1e-3, debug=0, wait_policy=None, shadow=False,
+                 metrics=None, **kargs):
+        self.name = name
+        self.proxy = proxy
+        self.__DEBUG = debug
+        self.__SIZE = int(self.proxy.info_size)
+        self.__TYPE = int(self.proxy.info.db_type)
+        self.__KEY_BITS = int(self.proxy.info_key.bits)
+        self.__VALUE_BITS = int(self.proxy.info_value.bits)
+        # Key/value register layouts (key[0].byte_0 holds the most significant byte).
+        self._key_window = RegWindow(int(self.proxy.info_key.bytes), 'big', len(self.proxy.key))
+        self._value_window = RegWindow(int(self.proxy.info_value.bytes), 'big', len(self.proxy.set_value))
+        self._key_regs = self.proxy.key[:self._key_window.nregs]
+        self._set_value_regs = self.proxy.set_value[:self._value_window.nregs]
+        self._get_key_regs = self.proxy.get_key[:self._key_window.nregs]
+        self._get_value_regs = self.proxy.get_value[:self._value_window.nregs]
+        if wait_policy is None:
+            wait_policy = WaitPolicy(timeout, delay)
+        self.wait_policy = wait_policy
+        # Optional shadow of the key/set_value registers, to skip rewriting unchanged words (e.g. the
+        # upper key words of consecutive keys, or a value shared by many entries). Only enable it when
+        # nothing else (another host process, or a block reset) writes these registers, or call
+        # invalidate() when that happens.
+        self.shadow = RegShadow(shadow)
+        # Optional proxy_metrics.ProtocolMetrics instance. Operations are recorded as 'db_<command>'
+        # (e.g. 'db_set'), bulk operations as a single 'db_bulk_<command>' operation.
+        self.metrics = metrics
+        if self.__DEBUG:
+            print(f'# [{self.name}] INIT:')
+            print(f'#      Protocol: DbProtocol')
+            print(f'#      Type:     {self.DbType(self.__TYPE).name}')
+            print(f'#      Size:     {self.__SIZE} entries')
+            print(f'#      Key:      {self.__KEY_BITS}b')
+            print(f'#      Value:    {self.__VALUE_BITS}b')
+
+    @property
+    def size(self):
+        return self.__SIZE
+
+    @property
+    def key_bits(self):
+        return self.__KEY_BITS
+
+    @property
+    def value_bits(self):
+        return self.__VALUE_BITS
+
+    @property
+    def fill(self):
+        return int(self.proxy.status_fill)
+
+    def invalidate(self):
+        # Forget all host-side state about the controller registers (e.g. after a reset).
+        self.shadow.invalidate()
+
+    def _start_record(self, op):
+        if self.metrics is None:
+            return None
+        return self.metrics.start(op)
+
+    def _finish_record(self, record, entries=1):
+        if record is not None:
+            self.metrics.finish(record, entries * (self._key_window.nbytes + self._value_window.nbytes))
+
+    def _wait_status(self, test, record=None):
+        return self.wait_policy.wait(lambda: self.proxy.status().proxy, test, record)
+
+    def _transact(self, command, record=None, ready=False):
+        # Setup for the transaction. The ready poll is skipped when the caller knows that the
+        # controller is idle (i.e. the previous transaction has already reported done).
+        if not ready:
+            status = self._wait_status(lambda st: st.code == self.StatusCode.READY, record)
+            if status is None:
+                raise TimeoutError('Controller not ready')
+
+        # Trigger the transaction.
+        cmd = self.proxy.command(0).proxy
+        cmd.code = int(command)
+        self.proxy.command = int(cmd)
+        if record is not None:
+            record.reg_writes += 1
+
+        # Wait for the transaction to complete.
+        status = self._wait_status(lambda st: st.done or st.timeout or st.error, record)
+        if status is None:
+            raise TimeoutError(f'Controller timeout ({command.name})')
+        if status.timeout:
+            raise TimeoutError(f'Transaction timeout ({command.name})')
+        if status.error:
+            raise IOError(f'Transaction error ({command.name})')
+
+    def _set_regs(self, name, regs, words, record=None):
+        for (i, word) in enumerate(words):
+            if self.shadow.update((name, i), word):
+                regs[i]._r = word
+                if record is not None:
+                    record.reg_writes += 1
+
+    def _set_key(self, key, record=None):
+        self._set_regs('key', self._key_regs, self._key_window.to_words(key), record)
+
+    def _set_value(self, value, record=None):
+        self._set_regs('set_value', self._set_value_regs, self._value_window.to_words(value), record)
+
+    def _get_valid(self, record=None):
+        if record is not None:
+            record.reg_reads += 1
+        return bool(int(self.proxy.get_valid) & 1)
+
+    def _get_value(self, record=None):
+        if record is not None:
+            record.reg_reads += len(self._get_value_regs)
+        return self._value_window.from_words([int(reg._r) for reg in self._get_value_regs])
+
+    def _get_key(self, record=None):
+        if record is not None:
+            record.reg_reads += len(self._get_key_regs)
+        return self._key_window.from_words([int(reg._r) for reg in self._get_key_regs])
+
+    def _lookup(self, command, key, value=None, record=None, ready=False):
+        # Keyed transaction returning the value of the entry found (None if there was none).
+        self._set_key(key, record)
+        if value is not None:
+            self._set_value(value, record)
+        self._transact(command, record, ready)
+        if not self._get_valid(record):
+            return None
+        return self._get_value(record)
+
+    def nop(self):
+        self._transact(self.CommandCode.NOP)
+
+    def clear(self):
+        # Remove all entries.
+        if self.__DEBUG:
+            print(f'# [{self.name}] CLEAR')
+        self._transact(self.CommandCode.CLEAR)
+
+    def get(self, key):
+        # Value stored for key, or None if there is no entry for key.
+        record = self._start_record('db_get')
+        value = self._lookup(self.CommandCode.GET, key, record=record)
+        self._finish_record(record)
+        return value
+
+    def set(self, key, value):
+        if self.__DEBUG:
+            print(f'# [{self.name}] SET 0x{key:x} = 0x{value:x}')
+        record = self._start_record('db_set')
+        self._set_key(key, record)
+        self._set_value(value, record)
+        self._transact(self.CommandCode.SET, record)
+        self._finish_record(record)
+
+    def replace(self, key, value):
+        # Set the value for key, returning the value it replaced (None if there was no entry).
+        if self.__DEBUG:
+            print(f'# [{self.name}] REPLACE 0x{key:x} = 0x{value:x}')
+        record = self._start_record('db_replace')
+        value = self._lookup(self.CommandCode.REPLACE, key, value, record)
+        self._finish_record(record)
+        return value
+
+    def unset(self, key):
+        # Remove the entry for key, returning its value (None if there was no entry).
+        if self.__DEBUG:
+            print(f'# [{self.name}] UNSET 0x{key:x}')
+        record = self._start_record('db_unset')
+        value = self._lookup(self.CommandCode.UNSET, key, record=record)
+        self._finish_record(record)
+        return value
+
+    def bulk_set(self, entries, replace=False):
+        # Set many entries, given as a mapping or an iterable of (key, value) pairs, with SET (or
+        # REPLACE) commands. The controller returns to ready as soon as a transaction is done, so only
+        # the first transaction polls for ready. Returns the number of entries set.
+        if hasattr(entries, 'items'):
+            entries = entries.items()
+        command = self.CommandCode.REPLACE if replace else self.CommandCode.SET
+        record = self._start_record(f'db_bulk_{command.name.lower()}')
+        count = 0
+        for (key, value) in entries:
+            self._set_key(key, record)
+            self._set_value(value, record)
+            self._transact(command, record, ready=count > 0)
+            count += 1
+        if self.__DEBUG:
+            print(f'# [{self.name}] BULK {command.name} {count} entries')
+        self._finish_record(record, count)
+        return count
+
+    def bulk_get(self, keys):
+        # Generate (key, value) pairs for many keys, with value None for keys that have no entry.
+        record = self._start_record('db_bulk_get')
+        count = 0
+        try:
+            for key in keys:
+                value = self._lookup(self.CommandCode.GET, key, record=record, ready=count > 0)
+                count += 1
+                yield (key, value)
+        finally:
+            self._finish_record(record, count)
+
+    def bulk_delete(self, keys):
+        # Remove the entries for many keys. Returns the number of entries that were present.
+        # (UNSET_NEXT is not implemented by the AXI-L controller, so each key is unset by value.)
+        record = self._start_record('db_bulk_unset')
+        count = 0
+        removed = 0
+        for key in keys:
+            self._set_key(key, record)
+            self._transact(self.CommandCode.UNSET, record, ready=count > 0)
+            count += 1
+            removed += self._get_valid(record)
+        if self.__DEBUG:
+            print(f'# [{self.name}] BULK DELETE {count} keys ({removed} present)')
+        self._finish_record(record, count)
+        return removed
+
+    def iterate(self):
+        # Generate the (key, value) pairs of all entries. GET_NEXT steps through the table entries
+        # one at a time (wrapping around), so size transactions visit every entry exactly once. The
+        # table must not be modified while iterating.
+        if self.__TYPE == self.DbType.STATE:
+            yield from self._iterate_indexed()
+            return
+        record = self._start_record('db_bulk_get_next')
+        found = 0
+        try:
+            for i in range(self.__SIZE):
+                self._transact(self.CommandCode.GET_NEXT, record, ready=i > 0)
+                if self._get_valid(record):
+                    found += 1
+                    yield (self._get_key(record), self._get_value(record))
+        finally:
+            self._finish_record(record, found)
+
+    def _iterate_indexed(self):
+        # Array-backed (STATE) stores are indexed by key: GET_NEXT reads the entry at the key
+        # register and returns a zero key (see db_store_array.sv), so each index is read with GET.
+        record = self._start_record('db_bulk_get')
+        found = 0
+        try:
+            for key in range(self.__SIZE):
+                value = self._lookup(self.CommandCode.GET, key, record=record, ready=key > 0)
+                if value is not None:
+                    found += 1
+                    yield (key, value)
+        finally:
+            self._finish_record(record, found)
@@ -0,0 +1,176 @@
+__all__ = (
+    'DbShadow',
+)
+
+import random
+
+# Marks a key without an entry (distinct from any value, including None).
+_ABSENT = object()
+
+class DbShadow():
+    # Host-side copy of a db table (see DbProtocol), with the changes made since the last sync.
+    #
+    # Entries are updated on the host with set()/unset() (or item assignment/deletion); sync() then
+    # pushes only the keys that changed since the previous sync, with UNSET for removed entries,
+    # REPLACE for changed entries and SET for new entries. For every changed key the value the
+    # hardware holds (as of the last sync) is kept, so keys changed back and forth before a sync cost
+    # nothing, and verify() can check a random sample of entries with GET at any time.
+    #
+    # As with RegShadow, nothing but the owner of the shadow may modify the table; after the table was
+    # modified through another path (or reset), use reload() or adopt().
+
+    def __init__(self, db, entries=None, synced=False, debug=0):
+        self.db = db
+        self.__DEBUG = debug
+        self._table = {}
+        self._pending = {} # key: hardware value as of the last sync (or _ABSENT)
+        if entries is not None:
+            self.load(entries, synced)
+
+    def __len__(self):
+        return len(self._table)
+
+    def __contains__(self, key):
+        return key in self._table
+
+    def __getitem__(self, key):
+        return self._table[key]
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def __delitem__(self, key):
+        if not self.unset(key):
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._table)
+
+    def items(self):
+        return self._table.items()
+
+    def get(self, key, default=None):
+        return self._table.get(key, default)
+
+    @property
+    def pending(self):
+        # Number of keys changed since the last sync.
+        return len(self._pending)
+
+    def _touch(self, key):
+        # Record the hardware value of key before its first change since the last sync.
+        if key not in self._pending:
+            self._pending[key] = self._table.get(key, _ABSENT)
+
+    def set(self, key, value):
+        self._touch(key)
+        self._table[key] = value
+
+    def unset(self, key):
+        # Remove the entry for key. Returns False if there was none.
+        if key not in self._table:
+            return False
+        self._touch(key)
+        del self._table[key]
+        return True
+
+    def update(self, entries):
+        if hasattr(entries, 'items'):
+            entries = entries.items()
+        for (key, value) in entries:
+            self.set(key, value)
+
+    def load(self, entries, synced=False):
+        # Replace the host copy with entries. With synced, the entries are known to match the
+        # hardware contents and nothing is left to sync; otherwise the difference is pushed by the
+        # next sync().
+        if hasattr(entries, 'items'):
+            entries = entries.items()
+        if synced:
+            self._table = dict(entries)
+            self._pending = {}
+            return
+        entries = dict(entries)
+        for key in list(self._table):
+            if key not in entries:
+                self.unset(key)
+        self.update(entries)
+
+    def adopt(self):
+        # Replace the host copy with the current hardware contents (read with GET_NEXT).
+        self.load(self.db.iterate(), synced=True)
+
+    def reload(self):
+        # Push the whole host copy: clear the table and set every entry.
+        self.db.clear()
+        self.db.bulk_set(self._table)
+        self._pending = {}
+
+    def delta(self):
+        # (unsets, replaces, sets) needed to bring the hardware up to date: a list of keys and two
+        # lists of (key, value) pairs.
+        unsets = []
+        replaces = []
+        sets = []
+        for (key, old) in self._pending.items():
+            new = self._table.get(key, _ABSENT)
+            if new is _ABSENT:
+                if old is not _ABSENT:
+                    unsets.append(key)
+            elif old is _ABSENT:
+                sets.append((key, new))
+            elif new != old:
+                replaces.append((key, new))
+        return (unsets, replaces, sets)
+
+    def _push(self, items, keys, synced):
+        # Pass items through to a bulk operation, noting the keys of those whose transaction
+        # completed (an item is complete once the bulk operation asks for the next one).
+        for (key, item) in zip(keys, items):
+            yield item
+            synced.append(key)
+
+    def sync(self):
+        # Push the changes made since the last sync. Entries are removed first, to make room for the
+        # new ones. Returns the number of (unset, replace, set) transactions. If a transaction fails,
+        # the changes not yet pushed remain pending.
+        (unsets, replaces, sets) = self.delta()
+        synced = []
+        try:
+            self.db.bulk_delete(self._push(unsets, unsets, synced))
+            self.db.bulk_set(self._push(replaces, (key for (key, _) in replaces), synced), replace=True)
+            self.db.bulk_set(self._push(sets, (key for (key, _) in sets), synced))
+        except BaseException:
+            # Pushed keys are synced; unchanged (reverted) keys need no transaction either way.
+            for key in synced:
+                del self._pending[key]
+            for key in [key for (key, old) in self._pending.items() if self._table.get(key, _ABSENT) == old]:
+                del self._pending[key]
+            raise
+        self._pending = {}
+        if self.__DEBUG:
+            print(f'# [{self.db.name}] SYNC: {len(unsets)} unset, {len(replaces)} replaced, {len(sets)} set')
+        return (len(unsets), len(replaces), len(sets))
+
+    def verify(self, sample=1024, seed=None):
+        # Check the hardware entries of a random sample of keys against the host copy with GET,
+        # where sample is a number of keys or (below 1) a fraction of the table; sample=None checks
+        # every key. Changes not yet synced are checked against the hardware value as of the last
+        # sync. Returns a list of (key, expected, actual) mismatches, with None standing for a
+        # missing entry.
+        keys = list(self._table)
+        keys.extend(key for (key, old) in self._pending.items() if key not in self._table and old is not _ABSENT)
+        if sample is not None:
+            count = int(sample * len(keys)) if sample < 1 else int(sample)
+            if count < len(keys):
+                keys = random.Random(seed).sample(keys, count)
+        mismatches = []
+        for (key, actual) in self.db.bulk_get(keys):
+            expected = self._pending.get(key, self._table.get(key, _ABSENT))
+            if expected is _ABSENT:
+                expected = None
+            if actual != expected:
+                mismatches.append((key, expected, actual))
+        if self.__DEBUG:
+            print(f'# [{self.db.name}] VERIFY: {len(keys)} keys, {len(mismatches)} mismatches')
+        return mismatches
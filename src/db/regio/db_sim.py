@@ -0,0 +1,178 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'DbSim',
+)
+
+import os
+import sys
+
+try:
+    from proxy_sim import SimController
+    from reg_window import RegWindow
+except ImportError:
+    # Callers with only this directory on the module search path: add the shared simulation modules
+    # (src/reg/proxy/regio) from their location in the repository.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(here, '..', '..', 'reg', 'proxy', 'regio'))
+    from proxy_sim import SimController
+    from reg_window import RegWindow
+
+#---------------------------------------------------------------------------------------------------
+# Model of the db controller (see db.yaml and db_axil_ctrl.sv), backed by the `slots` list of `size`
+# entries, each None or a (key, value) pair. SET/REPLACE update the entry for a key, or insert into
+# a free slot (ending with an error when the table is full); GET/UNSET/REPLACE report the
+# entry found through get_valid/get_value. GET_NEXT returns the slot at an internal index, which then
+# advances (wrapping around) as in db_stash.sv. UNSET_NEXT is not decoded by the AXI-L controller and
+# behaves as a NOP.
+#
+# With db_type DB_TYPE_STATE, the model is an array-backed store (db_store_array.sv) instead: the key
+# is the slot index, and GET_NEXT reads the slot at the key with a zero key returned.
+class DbSim(SimController):
+    _BYTES = (('byte_0', 8), ('byte_1', 8), ('byte_2', 8), ('byte_3', 8))
+
+    REGS = {
+        'info':        ((('db_type', 8), ('db_subtype', 8)), None, 0),
+        'info_size':   ((), None, 0),
+        'info_key':    ((('bits', 16), ('bytes', 8), ('regs', 8)), None, 0),
+        'info_value':  ((('bits', 16), ('bytes', 8), ('regs', 8)), None, 0),
+        'blk_control': ((('reset', 1), ('enable', 1)), None, 0x2),
+        'blk_monitor': ((('reset_mon', 1), ('enable_mon', 1), ('ready_mon', 1), ('state_mon', 8)), None, 0),
+        'command':     ((('code', 8),), None, 0),
+        'status':      ((('code', 8), ('done', 1), ('error', 1), ('timeout', 1)), None, 0),
+        'status_fill': ((), None, 0),
+        'key':         (_BYTES, 32, 0),
+        'set_value':   (_BYTES, 32, 0),
+        'get_valid':   ((('value', 1),), None, 0),
+        'get_key':     (_BYTES, 32, 0),
+        'get_value':   (_BYTES, 32, 0),
+    }
+
+    # Command and status codes (see db.yaml).
+    CMD_NOP = 0
+    CMD_GET = 1
+    CMD_GET_NEXT = 2
+    CMD_SET = 3
+    CMD_UNSET = 4
+    CMD_UNSET_NEXT = 5
+    CMD_REPLACE = 6
+    CMD_CLEAR = 7
+
+    STATUS_READY = 1
+    STATUS_BUSY = 2
+
+    DB_TYPE_STASH = 1
+    DB_TYPE_STATE = 3
+
+    def __init__(self, size=1024, key_bits=32, value_bits=32, db_type=DB_TYPE_STASH, reg_latency=0.0,
+                 op_delay=0.0):
+        super().__init__(reg_latency, op_delay)
+        self.slots = [None] * size
+        self.indexed = db_type == self.DB_TYPE_STATE
+        self.next_index = 0
+        self._index = {} # key: slot index
+        self._free = list(range(size - 1, -1, -1))
+        self._key = RegWindow(-(-key_bits // 8), 'big', len(self.key))
+        self._value = RegWindow(-(-value_bits // 8), 'big', len(self.set_value))
+
+        info = self.peek('info')
+        info.db_type = db_type
+        self.poke('info', info)
+        self.poke('info_size', size)
+        for (name, bits, window) in (('info_key', key_bits, self._key), ('info_value', value_bits, self._value)):
+            reg = self.peek(name)
+            reg.bits = bits
+            reg.bytes = window.nbytes
+            reg.regs = window.nregs
+            self.poke(name, reg)
+        self.poke('status', self.STATUS_READY)
+
+    @property
+    def table(self):
+        # Current contents, as a {key: value} dict.
+        return dict(slot for slot in self.slots if slot is not None)
+
+    def _on_read(self, name, index):
+        value = super()._on_read(name, index)
+        if name == 'status':
+            # Done/error/timeout flags are cleared by the read.
+            self.poke('status', self.peek('status').code)
+        return value
+
+    def _on_write(self, name, index, value):
+        super()._on_write(name, index, value)
+        if name != 'command' or self._pending is not None:
+            return
+        self.poke('status', self.STATUS_BUSY)
+        # The key and value are latched with the command.
+        code = value & 0xff
+        key = self._key.from_words(self._values['key'][:self._key.nregs])
+        value = self._value.from_words(self._values['set_value'][:self._value.nregs])
+        operation = {
+            self.CMD_GET:      lambda: self._lookup(key),
+            self.CMD_GET_NEXT: lambda: self._get_next(key),
+            self.CMD_SET:      lambda: self._set(key, value, False),
+            self.CMD_UNSET:    lambda: self._unset(key),
+            self.CMD_REPLACE:  lambda: self._set(key, value, True),
+            self.CMD_CLEAR:    self._clear,
+        }.get(code, lambda: None)
+        self._issue(operation)
+
+    def _result(self, slot):
+        # Latch a GET-type result (slot None when no entry was found).
+        self.poke('get_valid', int(slot is not None))
+        (key, value) = slot if slot is not None else (0, 0)
+        self._values['get_key'][:self._key.nregs] = self._key.to_words(key)
+        self._values['get_value'][:self._value.nregs] = self._value.to_words(value)
+
+    def _lookup(self, key):
+        index = self._index.get(key)
+        self._result(None if index is None else self.slots[index])
+
+    def _get_next(self, key):
+        if self.indexed:
+            slot = self.slots[key] if key < len(self.slots) else None
+            self._result(None if slot is None else (0, slot[1]))
+            return
+        self._result(self.slots[self.next_index])
+        self.next_index = (self.next_index + 1) % len(self.slots)
+
+    def _set(self, key, value, report):
+        index = self._index.get(key)
+        if index is None:
+            if self.indexed:
+                if key >= len(self.slots):
+                    return 'error'
+                index = key
+            elif not self._free:
+                return 'error'
+            else:
+                index = self._free.pop()
+            self._index[key] = index
+        if report:
+            self._result(self.slots[index])
+        self.slots[index] = (key, value)
+
+    def _unset(self, key):
+        index = self._index.pop(key, None)
+        if index is None:
+            self._result(None)
+            return
+        self._result(self.slots[index])
+        self.slots[index] = None
+        if not self.indexed:
+            self._free.append(index)
+
+    def _clear(self):
+        size = len(self.slots)
+        self.slots = [None] * size
+        self._index.clear()
+        self._free = list(range(size - 1, -1, -1))
+
+    def _complete(self, fault):
+        status = self.peek('status')
+        status.code = self.STATUS_READY
+        status.done = int(fault is None)
+        status.error = int(fault == 'error')
+        status.timeout = int(fault == 'timeout')
+        self.poke('status', status)
+        self.poke('status_fill', len(self._index))
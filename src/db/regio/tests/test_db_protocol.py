@@ -0,0 +1,143 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from db_protocol import DbProtocol
+from db_sim import DbSim
+from proxy_metrics import ProtocolMetrics
+
+@pytest.fixture
+def sim():
+    return DbSim(size=64, key_bits=32, value_bits=32)
+
+@pytest.fixture
+def db(sim):
+    return DbProtocol(sim, timeout=10e-3)
+
+def test_info(db):
+    assert (db.size, db.key_bits, db.value_bits) == (64, 32, 32)
+
+def test_set_get(sim, db):
+    db.set(0x11223344, 0xaabbccdd)
+    assert db.get(0x11223344) == 0xaabbccdd
+    assert db.get(0x55) is None
+    assert sim.table == {0x11223344: 0xaabbccdd}
+    assert db.fill == 1
+
+def test_replace_unset(sim, db):
+    assert db.replace(1, 10) is None
+    assert db.replace(1, 11) == 10
+    assert db.unset(1) == 11
+    assert db.unset(1) is None
+    assert sim.table == {}
+
+def test_clear(sim, db):
+    db.bulk_set({key: key for key in range(10)})
+    db.clear()
+    assert sim.table == {}
+    db.nop()
+
+def test_bulk(sim, db):
+    entries = {key: key * 3 for key in range(40)}
+    assert db.bulk_set(entries) == 40
+    assert sim.table == entries
+    assert dict(db.bulk_get([0, 5, 100])) == {0: 0, 5: 15, 100: None}
+    assert db.bulk_set([(0, 1), (1, 2)], replace=True) == 2
+    assert db.bulk_delete([0, 1, 100]) == 2
+    assert dict(db.iterate()) == {key: key * 3 for key in range(2, 40)}
+
+def test_bulk_skips_ready_polls(sim, db):
+    db.set(1000, 0)
+    sim.reset_counters()
+    db.set(0, 0)
+    single = sim.reads
+    sim.reset_counters()
+    db.bulk_set({key: 0 for key in range(1, 11)})
+    assert sim.reads == 10 * single - 9
+
+def test_wide(sim):
+    sim = DbSim(size=16, key_bits=100, value_bits=72)
+    db = DbProtocol(sim, timeout=10e-3)
+    key = (1 << 99) | 0x123456789
+    value = (1 << 71) | 0xabcdef
+    db.set(key, value)
+    assert sim.table == {key: value}
+    assert db.get(key) == value
+    assert list(db.iterate()) == [(key, value)]
+
+def test_full(sim, db):
+    db.bulk_set({key: key for key in range(64)})
+    with pytest.raises(IOError, match=r'Transaction error \(SET\)'):
+        db.set(64, 64)
+    # Updating an existing entry still succeeds.
+    db.set(0, 1)
+    assert db.get(0) == 1
+
+def test_iterate_indexed():
+    # Array-backed store: GET_NEXT returns a zero key, so entries are read back by index.
+    sim = DbSim(size=16, key_bits=4, db_type=DbSim.DB_TYPE_STATE)
+    db = DbProtocol(sim, timeout=10e-3)
+    entries = {1: 10, 5: 50, 15: 150}
+    db.bulk_set(entries)
+    assert sim.table == entries
+    db._set_key(5)
+    db._transact(db.CommandCode.GET_NEXT)
+    assert (db._get_key(), db._get_value()) == (0, 50)
+    assert dict(db.iterate()) == entries
+    db.unset(5)
+    assert list(db.iterate()) == [(1, 10), (15, 150)]
+    with pytest.raises(IOError, match=r'Transaction error \(SET\)'):
+        db.set(16, 0)
+
+def test_faults(sim, db):
+    sim.fail_next('timeout')
+    with pytest.raises(TimeoutError, match=r'Transaction timeout \(GET\)'):
+        db.get(1)
+    sim.fail_next('error')
+    with pytest.raises(IOError, match=r'Transaction error \(SET\)'):
+        db.set(1, 1)
+    assert sim.table == {}
+
+def test_controller_timeout():
+    sim = DbSim(size=16, op_delay=50e-3)
+    db = DbProtocol(sim, timeout=5e-3)
+    with pytest.raises(TimeoutError, match=r'Controller timeout \(GET\)'):
+        db.get(1)
+    with pytest.raises(TimeoutError, match='not ready'):
+        db.get(1)
+
+def test_shadow_disabled(sim, db):
+    db.set(1, 1)
+    sim.reset_counters()
+    db.set(1, 1)
+    # Key, value and command.
+    assert sim.writes == 3
+
+def test_shadow(sim):
+    db = DbProtocol(sim, timeout=10e-3, shadow=True)
+    db.set(1, 1)
+    sim.reset_counters()
+    db.set(1, 1)
+    assert sim.writes == 1
+    # Lost register state (e.g. written by another process).
+    sim.poke('key', 7)
+    db.invalidate()
+    db.set(1, 2)
+    assert sim.table == {1: 2}
+
+def test_metrics(sim):
+    metrics = ProtocolMetrics()
+    db = DbProtocol(sim, timeout=10e-3, metrics=metrics)
+    db.bulk_set({key: key for key in range(5)})
+    db.get(1)
+    stats = metrics.as_dict()
+    assert stats['db_bulk_set']['count'] == 1
+    assert stats['db_get']['count'] == 1
+
+@pytest.mark.parametrize('module', ['db_protocol', 'db_shadow', 'db_sim'])
+def test_import_standalone(tmp_path, module):
+    # The shared modules of src/reg/proxy/regio are found with only this directory on the path.
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.run([sys.executable, '-c', f'import {module}'], cwd=tmp_path, env=env, check=True)
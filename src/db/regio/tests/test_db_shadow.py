@@ -0,0 +1,69 @@
+import pytest
+
+from db_protocol import DbProtocol
+from db_shadow import DbShadow
+from db_sim import DbSim
+
+@pytest.fixture
+def sim():
+    return DbSim(size=64)
+
+@pytest.fixture
+def db(sim):
+    return DbProtocol(sim, timeout=10e-3)
+
+def test_sync(sim, db):
+    shadow = DbShadow(db, {key: key for key in range(10)})
+    assert shadow.pending == 10
+    assert shadow.sync() == (0, 0, 10)
+    assert sim.table == dict(shadow.items())
+    shadow[0] = 100
+    del shadow[1]
+    shadow[20] = 20
+    shadow[2] = 5
+    shadow[2] = 2 # Changed back: nothing to push.
+    assert shadow.sync() == (1, 1, 1)
+    assert sim.table == dict(shadow.items())
+    assert shadow.pending == 0
+    assert shadow.sync() == (0, 0, 0)
+
+def test_del_missing(db):
+    shadow = DbShadow(db)
+    with pytest.raises(KeyError):
+        del shadow[1]
+
+def test_verify(sim, db):
+    shadow = DbShadow(db, {key: key for key in range(10)})
+    shadow.sync()
+    assert shadow.verify(sample=None) == []
+    # Unsynced changes are checked against the synced values.
+    shadow[3] = 30
+    assert shadow.verify(sample=None) == []
+    sim.slots[sim._index[4]] = (4, 44)
+    assert shadow.verify(sample=None) == [(4, 4, 44)]
+    assert len(shadow.verify(sample=0.5, seed=1)) <= 1
+
+def test_adopt_reload(sim, db):
+    db.bulk_set({1: 1, 2: 2})
+    shadow = DbShadow(db)
+    shadow.adopt()
+    assert dict(shadow.items()) == {1: 1, 2: 2}
+    assert shadow.pending == 0
+    shadow[3] = 3
+    shadow.reload()
+    assert sim.table == {1: 1, 2: 2, 3: 3}
+    assert shadow.pending == 0
+
+def test_sync_error():
+    db = DbProtocol(DbSim(size=2), timeout=10e-3)
+    shadow = DbShadow(db, {key: key for key in range(4)})
+    # The table only holds two entries: the third SET fails and the last two stay pending.
+    with pytest.raises(IOError):
+        shadow.sync()
+    assert db.proxy.table == {0: 0, 1: 1}
+    assert shadow.pending == 2
+    # Entries are removed before new ones are set.
+    del shadow[0]
+    del shadow[1]
+    assert shadow.sync() == (2, 0, 2)
+    assert db.proxy.table == {2: 2, 3: 3}
@@ -1,110 +1,91 @@
-import galois
-import numpy as np
+#!/usr/bin/env python3
+#---------------------------------------------------------------------------------------------------
+# Reed-Solomon lookup table generator: writes fec_luts.svh (GF tables, RS_G_POLY/RS_G_LUT/RS_P_LUT
+# and the erasure decoding tables RS_H_LUT/RS_ERR_LOC_LUT), and optionally the C model header
+# rs_model.h, for a field, irreducible polynomial, k data symbols and 2t parity symbols.
+#
+# The output is a function of the arguments only (the message and erasures of the walkthrough come
+# from --seed), and files are only rewritten when their content changes, so regenerating does not
+# invalidate downstream simulation and synthesis builds.
+#
+#   genMatrix_simplified.py                         # GF(16), k=8, t=1: fec_luts.svh in the cwd
+#   genMatrix_simplified.py --field 256 --k 16 --t 2 --out-dir build --rs-model
+#   genMatrix_simplified.py --verbose               # also print the encode/decode walkthrough
+#---------------------------------------------------------------------------------------------------
+import argparse
+import os
 import random
-import itertools
+import sys
 
-np.set_printoptions(formatter={'int':lambda x: f'{x:2}'},linewidth = 1000)
+import numpy as np
 
-#GF = galois.GF(8,irreducible_poly=[1,0,1,1])
-GF = galois.GF(16,irreducible_poly=[1,0,0,1,1])
-#GF = galois.GF(32,irreducible_poly=[1,0,0,1,0,1])
-#GF = galois.GF(64,irreducible_poly=[1,0,0,0,0,1,1])
-#GF = galois.GF(256,irreducible_poly=[1,0,0,0,1,1,0,1,1])
+from gf_engine import FIELDS, GaloisField
+from rs_codec import RSCode
+from rs_hlut import CACHE_DIR, h_table
 
-print(GF.properties)
-print(GF.repr_table())
+np.set_printoptions(formatter={'int':lambda x: f'{x:2}'},linewidth = 1000)
 
 #--------------------------------------------------------------------------------------
 # Galois Field Functions from scratch
 #--------------------------------------------------------------------------------------
-alpha = GF.primitive_element
-#gf_mul_seq =  [1,2,4,8,3,6,12,11,5,10,7,14,15,13,9,0]
-gf_mul_seq = []
-for i in range(GF.order):
-   if i < GF.order-1: gf_mul_seq.append(int(alpha**i))
-   else             : gf_mul_seq.append(int(0))
-
-print("------   GF elements (ordered by power)  -------")
-print(gf_mul_seq)
-print("-------------------------------------------")
-
-gf_log_seq = {}
-gf_exp_seq = {}
-
-for i,val in enumerate(gf_mul_seq) :
-   gf_log_seq[i] = val     # alpha -> x 
-   gf_exp_seq[val] = i     # x -> alpha
-   
-print("------   GF Log Table from scratch  -------")
-print("gf log seq",gf_log_seq)
-print("gf exp seq",gf_exp_seq)
-print("-------------------------------------------")
+# Table driven (NumPy) arithmetic over the field selected with use_field() (GF(16) with
+# x^4+x+1 by default); the functions below accept single symbols or arrays of symbols.
+
+def use_field(order, irreducible_poly=None):
+   global gf, gf_mul_seq, gf_log_seq, gf_exp_seq
+   gf = GaloisField(order, irreducible_poly)
+   gf_mul_seq = gf.exp_seq.tolist()
+   gf_log_seq = {}
+   gf_exp_seq = {}
+   for i,val in enumerate(gf_mul_seq) :
+      gf_log_seq[i] = val     # alpha -> x
+      gf_exp_seq[val] = i     # x -> alpha
+   return gf
+
+use_field(16)
+
+def _sym(x):
+   # single symbols are returned as ints, arrays as arrays.
+   return int(x) if np.ndim(x) == 0 else x
 
 def gf_mul(a,b):
-  if (a == 0) or (b == 0):
-     return 0
-  
-  exp_a = gf_exp_seq[a]
-  exp_b = gf_exp_seq[b]
-  sum = (exp_a+exp_b) % (GF.order-1)
-  return(gf_log_seq[sum])
+  return _sym(gf.mul(a,b))
 
 def gf_div(a,b):
-  if ( a == 0) or (b == 0):
-     return 0
-
-  exp_a = gf_exp_seq[a]
-  exp_b = gf_exp_seq[b]
-  sum = (exp_a-exp_b)
-  if (sum < 0): sum = sum + (GF.order-1)
-  sum = sum % (GF.order-1)
-  return(gf_log_seq[sum])
+  return _sym(gf.div(a,b))
 
 def gf_sum(a,b):
-   return a^b
+   return _sym(gf.add(a,b))
 
 #--------------------------------------------------------------------------------------
 # Polynomial Functions
+#   polynomials are lists of symbols (highest order first); element-wise functions
+#   truncate to the shorter operand.
 #--------------------------------------------------------------------------------------
 
+def _pair(poly_a,poly_b):
+   n = min(len(poly_a),len(poly_b))
+   return np.asarray(poly_a[:n],dtype=int),np.asarray(poly_b[:n],dtype=int)
+
 def poly_sum(poly_a,poly_b):
-   return [ gf_sum(a,b) for a,b in zip(poly_a,poly_b)]
+   return gf.add(*_pair(poly_a,poly_b)).tolist()
 
 def poly_had_mul(poly_a,poly_b):
-   return [ gf_mul(a,b) for a,b in zip(poly_a,poly_b)]
+   return gf.mul(*_pair(poly_a,poly_b)).tolist()
 
 def poly_scale(poly_a,s):
-   return [ gf_mul(x,s) for x in poly_a]
+   return gf.mul(np.asarray(poly_a,dtype=int),s).tolist()
 
 def poly_mul(poly_a,poly_b):
-   partial_product = [0 for x in poly_a]
-   for b_term in reversed(poly_b):
-#      print(poly_a,"x",b_term , " " , partial_product, "+", poly_scale(poly_a,b_term))
-      partial_product = poly_sum([0]+partial_product,poly_scale(poly_a,b_term))
-      poly_a.append(0)
-   return partial_product
+   return gf.poly_mul(poly_a,poly_b).tolist()
 
 # dot product of 2 vectors over GF
 def poly_elem_mul(poly_a,poly_b):
-   return [ gf_mul(a,b) for a,b in zip(poly_a,poly_b) ]
+   return poly_had_mul(poly_a,poly_b)
 
 def poly_div(poly_a,poly_b):
-
-   divisor = []
-   partial_remainder = poly_a
-   partial_product = poly_b + [0]*(len(poly_a)-len(poly_b))
-
-   while (len(partial_remainder) >= len(poly_b)) :
-      scale = gf_div(partial_remainder[0],poly_b[0])
-#      print(partial_remainder)
-      partial_remainder = poly_sum(partial_remainder,poly_scale(partial_product,scale))
-#      print(f'{poly_scale(partial_product,scale)} \t {partial_product} x {scale}')
-#      print("--------------")
-      partial_remainder = partial_remainder[1::]
-      partial_product   = partial_product[0:-1]
-      divisor.append(scale)
-
-   return divisor,partial_remainder
+   divisor,remainder = gf.poly_divmod(poly_a,poly_b)
+   return divisor.tolist(),remainder.tolist()
 
 
 #--------------------------------------------------------------------------------------
@@ -153,11 +134,7 @@ def rs_gen_H(G):
 
 def poly_dot(X,Y):
    if (len(X) != len(Y)): return -1
-   Z = poly_elem_mul(X,Y)
-   p = 0
-   for z in Z:
-      p = gf_sum(p,z)
-   return p
+   return int(gf.dot(np.asarray(X,dtype=int),np.asarray(Y,dtype=int)))
 
 
 """
@@ -177,10 +154,7 @@ def poly_matrix_vector_mul(M,V):
       # print(f"  Mrow = {len(M[0])}  V={len(V)}")
       return [-1]
 
-   y = []
-   for row in M:
-      y.append(poly_dot(row,V))
-   return y
+   return gf.matvec(np.asarray(M,dtype=int),np.asarray(V,dtype=int)).tolist()
 
 def gf_poly_matrix_determinant(M):
 #   print(" Calculate determinant ")
@@ -242,9 +216,8 @@ def gf_poly_matrix_determinant(M):
    return det
 
 def gf_poly_matrix_invert(G):
-   A = GF(G)
-   A_inv = np.linalg.inv(A)
-   return A_inv
+   # raises np.linalg.LinAlgError if G is singular.
+   return gf.matinv(np.asarray(G,dtype=int))
 
 def poly_matrix_invert(M):
 
@@ -304,55 +277,18 @@ def rs_decode(H,m):
    return poly_matrix_vector_mul(H,m)
 
 
-# ---------------------------- Main --------------------------------------
+# ---------------------------- Walkthrough --------------------------------------
 
-if (True) :
-   print(f'--- testing GF arithmetic with python standard library ---')
-   x = GF([2])
-   y = GF([7])
-   print(f'{x}+{y} = {x+y}')
-   print(f'{x}*{y} = {x*y}')
-   print(f'{x}/{y} = {x/y}')
-   print(f'{x}%{y} = {x%y}')
-
-   print(f'--- testing GF multipy table with python standard library ---')
-   gf_mul_lut=[]
-   for i in range(GF.order):
-       row=[]
-       for j in range(GF.order):
-           x = GF([i])
-           y = GF([j])
-           z = x*y
-           row.append(int(z.item()))
-       print(row)
-       gf_mul_lut.append(row)
-
-   print(f'--- testing GF division table with python standard library ---')
-   gf_div_lut=[]
-   for i in range(GF.order):
-       row=[]
-       for j in range(GF.order):
-           x = GF([i])
-           y = GF([j])
-           if y != 0: z = x/y
-           else:      z = GF([0])
-           #z = gf_div(x,y)
-           row.append(int(z.item()))
-           #row.append(int(z))
-       print(row)
-       gf_div_lut.append(row)
-
-   print(f'--- testing GF addition table with python standard library ---')
-   gf_add_lut=[]
-   for i in range(GF.order):
-       row=[]
-       for j in range(GF.order):
-           x = GF([i])
-           y = GF([j])
-           z = x+y
-           row.append(int(z.item()))
-       print(row)
-       gf_add_lut.append(row)
+def walkthrough(code, d, e_bits):
+   # Step by step encoding and decoding of message d, with erasures at e_bits.
+   t = code.t
+   print("------   GF elements (ordered by power)  -------")
+   print(gf_mul_seq)
+   print("-------------------------------------------")
+   print("------   GF Log Table from scratch  -------")
+   print("gf log seq",gf_log_seq)
+   print("gf exp seq",gf_exp_seq)
+   print("-------------------------------------------")
 
    print(f'--- testing GF arithmetic with custom library  ---')
    x = 2
@@ -360,92 +296,22 @@ if (True) :
    print(f'{x}+{y} = {gf_sum(x,y)}')
    print(f'{x}*{y} = {gf_mul(x,y)}')
    print(f'{x}/{y} = {gf_div(x,y)}')
-   # print(f'{x}%{y} = {x%y}')
-
-
-if (False) :
-   print("-----  POLY sum -----")
-   poly1 = [ 1, 4, 5, 6 ]
-   poly2 = [ 4, 5, 9, 0xF ]
-   
-   print(f'a = {poly1}')
-   print(f'b = {poly2}')
-   print(f's = {poly_sum(poly1,poly2)}')
-   print()
-
-if (False) :
-   print("-----  GF mul / div  -----")
-   a = 15
-   b = 4
-   print(f'a = {a}')
-   print(f'b = {b}')
-   print(f'mul p = {gf_mul(a,b)}')
-   print(f'div d = {gf_div(a,b)}')
-
-if (False) :
-   print("-----  POLY Mul -----")
-
-   poly1 = [ 1, 6, 3 ]
-   poly2 = [ 6 ]
-
-   print(f'a = {poly1}')
-   print(f'b = {poly2}')
-   print(f'{poly1} x {poly2} = {poly_mul(poly1,poly2)}')
-   print(f'6x3 = {poly_mul([6],[3])}')
-
-if (False) :
-   print("-----  POLY Div -----")
 
-   poly1 = [ 1,0,7,6]
-   poly2 = [ 1,6,3 ]
-
-   print(f'a = {poly1}')
-   print(f'b = {poly2}')
-   divisor,remainder = poly_div(poly1,poly2)
-   print(f'd = { divisor } , r = { remainder }')
-
-   for x in range(0,4):
-      for y in range(0,4):
-         poly_x = poly_scale([1,2,3,4],x)
-         poly_y = poly_scale([1,2,3,4],y)
-
-         gal_x = galois.Poly(poly_x,field=GF)
-         gal_y = galois.Poly(poly_y,field=GF)
-      
-         print(f'{poly_x}\tx\t{poly_y}\t= {poly_mul(poly_x,poly_y)} \t {gal_x*gal_y}')
-
-
-if (True) :
    print("-----  Reed Solomon Testing  -----")
+   print("-----  Generator Polynomial Testing  -----\n")
+   print(
+     f"""
+     We should see polynomials with order 2*t + 1
+     all parity check polynomial remainders will be of order 2*t
+     which is the number of parity words to correct t errors or 2*t erasures
+     """
+   )
+   for t_test in (4,1,2):
+      if 2*t_test < gf.order - 1:
+         print(f'for t={t_test} errors Gpoly={rs_gen_poly(t_test)}')
+   print()
 
-
-   if (True) :
-      print("-----  Generator Polynomial Testing  -----\n")
-      print(
-        f"""
-        We should see polynomials with order 2*t + 1
-        all parity check polynomial remainders will be of order 2*t
-        which is the number of parity words to correct t errors or 2*t erasures
-        """
-      )
-
-      t = 4 ; print(f'for t={t} errors Gpoly={rs_gen_poly(t)}')
-      t = 1 ; print(f'for t={t} errors Gpoly={rs_gen_poly(t)}')
-      t = 2 ; print(f'for t={t} errors Gpoly={rs_gen_poly(t)}')
-      print()
-
-      print("-----  Generator Matrix Construction -----\n")
-
-   d = [1,2,3,4,5,6,7,8]    # use this to define a specific message else a random one will be generated
-   t = 1                    # 2*t parity words for 2*t erasure correction
-
-   try : d
-   except :
-     n = 8   # number of data symbols. n SHOULD be >= 3 for fast determinant calculation
-     d = [random.randrange(0, GF.order, 1) for i in range(n)]
-   else :
-     n = len(d)
-      
+   print("-----  Generator Matrix Construction -----\n")
    print(f"t = {t} , Data = {d}")
    Gpoly = rs_gen_poly(t)
 
@@ -468,36 +334,6 @@ if (True) :
    print(f"encoded message using Gpoly      = {c_polydiv}")
 
    print("-----  RS Decoder  -----")
-
-   print("#-- Test to see if all possible G* -> H matrices are invertable --")
-   
-   print("testing for matrix invertability")
-   H_LUT = []
-   ERR_LOC_LUT = []
-   for errors in itertools.combinations(list(range(0,len(c_matrix))),2*t) :
-      e_bits = list(errors)
-
-      c_rx = c_matrix.copy()
-      for error in e_bits:
-         c_rx[error] = 0
-
-      G_error = G.copy()
-      G_error = np.delete(G_error.transpose(),e_bits,0)
-      m_rx = np.delete(c_matrix,e_bits)
-   
-      try :
-         H = gf_poly_matrix_invert(G_error)
-         H_LUT.append(H)
-         ERR_LOC = [1 if i in e_bits else 0 for i in range(len(c_matrix))]
-         ERR_LOC_LUT.append(ERR_LOC)
-         #print("Iteration:", e_bits)
-      except :
-         print(f" ----  UNABLE TO INVERT G* ------ ")
-         print(f"m_rx = {m_rx}")      
-         print(f" Error locations .. {e_bits}")
-   
-   e_bits = random.sample(range(0, len(c_matrix)), 2*t)    # errors in m,p bits
-#   e_bits = random.sample(range(0,len(c_matrix)-2*t),2*t)  # errors in m bits
    print(f" Error locations .. {e_bits}")
 
    print()
@@ -515,14 +351,14 @@ if (True) :
 
    print("G* = ")
    print(G_error)
-   
+
    try :
       H = gf_poly_matrix_invert(G_error)
-   except :
+   except np.linalg.LinAlgError :
       print(f" ----  UNABLE TO INVERT G* ------ ")
       print(f" Error locations .. {e_bits}")
-      exit()
-   
+      return
+
    print("H = ")
    print(H)
    d_corrected = poly_matrix_vector_mul(np.array(H),m_rx)
@@ -540,145 +376,154 @@ if (True) :
    print("#-- build the G* matrix by copying parity row into lost m rows ------- ")
    print("   Note the G and H matrix are different from the method above ")
    print()
-   
+
    c_rx = c_matrix.copy()
    G_error = G.copy()
    G_error = G_error.transpose()
    for i,error in enumerate(e_bits) :
       c_rx[error] = c_rx[len(d)+i]
       G_error[error] = G_error[len(d)+i]
-      d_rx = c_rx[0:len(d)]
+   d_rx = c_rx[0:len(d)]
    G_error = G_error[0:len(d)]
    print(f"d_rx = {d_rx}")
 
    print("G* = ")
    print(G_error)
 
-   H = gf_poly_matrix_invert(G_error)
+   try :
+      H = gf_poly_matrix_invert(G_error)
+   except np.linalg.LinAlgError :
+      print(f" ----  UNABLE TO INVERT G* ------ ")
+      return
    print("H = ")
    print(H)
-   
+
    d_corrected = poly_matrix_vector_mul(np.array(H),d_rx)
    print(f"d      = {np.array(d)}")
    print(f"d_corr = {np.array(d_corrected)}")
    print(f"c_tx   = {np.array(c_matrix)}")
    print(f"c_rx   = {np.array(c_rx)}")
 
-   # ---------------------  Write the C Model for the RS encoder and decoder -----------
-
-if (False) :
-   C_Model_File = open("rs_model.h","w")
+# ---------------------------- Output files --------------------------------------
+
+def _svh_rows(rows, indent = '    '):
+   return ',\n'.join(f"{indent}'{{ {','.join(map(str,row))} }}" for row in np.asarray(rows).tolist())
+
+def _svh_table(decl, rows):
+   return f"{decl} = '{{\n{_svh_rows(rows)}\n}};\n"
+
+def fec_luts_svh(code, h_lut):
+   # Contents of fec_luts.svh.
+   f = code.gf
+   text = f"localparam GF_ORDER = {f.order};\n"
+   text += f"localparam SYM_SIZE = $clog2(GF_ORDER);\n\n"
+   text += f"localparam logic [SYM_SIZE-1:0] GF_LOG_LUT [GF_ORDER] =\n    '{{ {','.join(map(str,f.exp_seq.tolist()))} }};\n\n"
+   text += f"localparam logic [SYM_SIZE-1:0] GF_EXP_LUT [GF_ORDER] =\n    '{{ {','.join(map(str,f.log_seq.tolist()))} }};\n\n"
+   text += _svh_table("localparam logic [SYM_SIZE-1:0] GF_MUL_LUT [GF_ORDER][GF_ORDER]", f.mul_table) + "\n"
+   text += _svh_table("localparam logic [SYM_SIZE-1:0] GF_DIV_LUT [GF_ORDER][GF_ORDER]", f.div_table) + "\n"
+   text += _svh_table("localparam logic [SYM_SIZE-1:0] GF_ADD_LUT [GF_ORDER][GF_ORDER]", f.add_table) + "\n"
+   text += f"localparam RS_N  = {code.n};\n"
+   text += f"localparam RS_K  = {code.k};\n"
+   text += f"localparam RS_2T = {2*code.t};\n\n"
+   text += f"localparam logic [RS_2T:0][SYM_SIZE-1:0] RS_G_POLY = '{{ {','.join(map(str,code.gen_poly[::-1].tolist()))} }};\n\n"
+   text += _svh_table("localparam logic [0:RS_K-1][0:RS_N-1][SYM_SIZE-1:0] RS_G_LUT", code.G) + "\n"
+   text += _svh_table("localparam logic [0:RS_2T-1][0:RS_K-1][SYM_SIZE-1:0] RS_P_LUT", code.P) + "\n"
+   text += h_lut.svh()
+   return text
+
+def rs_model_h(code):
+   # Contents of rs_model.h (C model of the encoder); the mul table is only filled in up to GF(16).
+   f = code.gf
+   text = f" static const char _ejfat_rs_gf_log_seq[{f.order}] = {{ {','.join(map(str,f.exp_seq.tolist()))} }}; \n"
+   text += f" static const char _ejfat_rs_gf_exp_seq[{f.order}] = {{ {','.join(map(str,f.log_seq.tolist()))} }}; \n"
+   text += f"static const char _ejfat_rs_gf_mul_table[{f.order}][{f.order}] = {{\n"
+   if f.order <= 16 :
+      for row in f.mul_table.tolist() :
+         text += f" {{ {', '.join(map(str,row))} }} ,\n"
+   text += "};\n\n\n"
+   text += f" static const int _ejfat_rs_n = {code.k}; // data words \n"
+   text += f" static const int _ejfat_rs_p = {2*code.t}; // parity words  \n"
+   text += f" static const int _ejfat_rs_k = {code.n}; // message words = data+parity \n"
+   rows = (","+ chr(10)).join([ "    {" + ",".join(map(str,row)) + "}" for row in code.G.tolist() ])
+   text += f"\n static const char _ejfat_rs_G[{code.k}][{code.n}] = {{\n{rows} \n }};\n\n"
+   return text
+
+def write_if_changed(path, text):
+   # Write text to path unless the file already holds it (keeping its timestamp). Returns True if
+   # the file was written.
+   try :
+      with open(path) as f:
+         if f.read() == text:
+            return False
+   except FileNotFoundError :
+      pass
+   tmp = f'{path}.tmp'
+   with open(tmp,'w') as f:
+      f.write(text)
+   os.replace(tmp,path)
+   return True
 
-   print(f''' static const char _ejfat_rs_gf_log_seq[{len(gf_log_seq)}] = {{ {",".join(map(str,list(gf_log_seq.values())))} }}; ''',file = C_Model_File)
+# ---------------------------- Main --------------------------------------
 
-   gf_exp_seq_sorted = dict(sorted(gf_exp_seq.items()))
-   print(f''' static const char _ejfat_rs_gf_exp_seq[{len(gf_exp_seq_sorted)}] = {{ {",".join(map(str,list(gf_exp_seq_sorted.values())))} }}; ''', file = C_Model_File)
+# Encoded/decoded words checked against the generated tables on every run.
+CHECK_WORDS = 1024
+
+def _int(text):
+   return int(text,0)
+
+def main(argv=None):
+   parser = argparse.ArgumentParser(description='Generate the Reed-Solomon lookup tables (fec_luts.svh) and C model header '
+                                                '(rs_model.h).')
+   parser.add_argument('--field', type=int, default=16, choices=sorted(FIELDS), help='GF order.')
+   parser.add_argument('--poly', type=_int, help='Irreducible polynomial, e.g. 0x13 (default: per field).')
+   parser.add_argument('--k', type=int, default=8, help='Data symbols per code word.')
+   parser.add_argument('--t', type=int, default=1, help='Corrected errors (2t parity symbols, 2t erasures).')
+   parser.add_argument('--out-dir', default='.', help='Output directory.')
+   parser.add_argument('--svh', default='fec_luts.svh', help='SystemVerilog include file name.')
+   parser.add_argument('--rs-model', action='store_true', help='Also write the C model header rs_model.h.')
+   parser.add_argument('--seed', type=int, default=0, help='Seed for the walkthrough erasures and the checks.')
+   parser.add_argument('--data', type=_int, nargs='+', help='Walkthrough message (default: 1 2 ... k).')
+   parser.add_argument('--hlut-cache', default=CACHE_DIR, help='H table cache directory (default: %(default)s, or $FEC_HLUT_CACHE if set).')
+   parser.add_argument('--no-cache', action='store_true', help='Always build the H tables.')
+   parser.add_argument('--verbose', action='store_true', help='Print the encode/decode walkthrough.')
+   args = parser.parse_args(argv)
 
-   print(f'static const char _ejfat_rs_gf_mul_table[{GF.order}][{GF.order}] = {{' , file = C_Model_File);
-   if GF.order <= 16 :
-      for i in range(0,GF.order) :
-         row = ', '.join(map(str,[gf_mul(i,j) for j in range(0,GF.order)]))
-         print(f''' {{ {row} }} ,''', file = C_Model_File)
-   print('};', file = C_Model_File)
-   
-   print('\n', file = C_Model_File);
-   print(f''' static const int _ejfat_rs_n = {n}; // data words ''' , file = C_Model_File);
-   print(f''' static const int _ejfat_rs_p = {2*t}; // parity words  ''' , file = C_Model_File);
-   print(f''' static const int _ejfat_rs_k = {n+2*t}; // message words = data+parity ''' , file = C_Model_File);   
-   
-   print(
-f'''
- static const char _ejfat_rs_G[{G.shape[0]}][{G.shape[1]}] = {{
-{
-(","+ chr(10)).join([ "    {" + ",".join(map(str,list(G[i]))) + "}" for i in range(len(G)) ])
-} 
- }};
-''',
-   file = C_Model_File)
-   
-
-   # ---------------------  Write the verilog include file for the fec lookup tables ----------------------
-
-if (True) :
-   svh_file = open("fec_luts.svh","w")
-
-   print(f"localparam GF_ORDER = {GF.order};", file = svh_file);
-   print(f"localparam SYM_SIZE = $clog2(GF_ORDER);\n", file = svh_file);
-
-   print(f'''localparam logic [SYM_SIZE-1:0] GF_LOG_LUT [GF_ORDER] =
-    '{{ {",".join(map(str,list(gf_log_seq.values())))} }};\n''', file = svh_file);
-
-   gf_exp_seq_sorted = dict(sorted(gf_exp_seq.items()))
-   print(f'''localparam logic [SYM_SIZE-1:0] GF_EXP_LUT [GF_ORDER] =
-    '{{ {",".join(map(str,list(gf_exp_seq_sorted.values())))} }};\n''', file = svh_file);
-
-   print(f'''localparam logic [SYM_SIZE-1:0] GF_MUL_LUT [GF_ORDER][GF_ORDER] = '{{''', file = svh_file);
-   for row in range(len(gf_mul_lut)):
-      if row < len(gf_mul_lut)-1:
-          print(f'''    '{{ {",".join(map(str,gf_mul_lut[row]))} }},''', file = svh_file);
-      else: # last row, no comma.
-          print(f'''    '{{ {",".join(map(str,gf_mul_lut[row]))} }}''', file = svh_file);
-   print(f'''}};\n''', file = svh_file);
-
-   print(f'''localparam logic [SYM_SIZE-1:0] GF_DIV_LUT [GF_ORDER][GF_ORDER] = '{{''', file = svh_file);
-   for row in range(len(gf_div_lut)):
-      if row < len(gf_div_lut)-1:
-          print(f'''    '{{ {",".join(map(str,gf_div_lut[row]))} }},''', file = svh_file);
-      else: # last row, no comma.
-          print(f'''    '{{ {",".join(map(str,gf_div_lut[row]))} }}''', file = svh_file);
-   print(f'''}};\n''', file = svh_file);
-
-   print(f'''localparam logic [SYM_SIZE-1:0] GF_ADD_LUT [GF_ORDER][GF_ORDER] = '{{''', file = svh_file);
-   for row in range(len(gf_add_lut)):
-      if row < len(gf_add_lut)-1:
-          print(f'''    '{{ {",".join(map(str,gf_add_lut[row]))} }},''', file = svh_file);
-      else: # last row, no comma.
-          print(f'''    '{{ {",".join(map(str,gf_add_lut[row]))} }}''', file = svh_file);
-   print(f'''}};\n''', file = svh_file);
-
-   print(f"localparam RS_N  = {len(d)+2*t};", file = svh_file);
-   print(f"localparam RS_K  = {len(d)};", file = svh_file);
-   print(f"localparam RS_2T = {2*t};\n", file = svh_file);
-
-   print(f'''localparam logic [RS_2T:0][SYM_SIZE-1:0] RS_G_POLY = '{{ {",".join(map(str,Gpoly[::-1]))} }};\n''',
-         file = svh_file);
-
-   print(f'''localparam logic [0:RS_K-1][0:RS_N-1][SYM_SIZE-1:0] RS_G_LUT = '{{''', file = svh_file);
-   for row in range(len(G)):
-      if row < len(G)-1:
-          print(f'''    '{{ {",".join(map(str,G[row]))} }},''', file = svh_file);
-      else: # last row, no comma.
-          print(f'''    '{{ {",".join(map(str,G[row]))} }}''', file = svh_file);
-   print(f'''}};\n''', file = svh_file);
-
-   print(f'''localparam logic [0:RS_2T-1][0:RS_K-1][SYM_SIZE-1:0] RS_P_LUT = '{{''', file = svh_file);
-   for row in range(len(P)):
-      if row < len(P)-1:
-          print(f'''    '{{ {",".join(map(str,P[row]))} }},''', file = svh_file);
-      else: # last row, no comma.
-          print(f'''    '{{ {",".join(map(str,P[row]))} }}''', file = svh_file);
-   print(f'''}};\n''', file = svh_file);
-
-   print(f'''localparam NUM_H = {len(H_LUT)};\n''', file = svh_file);
-
-   print(f'''localparam logic [0:NUM_H-1][0:RS_K-1][0:RS_K-1][SYM_SIZE-1:0] RS_H_LUT = '{{''', file = svh_file);
-   print(f'''    '{{''', file = svh_file);
-   for item in range(len(H_LUT)):
-      for row in range(len(H_LUT[item])):
-         if row < len(H_LUT[item])-1:
-             print(f'''        '{{ {",".join(map(str,H_LUT[item][row]))} }},''', file = svh_file);
-         else: # last row, no comma.
-             print(f'''        '{{ {",".join(map(str,H_LUT[item][row]))} }}''', file = svh_file);
-      if item < len(H_LUT)-1: print(f'''    }}, '{{''', file = svh_file);
-      else:        print(f'''    }}''',      file = svh_file);  # last row, no comma.
-   print(f'''}};\n''', file = svh_file);
-
-   print(f'''localparam logic [0:NUM_H-1][0:RS_N-1] RS_ERR_LOC_LUT = '{{''', file = svh_file);
-   for item in range(len(ERR_LOC_LUT)):
-      if item < len(ERR_LOC_LUT)-1:
-          print(f'''        '{{ {",".join(map(str,ERR_LOC_LUT[item]))} }},''', file = svh_file);
-      else:
-          print(f'''        '{{ {",".join(map(str,ERR_LOC_LUT[item]))} }}''', file = svh_file);
-   print(f'''}};''', file = svh_file);
-
-   svh_file.close()
+   try :
+      use_field(args.field, args.poly)
+      code = RSCode(gf, args.k, args.t)
+   except ValueError as e :
+      parser.error(str(e))
+   h_lut = h_table(code, None if args.no_cache else args.hlut_cache)
+   for e_bits in h_lut.positions[~h_lut.ok]:
+      print(f" ----  UNABLE TO INVERT G* ------ ")
+      print(f" Error locations .. {e_bits.tolist()}")
+
+   rng = random.Random(args.seed)
+   d = args.data if args.data else list(range(1, args.k + 1))
+   if len(d) != args.k:
+      parser.error(f'--data needs {args.k} symbols')
+   e_bits = rng.sample(range(0, code.n), 2*args.t)    # errors in m,p bits
+   if args.verbose:
+      walkthrough(code, d, e_bits)
+
+   # Check the tables on a batch of random words, encoded both ways and decoded from 2t erasures
+   # (every pattern of 2t erasures must be decodable).
+   words = code.random_data(CHECK_WORDS, args.seed)
+   mask = code.random_erasures(CHECK_WORDS, rng=args.seed)
+   encoded = code.encode(words)
+   (decoded, ok) = code.decode(code.erase(encoded, mask), mask)
+   if not (encoded == code.encode_poly(words)).all() or not ok.all() or not (decoded == words).all():
+      print(f'{code}: encode/decode check FAILED ({np.count_nonzero(~ok)} of {CHECK_WORDS} words not decodable)')
+      return 1
+
+   outputs = [(args.svh, fec_luts_svh(code, h_lut))]
+   if args.rs_model:
+      outputs.append(('rs_model.h', rs_model_h(code)))
+   os.makedirs(args.out_dir, exist_ok=True)
+   for (name, text) in outputs:
+      path = os.path.join(args.out_dir, name)
+      print(f'{path}: {"written" if write_if_changed(path, text) else "unchanged"}')
+   return 0
+
+if __name__ == '__main__':
+   sys.exit(main())
@@ -0,0 +1,237 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'FIELDS',
+    'GaloisField',
+)
+
+import numpy as np
+
+#---------------------------------------------------------------------------------------------------
+# Vectorized GF(2^m) arithmetic for the FEC matrix generator (genMatrix_simplified.py).
+#
+# All arithmetic goes through lookup tables held as NumPy arrays (exp/log, and full order x order
+# mul/div/add tables, at most 64KB each for GF(256)), so every operation accepts scalars or arrays of
+# symbols and works on whole arrays at once: element-wise ops are table gathers, dot products are
+# XOR reductions of gathered products, and matrices are inverted by Gauss-Jordan elimination applied
+# to a whole stack of matrices at once.
+#
+# Table conventions follow the generator (and so fec_luts.svh):
+#   exp_seq[i] = alpha^i for i < order-1, and exp_seq[order-1] = 0   (gf_log_seq, GF_LOG_LUT)
+#   log_seq[x] = i such that alpha^i = x, and log_seq[0] = order-1   (gf_exp_seq, GF_EXP_LUT)
+#---------------------------------------------------------------------------------------------------
+# Irreducible (primitive) polynomials of the supported fields, coefficients MSB first.
+FIELDS = {
+    8:   [1,0,1,1],
+    16:  [1,0,0,1,1],
+    32:  [1,0,0,1,0,1],
+    64:  [1,0,0,0,0,1,1],
+    256: [1,0,0,0,1,1,0,1,1],
+}
+
+class GaloisField:
+    def __init__(self, order, irreducible_poly=None):
+        degree = order.bit_length() - 1
+        if order != 1 << degree or not 2 <= degree <= 8:
+            raise ValueError(f'GF({order}) not supported (order must be 2^m, 2 <= m <= 8)')
+        if irreducible_poly is None:
+            irreducible_poly = FIELDS[order]
+        if not isinstance(irreducible_poly, int):
+            irreducible_poly = int(''.join(str(int(c)) for c in irreducible_poly), 2)
+        if irreducible_poly.bit_length() - 1 != degree:
+            raise ValueError(f'Polynomial 0x{irreducible_poly:x} is not of degree {degree}')
+        self.order = order
+        self.degree = degree
+        self.irreducible_poly = irreducible_poly
+        self.dtype = np.uint8
+
+        # Powers of the (smallest) primitive element, as chosen by galois.GF().
+        for element in range(2, order):
+            powers = self._powers(element)
+            if powers is not None:
+                break
+        else:
+            raise ValueError(f'Polynomial 0x{irreducible_poly:x} is not irreducible')
+        self.primitive_element = element
+
+        q = order - 1
+        self.exp_seq = np.array(powers + [0], dtype=self.dtype)
+        self.log_seq = np.zeros(order, dtype=np.int32)
+        self.log_seq[self.exp_seq[:q]] = np.arange(q)
+        self.log_seq[0] = q
+        # alpha^i for 0 <= i < 2q, so that sums of two logs need no reduction.
+        self._exp = np.concatenate((self.exp_seq[:q], self.exp_seq[:q]))
+
+        symbols = np.arange(order)
+        a = symbols[:, None]
+        b = symbols[None, :]
+        zero = (a == 0) | (b == 0)
+        log = np.where(symbols == 0, 0, self.log_seq) # Masked by zero.
+        self.add_table = (a ^ b).astype(self.dtype)
+        self.mul_table = np.where(zero, 0, self._exp[log[a] + log[b]]).astype(self.dtype)
+        self.div_table = np.where(zero, 0, self._exp[log[a] - log[b] + q]).astype(self.dtype)
+        self.inv_table = self.div_table[1]
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.order}, 0x{self.irreducible_poly:x})'
+
+    def _powers(self, element):
+        # Successive powers of element, or None if element is not primitive.
+        powers = []
+        x = 1
+        for _ in range(self.order - 1):
+            if powers and x == 1:
+                return None
+            powers.append(x)
+            # x = x * element, by shift-and-add modulo the irreducible polynomial.
+            (a, b, x) = (x, element, 0)
+            while b:
+                if b & 1:
+                    x ^= a
+                b >>= 1
+                a <<= 1
+                if a >> self.degree:
+                    a ^= self.irreducible_poly
+        return powers if x == 1 else None
+
+    def array(self, values):
+        values = np.asarray(values)
+        if values.size and (values.min() < 0 or values.max() >= self.order):
+            raise ValueError(f'Symbols out of range for GF({self.order})')
+        return values.astype(self.dtype)
+
+    #-----------------------------------------------------------------------------------------------
+    # Element-wise arithmetic (scalars or arrays, with broadcasting). Division by 0 gives 0.
+    #-----------------------------------------------------------------------------------------------
+    def add(self, a, b):
+        return np.bitwise_xor(a, b)
+
+    def mul(self, a, b):
+        return self.mul_table[a, b]
+
+    def div(self, a, b):
+        return self.div_table[a, b]
+
+    def inv(self, a):
+        return self.inv_table[a]
+
+    def power(self, a, n):
+        # a^n (with 0^n = 0 for n > 0, and a^0 = 1).
+        a = np.asarray(a)
+        result = self._exp[(self.log_seq[a].astype(np.int64) * n) % (self.order - 1)]
+        return np.where((a == 0) & (n != 0), 0, result).astype(self.dtype)
+
+    #-----------------------------------------------------------------------------------------------
+    # Polynomials (coefficient arrays, highest degree first).
+    #-----------------------------------------------------------------------------------------------
+    def poly_mul(self, a, b):
+        a = np.asarray(a)
+        b = np.asarray(b)
+        products = self.mul_table[a[:, None], b[None, :]]
+        result = np.zeros(len(a) + len(b) - 1, dtype=self.dtype)
+        for i in range(len(a)):
+            result[i:i + len(b)] ^= products[i]
+        return result
+
+    def poly_divmod(self, a, b):
+        # (quotient, remainder) of a / b, with a remainder of len(b)-1 coefficients (or a itself if it
+        # is shorter than b, as poly_div() of the original generator).
+        a = np.array(a, dtype=self.dtype)
+        b = np.asarray(b)
+        scale = self.inv_table[b[0]]
+        steps = len(a) - len(b) + 1
+        quotient = np.zeros(max(steps, 0), dtype=self.dtype)
+        for i in range(steps):
+            quotient[i] = self.mul_table[a[i], scale]
+            a[i:i + len(b)] ^= self.mul_table[quotient[i], b]
+        return (quotient, a[max(steps, 0):])
+
+    def poly_mod(self, a, b):
+        # Remainders of each polynomial along the last axis of a by b (len(b)-1 coefficients), one
+        # division step for all polynomials at a time.
+        a = np.array(a, dtype=self.dtype)
+        b = np.asarray(b)
+        scale = self.inv_table[b[0]]
+        divisor = self.mul_table[scale, b[1:]]
+        rem = np.zeros(a.shape[:-1] + (len(b) - 1,), dtype=self.dtype)
+        if len(b) == 1:
+            return rem
+        # Linear feedback shift register form of the long division.
+        for i in range(a.shape[-1]):
+            feedback = rem[..., 0].copy()
+            rem[..., :-1] = rem[..., 1:]
+            rem[..., -1] = a[..., i]
+            rem ^= self.mul_table[feedback[..., None], divisor]
+        return rem
+
+    def poly_eval(self, poly, x):
+        # Value of poly at x (Horner's rule, element-wise over x).
+        x = np.asarray(x)
+        y = np.zeros(x.shape, dtype=self.dtype)
+        for c in poly:
+            y = self.mul_table[y, x] ^ c
+        return y
+
+    #-----------------------------------------------------------------------------------------------
+    # Vectors and matrices. Leading (batch) dimensions are broadcast; large batches are processed in
+    # chunks to bound the size of the intermediate products.
+    #-----------------------------------------------------------------------------------------------
+    CHUNK_ELEMENTS = 1 << 24
+
+    def dot(self, x, y):
+        return np.bitwise_xor.reduce(self.mul_table[x, y], axis=-1)
+
+    def matvec(self, M, v):
+        # M (r, c) times vectors v (..., c) -> (..., r).
+        M = np.asarray(M)
+        v = np.asarray(v)
+        if v.ndim == 1:
+            return self.dot(M, v[None, :])
+        flat = v.reshape(-1, v.shape[-1])
+        out = np.empty((len(flat), M.shape[0]), dtype=self.dtype)
+        chunk = max(1, self.CHUNK_ELEMENTS // max(M.size, 1))
+        for i in range(0, len(flat), chunk):
+            out[i:i + chunk] = self.dot(M[None, :, :], flat[i:i + chunk, None, :])
+        return out.reshape(v.shape[:-1] + (M.shape[0],))
+
+    def matmul(self, A, B):
+        # (..., r, c) times (..., c, s) -> (..., r, s).
+        A = np.asarray(A)
+        B = np.asarray(B)
+        return np.bitwise_xor.reduce(self.mul_table[A[..., :, :, None], B[..., None, :, :]], axis=-2)
+
+    def inv_batch(self, A):
+        # Invert a stack of square matrices (..., k, k) by Gauss-Jordan elimination, applied to all
+        # matrices at once. Returns (inverses, invertible), where invertible flags the matrices that
+        # have an inverse (the inverses of the others are meaningless).
+        A = np.asarray(A)
+        shape = A.shape
+        k = shape[-1]
+        if shape[-2] != k:
+            raise ValueError(f'Matrices of shape {shape[-2:]} are not square')
+        A = A.reshape(-1, k, k)
+        count = len(A)
+        aug = np.zeros((count, k, 2 * k), dtype=self.dtype)
+        aug[:, :, :k] = A
+        aug[:, np.arange(k), k + np.arange(k)] = 1
+        singular = np.zeros(count, dtype=bool)
+        index = np.arange(count)
+        for col in range(k):
+            # Pivot: first row (at or below col) with a non-zero entry in col.
+            nonzero = aug[:, col:, col] != 0
+            singular |= ~nonzero.any(axis=1)
+            pivot = col + nonzero.argmax(axis=1)
+            rows = aug[index, pivot].copy()
+            aug[index, pivot] = aug[:, col]
+            aug[:, col] = self.mul_table[rows, self.inv_table[rows[:, col]][:, None]]
+            # Eliminate col from all other rows.
+            factors = aug[:, :, col].copy()
+            factors[:, col] = 0
+            aug ^= self.mul_table[factors[:, :, None], aug[:, col][:, None, :]]
+        return (aug[:, :, k:].reshape(shape), ~singular.reshape(shape[:-2]))
+
+    def matinv(self, A):
+        # Inverse of a square matrix (or stack of matrices); raises np.linalg.LinAlgError if singular.
+        (inverse, invertible) = self.inv_batch(A)
+        if not np.all(invertible):
+            raise np.linalg.LinAlgError('Matrix is singular')
+        return inverse
@@ -0,0 +1,196 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'RSCode',
+    'pattern_rank',
+    'write_vectors',
+    'write_stimulus',
+)
+
+import math
+
+import numpy as np
+
+from gf_engine import GaloisField
+from rs_hlut import h_matrices
+
+#---------------------------------------------------------------------------------------------------
+# Batch Reed-Solomon golden model, matching the generator (genMatrix_simplified.py) and the RTL
+# (rs_encode.sv, rs_decode_h_select.sv, rs_decode.sv).
+#
+# A code word is k data symbols followed by 2t parity symbols (n = k + 2t). Words are rows of (N, k)
+# or (N, n) symbol arrays, and every operation processes a whole batch at once. Erasures are given as
+# (N, n) boolean masks; up to 2t erasures per word are corrected by the erasure pattern's H matrix, the
+# inverse of G^T without the erased rows, selected (as in the RTL) by the pattern's index among
+# itertools.combinations(range(n), 2t).
+#---------------------------------------------------------------------------------------------------
+def pattern_rank(positions, n):
+    # Index of each pattern (rows of sorted positions, (N, r)) among combinations(range(n), r).
+    positions = np.asarray(positions, dtype=np.int64)
+    r = positions.shape[-1]
+    if math.comb(n, r) >= 1 << 62:
+        raise ValueError(f'Too many patterns of {r} among {n}')
+    # rank = C(n, r) - 1 - sum_i C(n-1-c_i, r-i)
+    comb = np.array([[math.comb(a, b) for b in range(r + 1)] for a in range(n + 1)], dtype=np.int64)
+    terms = comb[n - 1 - positions, r - np.arange(r)]
+    return math.comb(n, r) - 1 - terms.sum(axis=-1)
+
+class RSCode:
+    def __init__(self, field, k, t):
+        if not isinstance(field, GaloisField):
+            field = GaloisField(field)
+        n = k + 2 * t
+        if n >= field.order:
+            raise ValueError(f'Code length {n} exceeds GF({field.order}) (at most {field.order - 1})')
+        self.gf = field
+        self.k = k
+        self.t = t
+        self.n = n
+
+        # Generator polynomial: product of (x + alpha^a) for a = 1..2t.
+        gen_poly = np.array([1], dtype=field.dtype)
+        for a in range(1, 2 * t + 1):
+            gen_poly = field.poly_mul(gen_poly, [1, field.exp_seq[a]])
+        self.gen_poly = gen_poly
+
+        # Systematic generator matrix G = [I | P^T], where each parity row is the remainder of the
+        # identity row divided by the generator polynomial; P (2t, k) is RS_P_LUT.
+        identity = np.eye(k, n, dtype=field.dtype)
+        self.G = identity.copy()
+        self.G[:, k:] = field.poly_mod(identity, gen_poly)
+        self.P = self.G[:, k:].T.copy()
+        self._h = {}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(GF({self.gf.order}), k={self.k}, t={self.t})'
+
+    @property
+    def num_patterns(self):
+        return math.comb(self.n, 2 * self.t)
+
+    def random_data(self, count, rng=None):
+        rng = np.random.default_rng(rng)
+        return rng.integers(0, self.gf.order, (count, self.k)).astype(self.gf.dtype)
+
+    def encode(self, data):
+        # Code words (N, n) for data words (N, k).
+        data = self.gf.array(data)
+        parity = self.gf.matvec(self.P, data)
+        return np.concatenate((data, parity), axis=-1)
+
+    def encode_poly(self, data):
+        # Same as encode(), by polynomial division (as rs_poly_encode()/rs_model.svh).
+        data = self.gf.array(data)
+        shifted = np.concatenate((data, np.zeros(data.shape[:-1] + (2 * self.t,), dtype=data.dtype)), axis=-1)
+        return np.concatenate((data, self.gf.poly_mod(shifted, self.gen_poly)), axis=-1)
+
+    def random_erasures(self, count, erasures=None, rng=None):
+        # (count, n) erasure masks with `erasures` (default 2t) erased symbols at random positions.
+        rng = np.random.default_rng(rng)
+        erasures = 2 * self.t if erasures is None else erasures
+        order = np.argsort(rng.random((count, self.n)), axis=1)
+        mask = np.zeros((count, self.n), dtype=bool)
+        np.put_along_axis(mask, order[:, :erasures], True, axis=1)
+        return mask
+
+    def erase(self, words, mask, fill=0):
+        # Received words: code words with the erased symbols replaced by fill.
+        return np.where(mask, fill, words).astype(self.gf.dtype)
+
+    def patterns(self, mask):
+        # Decoding pattern of each word: (positions (N, 2t), rank (N,), ok (N,)). Words with fewer
+        # than 2t erasures are completed with the highest non-erased positions; words with more than
+        # 2t erasures are not decodable (ok False).
+        mask = np.asarray(mask, dtype=bool)
+        ok = mask.sum(axis=-1) <= 2 * self.t
+        score = mask * (2 * self.n) + np.arange(self.n)
+        positions = np.sort(np.argsort(-score, axis=-1, kind='stable')[..., :2 * self.t], axis=-1)
+        return (positions, pattern_rank(positions, self.n), ok)
+
+    def h_matrices(self, positions):
+        # H matrices (P, k, k) for erasure patterns (P, 2t), with a flag for those that exist.
+        return h_matrices(self, np.atleast_2d(positions))
+
+    def _h_for(self, ranks, positions):
+        # H matrices for the distinct patterns of a batch, cached across calls.
+        (unique, first, inverse) = np.unique(ranks, return_index=True, return_inverse=True)
+        missing = [i for (i, rank) in enumerate(unique) if rank not in self._h]
+        if missing:
+            (h, ok) = self.h_matrices(positions[first[missing]])
+            for (j, i) in enumerate(missing):
+                self._h[int(unique[i])] = (h[j], bool(ok[j]))
+        h = np.stack([self._h[int(rank)][0] for rank in unique])
+        ok = np.array([self._h[int(rank)][1] for rank in unique])
+        return (h[inverse.reshape(-1)], ok[inverse.reshape(-1)])
+
+    def decode(self, received, mask):
+        # Data words (N, k) recovered from received words (N, n) with the erasures in mask, and a
+        # flag for the words that could be decoded (the data of the others is meaningless).
+        received = self.gf.array(received)
+        mask = np.asarray(mask, dtype=bool)
+        (positions, ranks, ok) = self.patterns(mask)
+        kept = np.ones(mask.shape, dtype=bool)
+        np.put_along_axis(kept, positions, False, axis=-1)
+        symbols = received[kept].reshape(-1, self.k)
+        (h, invertible) = self._h_for(ranks, positions)
+        data = np.empty((len(symbols), self.k), dtype=self.gf.dtype)
+        chunk = max(1, self.gf.CHUNK_ELEMENTS // (self.k * self.k))
+        for i in range(0, len(symbols), chunk):
+            data[i:i + chunk] = self.gf.dot(h[i:i + chunk], symbols[i:i + chunk, None, :])
+        return (data, ok & invertible)
+
+#---------------------------------------------------------------------------------------------------
+# Test vector files, in $readmemh format: one vector per line, written as the hex value of the packed
+# SystemVerilog array logic [0:W-1][SYM_SIZE-1:0] (symbol 0 in the most significant position, as in
+# fec_luts.svh), preceded by a // comment line.
+#---------------------------------------------------------------------------------------------------
+def write_vectors(path, symbols, sym_size, comment=None):
+    symbols = np.asarray(symbols)
+    if symbols.ndim == 1:
+        symbols = symbols[:, None]
+    (count, width) = symbols.shape
+    bits = ((symbols[:, :, None].astype(np.uint32) >> np.arange(sym_size - 1, -1, -1)) & 1).astype(np.uint8)
+    bits = bits.reshape(count, width * sym_size)
+    digits = -(-width * sym_size // 4)
+    pad = 8 * -(-digits // 2) - width * sym_size
+    packed = np.packbits(np.pad(bits, ((0, 0), (pad, 0))), axis=1)
+    text = packed.tobytes().hex()
+    row = 2 * packed.shape[1]
+    skip = row - digits
+    with open(path, 'w') as f:
+        if comment is not None:
+            f.write(f'// {comment}\n')
+        f.writelines(text[i + skip:i + row] + '\n' for i in range(0, len(text), row))
+
+def write_stimulus(prefix, code, data, mask):
+    # Encode data (N, k), erase the masked symbols and decode. Writes the files consumed by the RS
+    # testbenches and returns their paths:
+    #   <prefix>_data.hex     data words              logic [0:RS_K-1][SYM_SIZE-1:0]
+    #   <prefix>_encoded.hex  code words              logic [0:RS_N-1][SYM_SIZE-1:0]
+    #   <prefix>_rx.hex       received words          logic [0:RS_N-1][SYM_SIZE-1:0] (erasures zeroed)
+    #   <prefix>_err_loc.hex  erasure pattern index   logic [$clog2(NUM_H)-1:0] (rs_decode_h_select)
+    #   <prefix>_err_vec.hex  erasure pattern         logic [0:RS_N-1] (RS_ERR_LOC_LUT entry)
+    #   <prefix>_decoded.hex  expected decoded words  logic [0:RS_K-1][SYM_SIZE-1:0]
+    sym_size = code.gf.degree
+    encoded = code.encode(data)
+    received = code.erase(encoded, mask)
+    (positions, ranks, ok) = code.patterns(mask)
+    err_vec = np.zeros(mask.shape, dtype=np.uint8)
+    np.put_along_axis(err_vec, positions, 1, axis=-1)
+    (decoded, decodable) = code.decode(received, mask)
+    if not decodable.all():
+        raise ValueError(f'{np.count_nonzero(~decodable)} words cannot be decoded')
+    index_bits = max(1, (code.num_patterns - 1).bit_length())
+    desc = f'GF({code.gf.order}) k={code.k} t={code.t}'
+    files = {
+        'data':    (data, sym_size),
+        'encoded': (encoded, sym_size),
+        'rx':      (received, sym_size),
+        'err_loc': (ranks, index_bits),
+        'err_vec': (err_vec, 1),
+        'decoded': (decoded, sym_size),
+    }
+    paths = {}
+    for (name, (values, size)) in files.items():
+        paths[name] = f'{prefix}_{name}.hex'
+        write_vectors(paths[name], values, size, f'{desc} {name} ({len(values)} vectors)')
+    return paths
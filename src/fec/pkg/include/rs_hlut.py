@@ -0,0 +1,213 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'CACHE_DIR',
+    'HTable',
+    'build_h_table',
+    'check_h_table',
+    'h_matrices',
+    'h_table',
+    'invertible',
+    'pattern_chunks',
+)
+
+import itertools
+import math
+import os
+import zipfile
+
+import numpy as np
+
+#---------------------------------------------------------------------------------------------------
+# Erasure decoding tables of rs_decode_h_select.sv (RS_H_LUT, RS_ERR_LOC_LUT), for an RSCode (see
+# rs_codec.py).
+#
+# There is one entry per pattern of 2t erased symbols, in itertools.combinations(range(n), 2t) order:
+# the pattern's error location vector and its H matrix, the inverse of G^T without the erased rows.
+# As G^T = [I; P], the k kept rows are the unit rows of the kept data symbols and the e parity rows
+# that are left (where e is the number of erased data symbols), so
+#   r_p = A d_kept + S d_erased,   with S = P[kept parity][:, erased data], A = P[kept parity][:, kept data]
+# and H is the identity on the kept data symbols, with rows S^-1 A and S^-1 for the erased ones. Only
+# the small e x e matrices S are inverted (the pattern exists iff S is invertible), in stacks of all
+# patterns with the same e at once.
+#
+# Tables are cached on disk, keyed by table format, field, irreducible polynomial, k and t, in the
+# project output directory (.out, removed by make clean) unless FEC_HLUT_CACHE says otherwise. A cached
+# table is only used if its patterns are exactly the combinations and a random sample of its H
+# matrices invert G^T without the erased rows (it is rebuilt otherwise).
+#---------------------------------------------------------------------------------------------------
+PROJ_ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', '..'))
+CACHE_DIR = os.environ.get('FEC_HLUT_CACHE', os.path.join(PROJ_ROOT, '.out', 'fec_hlut'))
+
+# Version of the cached table layout; bump it whenever the contents or their order change.
+HLUT_FORMAT = 1
+
+# Number of patterns checked when a table is loaded from the cache.
+CHECK_PATTERNS = 256
+
+# Number of patterns processed at a time (bounds the size of the intermediate arrays).
+CHUNK_PATTERNS = 1 << 16
+
+class HTable:
+    def __init__(self, n, positions, h, ok):
+        self.n = n
+        self.positions = positions # (P, 2t) erased positions of each pattern
+        self.h = h                 # (P, k, k) H matrices
+        self.ok = ok               # (P,) patterns that can be decoded
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def err_loc(self):
+        # (P, n) error location vectors (RS_ERR_LOC_LUT entries).
+        err_loc = np.zeros((len(self.positions), self.n), dtype=np.uint8)
+        np.put_along_axis(err_loc, self.positions, 1, axis=1)
+        return err_loc
+
+    def svh(self):
+        # NUM_H, RS_H_LUT and RS_ERR_LOC_LUT declarations (as written to fec_luts.svh). Patterns that
+        # cannot be decoded are left out.
+        h = self.h[self.ok]
+        err_loc = self.err_loc[self.ok]
+        def row(values):
+            return f"'{{ {','.join(map(str, values.tolist()))} }}"
+        lines = [f'localparam NUM_H = {len(h)};', '']
+        lines.append("localparam logic [0:NUM_H-1][0:RS_K-1][0:RS_K-1][SYM_SIZE-1:0] RS_H_LUT = '{")
+        for (item, matrix) in enumerate(h):
+            lines.append("    '{" if item == 0 else "    }, '{")
+            lines.append(',\n'.join(f'        {row(r)}' for r in matrix))
+        lines.extend(('    }', '};', ''))
+        lines.append("localparam logic [0:NUM_H-1][0:RS_N-1] RS_ERR_LOC_LUT = '{")
+        lines.append(',\n'.join(f'        {row(r)}' for r in err_loc))
+        lines.append('};')
+        return '\n'.join(lines) + '\n'
+
+def pattern_chunks(n, r, chunk=CHUNK_PATTERNS):
+    # All patterns of r positions among n, in combinations order, in (count, r) arrays of at most
+    # chunk patterns.
+    combinations = itertools.combinations(range(n), r)
+    while True:
+        positions = np.fromiter(itertools.chain.from_iterable(itertools.islice(combinations, chunk)),
+                                dtype=np.int64)
+        if not len(positions):
+            return
+        yield positions.reshape(-1, r)
+
+def _blocks(code, positions):
+    # Split erasure patterns (P, 2t) by their number e of erased data symbols. Generates, for each e,
+    # (sel, kept_data, erased_data, rows) with the indices sel of the patterns, their kept (m, k-e) and
+    # erased (m, e) data positions, and their remaining parity rows of P (m, e, k).
+    (k, n) = (code.k, code.n)
+    count = len(positions)
+    erased = np.zeros((count, n), dtype=bool)
+    np.put_along_axis(erased, positions, True, axis=1)
+    # Kept positions (k of them) in order: kept data positions first, kept parity positions last.
+    kept = np.nonzero(~erased)[1].reshape(count, k)
+    e = np.count_nonzero(erased[:, :k], axis=1)
+    for size in np.unique(e):
+        sel = np.nonzero(e == size)[0]
+        erased_data = np.nonzero(erased[sel, :k])[1].reshape(len(sel), size)
+        yield (sel, kept[sel, :k - size], erased_data, code.P[kept[sel, k - size:] - k])
+
+def invertible(code, positions):
+    # Flags (P,) the erasure patterns (P, 2t) that have an H matrix.
+    ok = np.ones(len(positions), dtype=bool)
+    for (sel, _, erased_data, rows) in _blocks(code, positions):
+        if erased_data.shape[1]:
+            ok[sel] = code.gf.inv_batch(np.take_along_axis(rows, erased_data[:, None, :], axis=2))[1]
+    return ok
+
+def h_matrices(code, positions):
+    # H matrices (P, k, k) and invertible flags (P,) for erasure patterns (P, 2t).
+    k = code.k
+    gf = code.gf
+    h = np.zeros((len(positions), k, k), dtype=gf.dtype)
+    ok = np.ones(len(positions), dtype=bool)
+    for (sel, kept_data, erased_data, rows) in _blocks(code, positions):
+        size = erased_data.shape[1]
+        h[sel[:, None], kept_data, np.arange(k - size)] = 1
+        if not size:
+            continue
+        S = np.take_along_axis(rows, erased_data[:, None, :], axis=2)
+        A = np.take_along_axis(rows, kept_data[:, None, :], axis=2)
+        (S_inv, ok[sel]) = gf.inv_batch(S)
+        h[sel[:, None], erased_data, :k - size] = gf.matmul(S_inv, A)
+        h[sel[:, None], erased_data, k - size:] = S_inv
+    return (h, ok)
+
+def build_h_table(code):
+    num = code.num_patterns
+    positions = np.empty((num, 2 * code.t), dtype=np.int64)
+    h = np.empty((num, code.k, code.k), dtype=code.gf.dtype)
+    ok = np.empty(num, dtype=bool)
+    start = 0
+    for chunk in pattern_chunks(code.n, 2 * code.t):
+        end = start + len(chunk)
+        positions[start:end] = chunk
+        (h[start:end], ok[start:end]) = h_matrices(code, chunk)
+        start = end
+    return HTable(code.n, positions, h, ok)
+
+def _is_combinations(positions, n):
+    # True if positions (P, r) holds every pattern of r positions among n, in combinations order: as
+    # many rows as patterns, each strictly increasing within range(n), in strictly increasing
+    # lexicographic order.
+    (count, r) = positions.shape
+    if count != math.comb(n, r):
+        return False
+    if count and (positions.min() < 0 or positions.max() >= n):
+        return False
+    if not (np.diff(positions, axis=1) > 0).all():
+        return False
+    step = positions[1:] - positions[:-1]
+    first = np.argmax(step != 0, axis=1)
+    return bool((np.take_along_axis(step, first[:, None], axis=1) > 0).all())
+
+def check_h_table(code, table, sample=CHECK_PATTERNS, rng=None):
+    # Consistency check of a table for code (e.g. as loaded from the cache): its layout, its patterns
+    # and, for a random sample of patterns, the H matrices (H G^T[kept] = I) and invertible flags.
+    (k, n) = (code.k, code.n)
+    count = math.comb(n, 2 * code.t)
+    if table.n != n or table.positions.shape != (count, 2 * code.t) or table.h.shape != (count, k, k) or \
+       table.ok.shape != (count,):
+        return False
+    if not _is_combinations(table.positions, n):
+        return False
+    sel = np.random.default_rng(rng).choice(count, min(sample, count), replace=False)
+    positions = table.positions[sel]
+    ok = table.ok[sel]
+    if (invertible(code, positions) != ok).any():
+        return False
+    if not ok.any():
+        return True
+    erased = np.zeros((len(sel), n), dtype=bool)
+    np.put_along_axis(erased, positions, True, axis=1)
+    kept = np.nonzero(~erased)[1].reshape(len(sel), k)[ok]
+    product = code.gf.matmul(table.h[sel][ok], code.G.T[kept])
+    return bool((product == np.eye(k, dtype=product.dtype)).all())
+
+def _cache_path(code, cache_dir):
+    return os.path.join(cache_dir, f'hlut_v{HLUT_FORMAT}_gf{code.gf.order}_{code.gf.irreducible_poly:x}'
+                                   f'_k{code.k}_t{code.t}.npz')
+
+def h_table(code, cache_dir=CACHE_DIR):
+    # HTable for code, from the cache in cache_dir if present (built and saved otherwise). With
+    # cache_dir None, the table is always built.
+    if cache_dir is None:
+        return build_h_table(code)
+    path = _cache_path(code, cache_dir)
+    try:
+        with np.load(path) as f:
+            table = HTable(code.n, f['positions'], f['h'], f['ok'])
+        if check_h_table(code, table):
+            return table
+    except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile):
+        pass # Missing, truncated or corrupt: rebuilt.
+    table = build_h_table(code)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Written to a temporary file first, so concurrent builds never see a partial table.
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez(f, positions=table.positions, h=table.h, ok=table.ok)
+    os.replace(tmp, path)
+    return table
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+#---------------------------------------------------------------------------------------------------
+# Sweep of Reed-Solomon code parameters (GF order, k, t) for new FEC designs.
+#
+# For each (field, k, t) point, every erasure pattern of 2t symbols is checked for an H matrix (see
+# rs_hlut.py), or a random sample of them when there are more than --max-patterns, and the table
+# sizes and LUT memory of the resulting fec_luts.svh are estimated. Points are evaluated in a process
+# pool, and each result is appended to the output file (CSV, or JSON Lines for any other extension)
+# as soon as it is available. Points already in the output file are skipped, so an interrupted sweep
+# resumes where it left off.
+#
+#   rs_sweep.py --field 16 32 256 --k 4-32 --t 1-2 --out sweep.csv
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'COLUMNS',
+    'lut_bits',
+    'check_point',
+    'sweep',
+    'main',
+)
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from gf_engine import FIELDS, GaloisField
+from rs_codec import RSCode
+from rs_hlut import invertible, pattern_chunks
+
+# Patterns checked at most per point by default (sampled at random beyond that).
+MAX_PATTERNS = 1 << 20
+
+# Bound on the symbols held by the patterns and parity rows of a chunk.
+CHUNK_ELEMENTS = 1 << 24
+
+COLUMNS = (
+    'field', 'poly', 'k', 't', 'n',
+    'patterns', 'checked', 'exhaustive', 'singular', 'first_singular', 'num_h',
+    'gf_lut_bits', 'rs_lut_bits', 'h_lut_bits', 'err_loc_lut_bits', 'total_bits',
+    'seconds',
+)
+
+def lut_bits(order, k, t, num_h):
+    # Size in bits of the fec_luts.svh tables: GF log/exp and mul/div/add tables, the encoder tables
+    # (RS_G_POLY, RS_G_LUT, RS_P_LUT) and the decoder tables (RS_H_LUT, RS_ERR_LOC_LUT).
+    sym_size = order.bit_length() - 1
+    n = k + 2 * t
+    return {
+        'gf_lut_bits':      (2 * order + 3 * order * order) * sym_size,
+        'rs_lut_bits':      ((2 * t + 1) + k * n + 2 * t * k) * sym_size,
+        'h_lut_bits':       num_h * k * k * sym_size,
+        'err_loc_lut_bits': num_h * n,
+    }
+
+def _sample(n, r, count, chunk, seed):
+    # count random patterns of r positions among n (with repeats), in (chunk, r) arrays.
+    rng = np.random.default_rng(seed)
+    while count > 0:
+        size = min(chunk, count)
+        positions = np.argpartition(rng.random((size, n)), r - 1, axis=1)[:, :r]
+        yield np.sort(positions, axis=1)
+        count -= size
+
+def check_point(order, k, t, max_patterns=MAX_PATTERNS, seed=0):
+    # Result row (a dict of COLUMNS) for GF(order), k data symbols and 2t parity symbols.
+    start = time.perf_counter()
+    code = RSCode(GaloisField(order, FIELDS[order]), k, t)
+    patterns = code.num_patterns
+    exhaustive = max_patterns is None or patterns <= max_patterns
+    chunk = max(1, CHUNK_ELEMENTS // (code.n + 2 * t * k))
+    if exhaustive:
+        chunks = pattern_chunks(code.n, 2 * t, chunk)
+    else:
+        chunks = _sample(code.n, 2 * t, max_patterns, chunk, seed)
+    checked = 0
+    singular = 0
+    first_singular = None
+    for positions in chunks:
+        ok = invertible(code, positions)
+        checked += len(positions)
+        singular += int(np.count_nonzero(~ok))
+        if first_singular is None and not ok.all():
+            first_singular = ' '.join(map(str, positions[~ok][0].tolist()))
+    # Without an exhaustive check, the table size assumes that all patterns have an H matrix.
+    num_h = patterns - singular if exhaustive else patterns
+    result = {
+        'field': order,
+        'poly': f'0x{code.gf.irreducible_poly:x}',
+        'k': k,
+        't': t,
+        'n': code.n,
+        'patterns': patterns,
+        'checked': checked,
+        'exhaustive': exhaustive,
+        'singular': singular,
+        'first_singular': first_singular,
+        'num_h': num_h,
+    }
+    result.update(lut_bits(order, k, t, num_h))
+    result['total_bits'] = sum(result[name] for name in ('gf_lut_bits', 'rs_lut_bits', 'h_lut_bits',
+                                                         'err_loc_lut_bits'))
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    return result
+
+def _key(row):
+    return (int(row['field']), str(row['poly']), int(row['k']), int(row['t']))
+
+def _read_done(path, is_csv):
+    # Keys of the points already in the output file. A line cut short by an interruption is removed.
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            f.truncate(end)
+    with open(path, newline='') as f:
+        if is_csv:
+            return {_key(row) for row in csv.DictReader(f)}
+        return {_key(json.loads(line)) for line in f if line.strip()}
+
+def sweep(points, path, jobs=None, max_patterns=MAX_PATTERNS, seed=0, callback=None):
+    # Evaluate (order, k, t) points in a process pool, appending each result to path. Points already
+    # in path and points with no valid code (n >= order) are skipped. Returns the new results.
+    is_csv = path.endswith('.csv')
+    done = _read_done(path, is_csv)
+    todo = []
+    for (order, k, t) in points:
+        if k + 2 * t >= order:
+            continue
+        if (order, f'0x{GaloisField(order).irreducible_poly:x}', k, t) not in done:
+            todo.append((order, k, t))
+    results = []
+    new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+    # Workers are started from a fork server rather than forked from the calling process: sweep() is
+    # also called from other programs (and from pytest), whose threads and their locks do not survive a
+    # fork, so a forked pool could hang its parent on exit.
+    context = multiprocessing.get_context('forkserver')
+    with open(path, 'a', newline='') as f, concurrent.futures.ProcessPoolExecutor(jobs, context) as pool:
+        if is_csv:
+            writer = csv.DictWriter(f, COLUMNS)
+            if new_file:
+                writer.writeheader()
+        futures = [pool.submit(check_point, order, k, t, max_patterns, seed) for (order, k, t) in todo]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            if is_csv:
+                writer.writerow(result)
+            else:
+                f.write(json.dumps(result) + '\n')
+            f.flush()
+            results.append(result)
+            if callback is not None:
+                callback(result)
+    return results
+
+def _range(text):
+    # Integers given as '4', '4-32' or '4-32:4' (with a step).
+    (text, _, step) = text.partition(':')
+    (first, _, last) = text.partition('-')
+    return list(range(int(first), int(last or first) + 1, int(step or 1)))
+
+def _print_result(result):
+    status = 'OK' if not result['singular'] else f"{result['singular']} SINGULAR"
+    check = '(all)' if result['exhaustive'] else '(sampled)'
+    print(f"GF({result['field']:3}) k={result['k']:3} t={result['t']:2}  {result['patterns']:>12} patterns "
+          f"{check:9} {status:>14}  {result['total_bits'] / 8192:12.1f} KiB  {result['seconds']:8.2f}s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check erasure decoding (H matrix) invertibility and LUT '
+                                                 'sizes over Reed-Solomon code parameters.')
+    parser.add_argument('--field', nargs='+', type=int, default=sorted(FIELDS), choices=sorted(FIELDS),
+                        help='GF orders to sweep (default: all).')
+    parser.add_argument('--k', nargs='+', type=_range, default=[_range('2-16')],
+                        help="Data symbols per code word: values or ranges 'first-last[:step]'.")
+    parser.add_argument('--t', nargs='+', type=_range, default=[_range('1-2')],
+                        help='Corrected errors (2t erasures): values or ranges.')
+    parser.add_argument('--out', default='rs_sweep.csv', help='Output file (.csv, else JSON Lines).')
+    parser.add_argument('--jobs', type=int, help='Worker processes (default: CPU count).')
+    parser.add_argument('--max-patterns', type=int, default=MAX_PATTERNS,
+                        help='Patterns checked per point before sampling (0: check all).')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the pattern samples.')
+    args = parser.parse_args(argv)
+
+    ks = sorted(set(k for values in args.k for k in values))
+    ts = sorted(set(t for values in args.t for t in values))
+    points = [(order, k, t) for order in args.field for t in ts for k in ks]
+    results = sweep(points, args.out, args.jobs, args.max_patterns or None, args.seed, _print_result)
+    singular = [result for result in results if result['singular']]
+    print(f'{len(results)} points evaluated ({len(singular)} with singular patterns), results in {args.out}')
+    return 1 if singular else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import itertools
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from gf_engine import FIELDS, GaloisField
+
+# Scalar reference arithmetic: shift-and-add multiplication modulo the irreducible polynomial, and
+# division through a brute force inverse (division by 0 gives 0, as in the generator).
+def _mul(gf, a, b):
+    x = 0
+    while b:
+        if b & 1:
+            x ^= a
+        b >>= 1
+        a <<= 1
+        if a >> gf.degree:
+            a ^= gf.irreducible_poly
+    return x
+
+def _inverses(gf):
+    inverses = [0] * gf.order
+    for (a, b) in itertools.product(range(1, gf.order), repeat=2):
+        if _mul(gf, a, b) == 1:
+            inverses[a] = b
+    return inverses
+
+def _div(gf, inverses, a, b):
+    return _mul(gf, a, inverses[b])
+
+def _poly_mod(gf, inverses, a, b):
+    # Long division (as poly_div() of the original generator), returning the remainder.
+    a = list(a)
+    while len(a) >= len(b):
+        scale = _div(gf, inverses, a[0], b[0])
+        a = [x ^ _mul(gf, y, scale) for (x, y) in itertools.zip_longest(a, b, fillvalue=0)][1:]
+    return [0] * (len(b) - 1 - len(a)) + a
+
+def _matmul(gf, A, B):
+    result = []
+    for row in A:
+        out = []
+        for col in zip(*B):
+            x = 0
+            for (a, b) in zip(row, col):
+                x ^= _mul(gf, a, b)
+            out.append(x)
+        result.append(out)
+    return result
+
+def _rank(gf, inverses, M):
+    # Rank by scalar Gaussian elimination.
+    M = [list(row) for row in M]
+    rank = 0
+    for col in range(len(M[0])):
+        pivot = next((r for r in range(rank, len(M)) if M[r][col]), None)
+        if pivot is None:
+            continue
+        (M[rank], M[pivot]) = (M[pivot], M[rank])
+        scale = inverses[M[rank][col]]
+        M[rank] = [_mul(gf, x, scale) for x in M[rank]]
+        for r in range(len(M)):
+            if r != rank and M[r][col]:
+                factor = M[r][col]
+                M[r] = [x ^ _mul(gf, factor, y) for (x, y) in zip(M[r], M[rank])]
+        rank += 1
+    return rank
+
+@pytest.fixture(params=sorted(FIELDS), ids=lambda order: f'gf{order}')
+def gf(request):
+    return GaloisField(request.param)
+
+@pytest.fixture
+def inverses(gf):
+    return _inverses(gf)
+
+def test_tables(gf):
+    q = gf.order - 1
+    assert gf.exp_seq[q] == 0 and gf.log_seq[0] == q
+    assert sorted(gf.exp_seq[:q].tolist()) == list(range(1, gf.order))
+    for i in range(q):
+        assert gf.log_seq[gf.exp_seq[i]] == i
+        assert gf.exp_seq[(i + 1) % q] == _mul(gf, int(gf.exp_seq[i]), gf.primitive_element)
+
+def test_mul_div(gf, inverses):
+    symbols = range(gf.order)
+    mul = [[_mul(gf, a, b) for b in symbols] for a in symbols]
+    div = [[_div(gf, inverses, a, b) for b in symbols] for a in symbols]
+    a = np.arange(gf.order)[:, None]
+    b = np.arange(gf.order)[None, :]
+    assert gf.mul(a, b).tolist() == mul
+    assert gf.div(a, b).tolist() == div
+    assert gf.inv(np.arange(gf.order)).tolist() == inverses
+    assert int(gf.mul(3, 2)) == mul[3][2]
+
+def test_power(gf):
+    for a in (0, 1, 2, gf.order - 1):
+        x = 1
+        for n in range(2 * gf.order):
+            assert int(gf.power(a, n)) == x
+            x = _mul(gf, x, a)
+
+def test_matmul(gf):
+    rng = random.Random(gf.order)
+    for (r, c, s) in ((1, 1, 1), (3, 4, 2), (5, 5, 5)):
+        A = [[rng.randrange(gf.order) for _ in range(c)] for _ in range(r)]
+        B = [[rng.randrange(gf.order) for _ in range(s)] for _ in range(c)]
+        assert gf.matmul(A, B).tolist() == _matmul(gf, A, B)
+        v = [row[0] for row in B]
+        assert gf.matvec(A, v).tolist() == [row[0] for row in _matmul(gf, A, B)]
+    # Stacks of matrices.
+    A = np.array([[[rng.randrange(gf.order) for _ in range(3)] for _ in range(3)] for _ in range(4)])
+    assert gf.matmul(A, A).tolist() == [_matmul(gf, m, m) for m in A.tolist()]
+
+def test_inv_batch(gf, inverses):
+    rng = random.Random(gf.order)
+    for k in (1, 2, 3, 4):
+        matrices = [[[rng.randrange(gf.order) for _ in range(k)] for _ in range(k)] for _ in range(40)]
+        # Singular matrices: a zero column, a repeated row and a scaled row.
+        matrices[0] = [[0] + row[1:] for row in matrices[0]]
+        if k > 1:
+            matrices[1][1] = matrices[1][0]
+            matrices[2][1] = [_mul(gf, x, 2) for x in matrices[2][0]]
+        (inverse, invertible) = gf.inv_batch(np.array(matrices))
+        identity = np.eye(k, dtype=int).tolist()
+        for (M, M_inv, ok) in zip(matrices, inverse.tolist(), invertible.tolist()):
+            assert ok == (_rank(gf, inverses, M) == k)
+            if ok:
+                assert _matmul(gf, M, M_inv) == identity
+                assert _matmul(gf, M_inv, M) == identity
+    with pytest.raises(np.linalg.LinAlgError):
+        gf.matinv(np.zeros((2, 2), dtype=gf.dtype))
+
+def test_poly_mod(gf, inverses):
+    rng = random.Random(gf.order)
+    for (size, degree) in ((1, 1), (5, 2), (12, 4), (3, 5)):
+        b = [rng.randrange(1, gf.order)] + [rng.randrange(gf.order) for _ in range(degree)]
+        polys = [[rng.randrange(gf.order) for _ in range(size)] for _ in range(6)]
+        expected = [_poly_mod(gf, inverses, a, b) for a in polys]
+        assert gf.poly_mod(np.array(polys), b).tolist() == expected
+        for (a, rem) in zip(polys, expected):
+            (quotient, remainder) = gf.poly_divmod(a, b)
+            if size < len(b):
+                # Not divided: a is returned as is.
+                assert (quotient.tolist(), remainder.tolist()) == ([], a)
+                continue
+            assert remainder.tolist() == rem
+            # a = quotient * b + remainder
+            product = gf.poly_mul(quotient, b).tolist()
+            assert [x ^ y for (x, y) in zip(product, [0] * (len(product) - len(rem)) + rem)] == a
+
+def test_galois(gf):
+    # Same primitive element and arithmetic as the galois package (used by the original generator).
+    galois = pytest.importorskip('galois')
+    GF = galois.GF(gf.order, irreducible_poly=FIELDS[gf.order])
+    assert int(GF.primitive_element) == gf.primitive_element
+    symbols = GF(np.arange(gf.order))
+    assert (np.asarray(symbols[:, None] * symbols[None, :]) == gf.mul_table).all()
+    assert (np.asarray(symbols[1:] ** -1) == gf.inv_table[1:]).all()
+    assert gf.exp_seq[:-1].tolist() == [int(GF.primitive_element ** i) for i in range(gf.order - 1)]
+
+def test_unsupported():
+    with pytest.raises(ValueError):
+        GaloisField(12)
+    with pytest.raises(ValueError, match='not of degree'):
+        GaloisField(16, [1, 0, 1, 1])
+    with pytest.raises(ValueError, match='not irreducible'):
+        GaloisField(16, [1, 0, 0, 0, 1])
+    with pytest.raises(ValueError, match='out of range'):
+        GaloisField(16).array([16])
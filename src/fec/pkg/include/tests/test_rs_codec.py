@@ -0,0 +1,105 @@
+import itertools
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from rs_codec import RSCode, pattern_rank, write_stimulus, write_vectors
+
+CODES = [(8, 3, 1), (8, 2, 2), (16, 8, 1), (16, 6, 2), (256, 16, 2), (256, 10, 3)]
+
+@pytest.fixture(params=CODES, ids=lambda p: 'gf{}_k{}_t{}'.format(*p))
+def code(request):
+    (order, k, t) = request.param
+    return RSCode(order, k, t)
+
+def test_encode(code):
+    data = code.random_data(200, rng=1)
+    encoded = code.encode(data)
+    assert (encoded[:, :code.k] == data).all()
+    assert (encoded == code.encode_poly(data)).all()
+    # Code words are multiples of the generator polynomial.
+    assert not code.gf.poly_mod(encoded, code.gen_poly).any()
+
+def test_decode(code):
+    data = code.random_data(300, rng=2)
+    encoded = code.encode(data)
+    for erasures in range(2 * code.t + 1):
+        mask = code.random_erasures(len(data), erasures, rng=erasures)
+        assert (mask.sum(axis=1) == erasures).all()
+        (decoded, ok) = code.decode(code.erase(encoded, mask, fill=1), mask)
+        assert ok.all()
+        assert (decoded == data).all()
+
+def test_decode_all_patterns():
+    # Every pattern of 2t erasures of a small code, one word each.
+    code = RSCode(16, 5, 2)
+    patterns = list(itertools.combinations(range(code.n), 2 * code.t))
+    data = code.random_data(len(patterns), rng=3)
+    mask = np.zeros((len(patterns), code.n), dtype=bool)
+    for (row, pattern) in zip(mask, patterns):
+        row[list(pattern)] = True
+    (decoded, ok) = code.decode(code.erase(code.encode(data), mask), mask)
+    assert ok.all()
+    assert (decoded == data).all()
+
+def test_decode_too_many_erasures(code):
+    data = code.random_data(10, rng=4)
+    mask = code.random_erasures(len(data), 2 * code.t + 1, rng=4)
+    assert not code.decode(code.erase(code.encode(data), mask), mask)[1].any()
+
+def test_code_length():
+    with pytest.raises(ValueError, match='exceeds GF'):
+        RSCode(16, 12, 2)
+
+@pytest.mark.parametrize(('n', 'r'), [(9, 4), (8, 1), (8, 8), (12, 6), (16, 2)])
+def test_pattern_rank(n, r):
+    patterns = np.array(list(itertools.combinations(range(n), r)), dtype=np.int64).reshape(-1, r)
+    assert pattern_rank(patterns, n).tolist() == list(range(math.comb(n, r)))
+
+def test_patterns(code):
+    # Patterns of fewer than 2t erasures are completed with the highest kept positions.
+    mask = np.zeros((1, code.n), dtype=bool)
+    mask[0, 0] = True
+    (positions, rank, ok) = code.patterns(mask)
+    expected = [0] + list(range(code.n - 2 * code.t + 1, code.n))
+    assert positions.tolist() == [expected]
+    assert rank.tolist() == [list(itertools.combinations(range(code.n), 2 * code.t)).index(tuple(expected))]
+    assert ok.tolist() == [True]
+
+def _packed(symbols, sym_size):
+    # $readmemh value of logic [0:W-1][SYM_SIZE-1:0]: symbol 0 in the most significant position.
+    value = 0
+    for symbol in symbols:
+        value = (value << sym_size) | int(symbol)
+    return f'{value:0{-(-len(symbols) * sym_size // 4)}x}'
+
+@pytest.mark.parametrize(('width', 'sym_size'), [(1, 1), (7, 1), (3, 3), (5, 5), (4, 4), (6, 8), (1, 10)])
+def test_write_vectors(tmp_path, width, sym_size):
+    rng = np.random.default_rng(width * sym_size)
+    symbols = rng.integers(0, 1 << sym_size, (20, width))
+    path = tmp_path / 'vectors.hex'
+    write_vectors(path, symbols, sym_size, comment='test')
+    lines = path.read_text().splitlines()
+    assert lines[0] == '// test'
+    assert lines[1:] == [_packed(row, sym_size) for row in symbols]
+
+def test_write_vectors_scalars(tmp_path):
+    # One value per vector (e.g. the pattern indices), without a comment.
+    path = tmp_path / 'index.hex'
+    write_vectors(path, np.array([0, 1, 125]), 7)
+    assert path.read_text() == '00\n01\n7d\n'
+
+def test_write_stimulus(tmp_path):
+    code = RSCode(32, 6, 2)
+    data = code.random_data(50, rng=5)
+    mask = code.random_erasures(len(data), rng=5)
+    paths = write_stimulus(str(tmp_path / 'rs'), code, data, mask)
+    def vectors(name):
+        return open(paths[name]).read().splitlines()[1:]
+    assert vectors('decoded') == vectors('data') == [_packed(row, 5) for row in data]
+    (_, ranks, _) = code.patterns(mask)
+    assert vectors('err_loc') == [_packed([rank], 8) for rank in ranks]
+    assert vectors('err_vec') == [_packed(row, 1) for row in mask.astype(int)]
+    assert vectors('rx') == [_packed(row, 5) for row in code.erase(code.encode(data), mask)]
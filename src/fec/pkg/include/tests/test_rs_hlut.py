@@ -0,0 +1,151 @@
+import itertools
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import rs_hlut
+from gf_engine import GaloisField
+from rs_codec import RSCode
+from rs_hlut import HTable, build_h_table, check_h_table, h_table
+
+CODES = [(8, 3, 1), (16, 4, 2), (16, 8, 1), (32, 5, 3)]
+
+@pytest.fixture(params=CODES, ids=lambda p: 'gf{}_k{}_t{}'.format(*p))
+def code(request):
+    (order, k, t) = request.param
+    return RSCode(order, k, t)
+
+@pytest.fixture
+def builds(monkeypatch):
+    # Tables built (rather than loaded from the cache).
+    calls = []
+    build = rs_hlut.build_h_table
+    monkeypatch.setattr(rs_hlut, 'build_h_table', lambda code: calls.append(code) or build(code))
+    return calls
+
+def _cache_file(cache_dir):
+    (name,) = os.listdir(cache_dir)
+    return cache_dir / name
+
+def test_build_h_table(code):
+    # Against a direct inversion of G^T without the erased rows, pattern by pattern.
+    gf = code.gf
+    table = build_h_table(code)
+    patterns = list(itertools.combinations(range(code.n), 2 * code.t))
+    assert table.positions.tolist() == [list(p) for p in patterns]
+    GT = code.G.T
+    for (pattern, h, ok, err_loc) in zip(patterns, table.h, table.ok, table.err_loc):
+        kept = [i for i in range(code.n) if i not in pattern]
+        (inverse, invertible) = gf.inv_batch(GT[kept])
+        assert ok == invertible
+        if ok:
+            assert (h == inverse).all()
+        assert np.nonzero(err_loc)[0].tolist() == list(pattern)
+    # Reed-Solomon codes are MDS: every pattern of 2t erasures can be decoded.
+    assert table.ok.all()
+    assert table.svh().startswith(f'localparam NUM_H = {len(patterns)};')
+    assert check_h_table(code, table)
+
+def test_cache(code, tmp_path, builds):
+    first = h_table(code, tmp_path)
+    assert len(builds) == 1
+    second = h_table(code, tmp_path)
+    assert len(builds) == 1
+    for name in ('positions', 'h', 'ok'):
+        assert (getattr(first, name) == getattr(second, name)).all()
+    assert h_table(code, None) is not None
+    assert len(builds) == 2
+
+def test_cache_key(tmp_path, builds):
+    # The cache is keyed by field, polynomial, k and t.
+    codes = [RSCode(16, 4, 1), RSCode(GaloisField(16, [1, 1, 0, 0, 1]), 4, 1), RSCode(32, 4, 1),
+             RSCode(16, 5, 1), RSCode(16, 4, 2)]
+    for code in codes:
+        h_table(code, tmp_path)
+    assert len(os.listdir(tmp_path)) == len(codes)
+    assert len(builds) == len(codes)
+    for code in codes:
+        assert check_h_table(code, h_table(code, tmp_path))
+    assert len(builds) == len(codes)
+
+def test_cache_poly_change(tmp_path, builds):
+    # A table of another polynomial stored under this code's name is rejected by the check.
+    code = RSCode(16, 4, 2)
+    other = RSCode(GaloisField(16, [1, 1, 0, 0, 1]), 4, 2)
+    os.makedirs(tmp_path, exist_ok=True)
+    path = rs_hlut._cache_path(code, tmp_path)
+    table = build_h_table(other)
+    np.savez(path, positions=table.positions, h=table.h, ok=table.ok)
+    assert not check_h_table(code, table)
+    builds.clear()
+    table = h_table(code, tmp_path)
+    assert len(builds) == 1
+    assert (table.h == build_h_table(code).h).all()
+
+def test_cache_format_change(tmp_path, builds, monkeypatch):
+    code = RSCode(16, 4, 1)
+    h_table(code, tmp_path)
+    monkeypatch.setattr(rs_hlut, 'HLUT_FORMAT', rs_hlut.HLUT_FORMAT + 1)
+    h_table(code, tmp_path)
+    assert len(builds) == 2
+    assert len(os.listdir(tmp_path)) == 2
+
+@pytest.mark.parametrize('damage', ['truncated', 'flipped', 'empty', 'garbage', 'missing_key'])
+def test_cache_corrupt(tmp_path, builds, damage):
+    code = RSCode(16, 4, 2)
+    expected = h_table(code, tmp_path)
+    path = _cache_file(tmp_path)
+    data = bytearray(path.read_bytes())
+    if damage == 'truncated':
+        data = data[:len(data) // 2]
+    elif damage == 'flipped':
+        data[len(data) // 2] ^= 0xff
+    elif damage == 'empty':
+        data = b''
+    elif damage == 'garbage':
+        data = b'not a table' * 10
+    else:
+        with open(path, 'wb') as f:
+            np.savez(f, positions=expected.positions, h=expected.h)
+        data = path.read_bytes()
+    path.write_bytes(data)
+    table = h_table(code, tmp_path)
+    assert len(builds) == 2
+    assert (table.h == expected.h).all()
+    # The rebuilt table replaced the damaged one.
+    h_table(code, tmp_path)
+    assert len(builds) == 2
+
+def test_check_h_table():
+    code = RSCode(16, 4, 2)
+    table = build_h_table(code)
+    assert check_h_table(code, table)
+    # Wrong layout, patterns, flags or H matrices.
+    assert not check_h_table(RSCode(16, 5, 2), table)
+    assert not check_h_table(code, HTable(code.n, table.positions[:-1], table.h[:-1], table.ok[:-1]))
+    positions = table.positions.copy()
+    positions[[3, 4]] = positions[[4, 3]]
+    assert not check_h_table(code, HTable(code.n, positions, table.h, table.ok))
+    ok = table.ok.copy()
+    ok[7] = not ok[7]
+    assert not check_h_table(code, HTable(code.n, table.positions, table.h, ok))
+    h = table.h.copy()
+    h[11, 0, 0] ^= 1
+    assert not check_h_table(code, HTable(code.n, table.positions, h, table.ok))
+    # Only a sample of the H matrices is checked in larger tables.
+    code = RSCode(256, 16, 2)
+    table = build_h_table(code)
+    h = table.h.copy()
+    h[:, 0, 0] ^= 1
+    assert not check_h_table(code, HTable(code.n, table.positions, h, table.ok), sample=16)
+
+def test_fec_luts_svh():
+    # The committed fec_luts.svh (GF(16), k=8, t=1) was written by the original, galois based
+    # generator; the tables must be reproduced byte for byte.
+    import genMatrix_simplified
+    code = RSCode(16, 8, 1)
+    path = os.path.join(os.path.dirname(rs_hlut.__file__), 'fec_luts.svh')
+    with open(path) as f:
+        assert genMatrix_simplified.fec_luts_svh(code, build_h_table(code)) == f.read()
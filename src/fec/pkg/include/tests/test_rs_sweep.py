@@ -0,0 +1,73 @@
+import csv
+import json
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import rs_sweep
+from rs_sweep import COLUMNS, check_point, sweep
+
+POINTS = [(8, 2, 1), (8, 3, 2), (16, 4, 1), (16, 20, 1)] # The last one has no valid code.
+
+def _rows(path):
+    with open(path, newline='') as f:
+        if str(path).endswith('.csv'):
+            return list(csv.DictReader(f))
+        return [json.loads(line) for line in f]
+
+def _keys(rows):
+    return sorted((int(row['field']), int(row['k']), int(row['t'])) for row in rows)
+
+@pytest.mark.parametrize('name', ['sweep.csv', 'sweep.jsonl'])
+def test_sweep(tmp_path, name):
+    path = str(tmp_path / name)
+    results = sweep(POINTS, path, jobs=1)
+    assert _keys(results) == [(8, 2, 1), (8, 3, 2), (16, 4, 1)]
+    rows = _rows(path)
+    assert _keys(rows) == _keys(results)
+    assert all(list(row) == list(COLUMNS) for row in rows)
+    for row in rows:
+        assert int(row['singular']) == 0
+        assert int(row['checked']) == int(row['patterns'])
+    # Finished points are skipped.
+    assert sweep(POINTS, path, jobs=1) == []
+    assert len(_rows(path)) == 3
+
+@pytest.mark.parametrize('name', ['sweep.csv', 'sweep.jsonl'])
+def test_resume(tmp_path, name):
+    path = tmp_path / name
+    sweep(POINTS[:2], str(path), jobs=1)
+    # Interrupted while writing a third result.
+    with open(path, 'a') as f:
+        f.write('16,0x13,4,1,8,2' if name.endswith('.csv') else '{"field": 16, "poly"')
+    results = sweep(POINTS, str(path), jobs=1)
+    assert _keys(results) == [(16, 4, 1)]
+    assert _keys(_rows(path)) == [(8, 2, 1), (8, 3, 2), (16, 4, 1)]
+
+def test_sampled():
+    exhaustive = check_point(16, 6, 2)
+    sampled = check_point(16, 6, 2, max_patterns=100, seed=1)
+    assert exhaustive['exhaustive'] and not sampled['exhaustive']
+    assert exhaustive['patterns'] == sampled['patterns'] == math.comb(10, 4)
+    assert (exhaustive['checked'], sampled['checked']) == (math.comb(10, 4), 100)
+    assert sampled['num_h'] == sampled['patterns']
+    # Same LUT sizes for a code without singular patterns.
+    assert exhaustive['total_bits'] == sampled['total_bits']
+
+def test_lut_bits():
+    bits = check_point(16, 8, 1)
+    # fec_luts.svh of GF(16), k=8, t=1: 45 H matrices.
+    assert bits['num_h'] == 45
+    assert bits['h_lut_bits'] == 45 * 8 * 8 * 4
+    assert bits['err_loc_lut_bits'] == 45 * 10
+
+def test_main(tmp_path, capsys):
+    path = tmp_path / 'sweep.jsonl'
+    assert rs_sweep.main(['--field', '16', '--k', '3-5:2', '--t', '2', '--jobs', '1', '--max-patterns', '10',
+                          '--out', str(path)]) == 0
+    rows = _rows(path)
+    assert _keys(rows) == [(16, 3, 2), (16, 5, 2)]
+    assert [row['checked'] for row in rows] == [10, 10]
+    assert '2 points evaluated' in capsys.readouterr().out
@@ -0,0 +1,139 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'is_npy',
+    'write_header',
+    'read_header',
+    'dump',
+    'restore',
+)
+
+import ast
+import struct
+
+#---------------------------------------------------------------------------------------------------
+# Memory dumps: streaming of memory contents to and from files through a started mem_proxy_protocol
+# Protocol (kept out of the protocol itself, which is embedded into the regmap and cannot import this
+# module):
+#   mem_dump.dump(protocol, proxy, 'mem.npy')
+#   mem_dump.restore(protocol, proxy, 'mem.npy')
+#
+# Memory words are stored consecutively, little-endian, in one of:
+#   - NumPy .npy (version 1.0), selected by the .npy file extension. Words of 1, 2, 4 or 8 bytes are
+#     stored as a 1-D array of unsigned integers, wider words as a 2-D (words, bytes) array of bytes,
+#     so the dump can be loaded with numpy.load(path, mmap_mode='r').
+#   - Raw binary (any other extension), with no header at all, e.g. for numpy.memmap or hexdump.
+# NumPy itself is not needed to write or read either format.
+#---------------------------------------------------------------------------------------------------
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+NPY_ALIGN = 64
+
+# Words per dump/restore chunk, i.e. the amount of memory buffered on the host at a time.
+CHUNK_WORDS = 1 << 16
+
+def is_npy(path):
+    return str(path).endswith('.npy')
+
+def _npy_layout(word_size, nwords):
+    if word_size in (1, 2, 4, 8):
+        return (f'<u{word_size}', (nwords,))
+    return ('|u1', (nwords, word_size))
+
+def write_header(f, word_size, nwords):
+    # Write a .npy header describing nwords words of word_size bytes, padded so that the data starts
+    # on an aligned offset (as required for memory mapping by NumPy).
+    (descr, shape) = _npy_layout(word_size, nwords)
+    header = repr({'descr': descr, 'fortran_order': False, 'shape': shape}).encode('latin1')
+    pad = -(len(NPY_MAGIC) + 2 + len(header) + 1) % NPY_ALIGN
+    header += b' ' * pad + b'\n'
+    f.write(NPY_MAGIC + struct.pack('<H', len(header)) + header)
+
+def read_header(f, word_size):
+    # Read a .npy header and return the number of words of word_size bytes it describes. Arrays of a
+    # different word size (or layout) are rejected.
+    magic = f.read(len(NPY_MAGIC))
+    if magic[:6] != NPY_MAGIC[:6]:
+        raise ValueError('Not a .npy file')
+    if magic[6] == 1:
+        (length,) = struct.unpack('<H', f.read(2))
+    elif magic[6] in (2, 3):
+        (length,) = struct.unpack('<I', f.read(4))
+    else:
+        raise ValueError(f'Unsupported .npy version {magic[6]}.{magic[7]}')
+    header = ast.literal_eval(f.read(length).decode('latin1'))
+
+    shape = tuple(header['shape'])
+    nwords = shape[0] if shape else 1
+    (descr, expected) = _npy_layout(word_size, nwords)
+    if header['fortran_order'] or shape != expected or header['descr'] not in (descr, descr.replace('<', '|')):
+        raise ValueError(f'Array {header["descr"]} {shape} does not hold {word_size}B memory words')
+    return nwords
+
+def _word_size(proxy):
+    # Memory word size in bytes (as in mem_proxy_protocol.Protocol.start()).
+    return int(proxy.info_burst.min)
+
+def _words_codec(size):
+    # Conversion of memory words to and from their little-endian byte representation.
+    code = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}.get(size)
+    if code is not None:
+        pack = lambda values: struct.pack(f'<{len(values)}{code}', *values)
+        unpack = lambda data: list(struct.unpack(f'<{len(data) // size}{code}', data))
+    else:
+        pack = lambda values: b''.join(value.to_bytes(size, 'little') for value in values)
+        unpack = lambda data: [int.from_bytes(data[i:i + size], 'little')
+                               for i in range(0, len(data), size)]
+    return (pack, unpack)
+
+def _check_range(proxy, offset, nwords):
+    depth = int(proxy.info_depth.words)
+    if offset < 0 or nwords < 0 or offset + nwords > depth:
+        raise ValueError(f'Words 0x{offset:x}-0x{offset + nwords:x} outside of memory depth 0x{depth:x}')
+
+def dump(protocol, proxy, path, offset=0, nwords=None, chunk_words=None):
+    # Stream nwords memory words from offset (by default, the whole memory from offset onwards) to a
+    # .npy or raw binary file, one chunk of maximum-sized bursts (protocol.read_block()) at a time.
+    # Returns the number of words dumped.
+    if nwords is None:
+        nwords = int(proxy.info_depth.words) - offset
+    _check_range(proxy, offset, nwords)
+    size = _word_size(proxy)
+    chunk_words = chunk_words or CHUNK_WORDS
+    (pack, _) = _words_codec(size)
+    with open(path, 'wb') as f:
+        if is_npy(path):
+            write_header(f, size, nwords)
+        end = offset + nwords
+        while offset < end:
+            count = min(end - offset, chunk_words)
+            f.write(pack(protocol.read_block(proxy, offset, count)))
+            offset += count
+    return nwords
+
+def restore(protocol, proxy, path, offset=0, chunk_words=None):
+    # Write the memory words of a .npy or raw binary dump file back to memory (protocol.write_block()),
+    # starting at offset. Returns the number of words restored.
+    if int(proxy.info.access) == protocol.AccessType.READ_ONLY:
+        raise IOError('Cannot restore to a read-only memory')
+    size = _word_size(proxy)
+    chunk_words = chunk_words or CHUNK_WORDS
+    (_, unpack) = _words_codec(size)
+    with open(path, 'rb') as f:
+        if is_npy(path):
+            nwords = read_header(f, size)
+        else:
+            f.seek(0, 2)
+            (nwords, rem) = divmod(f.tell(), size)
+            if rem:
+                raise ValueError(f'Dump size is not a whole number of {size}B memory words')
+            f.seek(0)
+        _check_range(proxy, offset, nwords)
+        remaining = nwords
+        while remaining:
+            count = min(remaining, chunk_words)
+            data = f.read(count * size)
+            if len(data) != count * size:
+                raise ValueError('Dump file truncated')
+            protocol.write_block(proxy, offset, unpack(data))
+            offset += count
+            remaining -= count
+    return nwords
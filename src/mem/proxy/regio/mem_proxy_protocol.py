@@ -3,6 +3,7 @@ __all__ = (
     'Protocol',
 )
 
+import collections
 import enum
 import time
 import types
@@ -23,54 +24,127 @@ class Protocol(methods.Protocol):
         READY = 1
         BUSY = 2
 
-    def __init__(self, spec, if_name, timeout=100e-3, delay=1e-3):
+    class AccessType(enum.IntEnum):
+        UNSPECIFIED = 0
+        READ_WRITE = 1
+        READ_ONLY = 2
+
+    def __init__(self, spec, if_name, timeout=100e-3, delay=1e-3, wait_policy=None, metrics=None,
+                 read_cache=0, live=False):
         super().__init__(spec, if_name)
 
-        if timeout is None:
-            self.wait_count = None
-        elif timeout < delay:
+        if timeout is not None and timeout < delay:
             raise ValueError(f'Timeout {timeout} must be greater than the delay of {delay}')
-        elif delay > 0:
-            self.wait_delay = delay
-            self.wait_count = int(timeout / delay)
-        else:
-            self.wait_delay = 0
-            self.wait_count = 0
-
-    def _wait_status(self, proxy, test):
-        count = self.wait_count
-        while True:
-            status = proxy.status().proxy
-            if test(status):
-                return status
-
-            if count is None: # Loop infinitely for condition...
-                continue
-
-            if count <= 0:
-                return None
-            count -= 1
-            time.sleep(self.wait_delay)
-
-    def _transact(self, proxy, offset, value):
-        do_write = value is not None
+        self.wait_timeout = timeout
+        self.wait_delay = delay
+        # Optional replacement for the built-in completion wait: any object with a wait(poll, test,
+        # record) method, such as proxy_wait.WaitPolicy.
+        self.wait_policy = wait_policy
+        self.metrics = metrics # Optional proxy_metrics.ProtocolMetrics instance.
+
+        # Optional read-ahead cache for single word reads, of up to read_cache lines. A line is an
+        # aligned, maximum-sized burst, fetched whole on a miss and kept until it is evicted (least
+        # recently used first) or overlapped by a write through this protocol. The cache assumes
+        # that nothing else modifies the memory, so it is off by default: a protocol built from
+        # the regmap (Protocol(spec, if_name)) does not cache, and callers enable it by setting
+        # read_cache (before start()) on a memory that only they update. Memories reported as
+        # read-only by the controller (info.access), i.e. written through another path, and
+        # memories flagged live=True are never cached.
+        self.read_cache = read_cache
+        self.live = live
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._cache = collections.OrderedDict()
+        self._cache_lines = 0
+
+    # BEGIN proxy_wait.INLINE_WAIT (generated by proxy_wait.py, do not edit)
+    # Completion wait (the proxy_wait.WaitPolicy algorithm, kept inline since this file is embedded
+    # into the regmap). The status is busy-polled for up to WAIT_SPIN seconds, then polled with an
+    # exponentially increasing sleep in between, from WAIT_MIN_DELAY up to the delay, until the
+    # timeout deadline (none for a timeout of None).
+    WAIT_SPIN = 50e-6
+    WAIT_MIN_DELAY = 10e-6
+    WAIT_BACKOFF = 2.0
+
+    def _wait(self, poll, test, record=None):
+        if self.wait_policy is not None:
+            return self.wait_policy.wait(poll, test, record)
+
+        status = poll()
+        polls = 1
+        slept = 0.0
+        if not test(status):
+            now = time.monotonic()
+            deadline = None if self.wait_timeout is None else now + self.wait_timeout
+            spin_end = now + self.WAIT_SPIN
+            delay = min(self.WAIT_MIN_DELAY, self.wait_delay)
+            while True:
+                if deadline is not None and now >= deadline:
+                    status = None
+                    break
+                if now >= spin_end:
+                    sleep = delay if deadline is None else min(delay, deadline - now)
+                    time.sleep(sleep)
+                    slept += sleep
+                    delay = min(delay * self.WAIT_BACKOFF, self.wait_delay)
+                status = poll()
+                polls += 1
+                if test(status):
+                    break
+                now = time.monotonic()
+
+        # Optional instrumentation (see proxy_metrics.OpRecord).
+        if record is not None:
+            record.polls += polls
+            record.sleep += slept
+        return status
+    # END proxy_wait.INLINE_WAIT
+
+    def _wait_status(self, proxy, test, record=None):
+        return self._wait(lambda: proxy.status().proxy, test, record)
+
+    @staticmethod
+    def _unpack(ctx, regs):
+        # Assemble memory words from their (LSB first) data registers.
+        values = []
+        for i in range(0, len(regs), ctx.data_count):
+            value = 0
+            for reg in reversed(regs[i:i + ctx.data_count]):
+                value <<= ctx.data_width
+                value |= reg
+            values.append(value)
+        return values
+
+    def _transact(self, proxy, offset, values, count, err_msg):
+        ctx = self._ctx
+        if ctx.raw is not None and ctx.raw.proxy is proxy:
+            return self._transact_raw(ctx.raw, offset, values, count, err_msg)
+        do_write = values is not None
         if do_write:
             cmd_code = self.CommandCode.WRITE
-            err_msg = f'writing value 0x{value:x} to memory word 0x{offset:x}'
         else:
             cmd_code = self.CommandCode.READ
-            err_msg = f'reading from memory word 0x{offset:x}'
+        record = None
+        if self.metrics is not None:
+            record = self.metrics.start('mem_write' if do_write else 'mem_read')
 
         # Setup for the transaction.
-        status = self._wait_status(proxy, lambda st: st.code == self.StatusCode.READY)
+        status = self._wait_status(proxy, lambda st: st.code == self.StatusCode.READY, record)
         if status is None:
             raise TimeoutError('Controller not ready for ' + err_msg)
 
         proxy.addr = offset # Memory address expected in words, not bytes.
+        if ctx.burst_len != count:
+            proxy.burst.len = count
+            ctx.burst_len = count
+            if record is not None:
+                record.reg_writes += 1
         if do_write:
-            for data in proxy.wr_data[:self._ctx.data_count]:
-                data._r = value & self._ctx.data_mask
-                value >>= self._ctx.data_width
+            regs = iter(proxy.wr_data[:count * ctx.data_count])
+            for value in values:
+                for _ in range(ctx.data_count):
+                    next(regs)._r = value & ctx.data_mask
+                    value >>= ctx.data_width
 
         # Trigger the transaction.
         cmd = proxy.command(0).proxy
@@ -78,24 +152,114 @@ class Protocol(methods.Protocol):
         proxy.command = int(cmd)
 
         # Wait for the transaction to complete.
-        status = self._wait_status(proxy, lambda st: st.done or st.timeout or st.error)
+        status = self._wait_status(proxy, lambda st: st.done or st.timeout or st.error, record)
         if status is None:
             raise TimeoutError('Controller timeout when ' + err_msg)
         if status.timeout:
             raise TimeoutError('Transaction timeout when ' + err_msg)
         if status.error:
             raise IOError('Transaction error ' + err_msg)
-        if status.burst_size != self._ctx.data_size:
+        size = count * ctx.data_size
+        if status.burst_size != size:
             raise IOError('Transaction size mismatch ' + err_msg +
-                          f' [expected {self._ctx.data_size}, got {int(status.burst_size)}]')
+                          f' [expected {size}, got {int(status.burst_size)}]')
 
         # Read the data fetched by the transaction.
         if not do_write:
-            value = 0
-            for data in reversed(proxy.rd_data[:self._ctx.data_count]):
-                value <<= self._ctx.data_width
-                value |= int(data._r) & self._ctx.data_mask
-            return value
+            regs = [int(data._r) & ctx.data_mask for data in proxy.rd_data[:count * ctx.data_count]]
+            values = self._unpack(ctx, regs)
+
+        if record is not None:
+            # Address and command writes, plus the data window.
+            record.reg_writes += 2
+            if do_write:
+                record.reg_writes += count * ctx.data_count
+            else:
+                record.reg_reads += count * ctx.data_count
+            self.metrics.finish(record, size)
+
+        if not do_write:
+            return values
+
+    def _transact_raw(self, raw, offset, values, count, err_msg):
+        # Same transaction as _transact(), on the words of a mapped (reg_mmap.RawBlock) proxy.
+        ctx = self._ctx
+        words = raw.words
+        do_write = values is not None
+        record = None
+        if self.metrics is not None:
+            record = self.metrics.start('mem_write' if do_write else 'mem_read')
+        status_index = raw.status
+        poll = lambda: words[status_index]
+
+        (code_shift, code_mask) = raw.code
+        ready = int(self.StatusCode.READY)
+        status = self._wait(poll, lambda st: (st >> code_shift) & code_mask == ready, record)
+        if status is None:
+            raise TimeoutError('Controller not ready for ' + err_msg)
+
+        words[raw.addr] = offset
+        if ctx.burst_len != count:
+            words[raw.burst] = count << raw.burst_len_shift
+            ctx.burst_len = count
+            if record is not None:
+                record.reg_writes += 1
+        if do_write:
+            index = raw.wr_data
+            for value in values:
+                for _ in range(ctx.data_count):
+                    words[index] = value & ctx.data_mask
+                    value >>= ctx.data_width
+                    index += 1
+
+        words[raw.command] = int(self.CommandCode.WRITE if do_write else self.CommandCode.READ) << raw.command_shift
+
+        complete = raw.done | raw.timeout | raw.error
+        status = self._wait(poll, lambda st: st & complete, record)
+        if status is None:
+            raise TimeoutError('Controller timeout when ' + err_msg)
+        if status & raw.timeout:
+            raise TimeoutError('Transaction timeout when ' + err_msg)
+        if status & raw.error:
+            raise IOError('Transaction error ' + err_msg)
+        size = count * ctx.data_size
+        (shift, mask) = raw.burst_size
+        burst_size = (status >> shift) & mask
+        if burst_size != size:
+            raise IOError('Transaction size mismatch ' + err_msg + f' [expected {size}, got {burst_size}]')
+
+        if not do_write:
+            rd_data = raw.rd_data
+            values = self._unpack(ctx, [words[rd_data + i] & ctx.data_mask for i in range(count * ctx.data_count)])
+
+        if record is not None:
+            record.reg_writes += 2
+            if do_write:
+                record.reg_writes += count * ctx.data_count
+            else:
+                record.reg_reads += count * ctx.data_count
+            self.metrics.finish(record, size)
+
+        if not do_write:
+            return values
+
+    @staticmethod
+    def _raw_plan(proxy):
+        # Word indices and field shifts/masks for a mapped proxy (see reg_mmap.py), or None for a
+        # regio proxy.
+        if not hasattr(proxy, 'raw_words'):
+            return None
+        raw = types.SimpleNamespace(proxy=proxy, words=proxy.raw_words)
+        for name in ('command', 'status', 'addr', 'burst', 'wr_data', 'rd_data'):
+            setattr(raw, name, proxy.raw_index(name))
+        for name in ('done', 'error', 'timeout'):
+            (shift, mask) = proxy.raw_field('status', name)
+            setattr(raw, name, mask << shift)
+        raw.code = proxy.raw_field('status', 'code')
+        raw.burst_size = proxy.raw_field('status', 'burst_size')
+        raw.burst_len_shift = proxy.raw_field('burst', 'len')[0]
+        raw.command_shift = proxy.raw_field('command', 'code')[0]
+        return raw
 
     def start(self, proxy):
         # TODO: Get data_width from controller proxy's spec region info. Add property to variable to
@@ -107,17 +271,91 @@ class Protocol(methods.Protocol):
         ctx.data_mask = (1 << ctx.data_width) - 1
         ctx.data_size = int(proxy.info_burst.min)
         ctx.data_count = ctx.data_size // (ctx.data_width // 8)
+
+        # Largest burst (in words) supported by both the controller and the data register windows.
+        # The burst.len field is 8 bits wide.
+        ctx.burst_max = min(int(proxy.info_burst.max) // ctx.data_size,
+                            len(proxy.wr_data) // ctx.data_count,
+                            len(proxy.rd_data) // ctx.data_count,
+                            0xff)
+        ctx.burst_max = max(ctx.burst_max, 1)
+        ctx.depth = int(proxy.info_depth.words)
+        ctx.raw = self._raw_plan(proxy)
         self._ctx = ctx
 
-        proxy.burst.len = 1 # Restrict burst operations to a single word.
+        # Read cache (see __init__()).
+        self._cache.clear()
+        self._cache_lines = self.read_cache
+        if self.live or int(proxy.info.access) == self.AccessType.READ_ONLY:
+            self._cache_lines = 0
+
+        # Single word accesses are the default. The burst length is only rewritten when a block
+        # transfer needs a different one.
+        proxy.burst.len = 1
+        ctx.burst_len = 1
         super().start(proxy)
 
     def stop(self, proxy):
         super().start(proxy)
+        self._cache.clear()
         del self._ctx
 
+    def _cache_invalidate(self, offset, nwords=1):
+        # Drop the cache lines overlapping nwords words from offset.
+        if not self._cache or nwords <= 0:
+            return
+        line = self._ctx.burst_max
+        first = offset - offset % line
+        last = offset + nwords - 1
+        if (last - first) // line >= len(self._cache):
+            for base in [base for base in self._cache if first <= base <= last]:
+                del self._cache[base]
+        else:
+            for base in range(first, last + 1, line):
+                self._cache.pop(base, None)
+
     def read(self, proxy, offset, size):
-        return self._transact(proxy, offset, None)
+        if self._cache_lines and offset < self._ctx.depth:
+            base = offset - offset % self._ctx.burst_max
+            words = self._cache.get(base)
+            if words is not None:
+                self.cache_hits += 1
+                self._cache.move_to_end(base)
+                return words[offset - base]
+            # Miss: fetch the whole line, so that neighbouring reads are served from the cache.
+            self.cache_misses += 1
+            count = min(self._ctx.burst_max, self._ctx.depth - base)
+            err_msg = f'reading {count} words from memory word 0x{base:x}'
+            words = self._transact(proxy, base, None, count, err_msg)
+            self._cache[base] = words
+            if len(self._cache) > self._cache_lines:
+                self._cache.popitem(last=False)
+            return words[offset - base]
+        err_msg = f'reading from memory word 0x{offset:x}'
+        return self._transact(proxy, offset, None, 1, err_msg)[0]
 
     def write(self, proxy, offset, size, value):
-        self._transact(proxy, offset, int(value))
+        self._cache_invalidate(offset)
+        value = int(value)
+        err_msg = f'writing value 0x{value:x} to memory word 0x{offset:x}'
+        self._transact(proxy, offset, [value], 1, err_msg)
+
+    def read_block(self, proxy, offset, nwords):
+        # Read nwords consecutive memory words, issuing one command per (maximum-sized) burst.
+        values = []
+        end = offset + nwords
+        while offset < end:
+            count = min(end - offset, self._ctx.burst_max)
+            err_msg = f'reading {count} words from memory word 0x{offset:x}'
+            values.extend(self._transact(proxy, offset, None, count, err_msg))
+            offset += count
+        return values
+
+    def write_block(self, proxy, offset, values):
+        # Write consecutive memory words, issuing one command per (maximum-sized) burst.
+        values = [int(value) for value in values]
+        self._cache_invalidate(offset, len(values))
+        for i in range(0, len(values), self._ctx.burst_max):
+            burst = values[i:i + self._ctx.burst_max]
+            err_msg = f'writing {len(burst)} words to memory word 0x{offset + i:x}'
+            self._transact(proxy, offset + i, burst, len(burst), err_msg)
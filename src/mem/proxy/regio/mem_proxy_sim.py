@@ -0,0 +1,147 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'MemProxySim',
+)
+
+import os
+import struct
+import sys
+
+try:
+    from proxy_sim import SimController
+except ImportError:
+    # Callers with only this directory on the module search path: add the shared simulation modules
+    # (src/reg/proxy/regio) from their location in the repository.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(here, '..', '..', '..', 'reg', 'proxy', 'regio'))
+    from proxy_sim import SimController
+
+#---------------------------------------------------------------------------------------------------
+# Model of the mem_proxy controller (see mem_proxy.yaml and mem_proxy.sv), backed by the `mem`
+# bytearray. Memory addresses are in units of data_bytes (the minimum burst). A READ/WRITE moves
+# burst.len words (0 meaning 1) through the wr_data/rd_data windows, little-endian within each
+# register; bursts that exceed the maximum burst size or the end of memory end with an error.
+class MemProxySim(SimController):
+    _BYTES = (('byte_0', 8), ('byte_1', 8), ('byte_2', 8), ('byte_3', 8))
+
+    REGS = {
+        'info':            ((('mem_type', 4), ('access', 4), ('alignment', 12)), None, 0),
+        'info_depth':      ((('words', 32),), None, 0),
+        'info_size_upper': ((), None, 0),
+        'info_size_lower': ((), None, 0),
+        'info_burst':      ((('min', 9), ('rsvd0', 7), ('max', 9), ('rsvd1', 7)), None, 0),
+        'control':         ((('reset', 1), ('enable', 1)), None, 0x2),
+        'monitor':         ((('reset_mon', 1), ('enable_mon', 1), ('ready_mon', 1), ('state_mon', 8)), None, 0),
+        'command':         ((('code', 8),), None, 0),
+        'status':          ((('code', 8), ('done', 1), ('error', 1), ('timeout', 1), ('burst_size', 9),
+                             ('rsvd', 7)), None, 0),
+        'addr':            ((), None, 0),
+        'burst':           ((('len', 8),), None, 0),
+        'wr_data':         (_BYTES, 16, 0),
+        'rd_data':         (_BYTES, 16, 0),
+    }
+
+    # Command and status codes (see mem_proxy.yaml).
+    CMD_NOP = 0
+    CMD_READ = 1
+    CMD_WRITE = 2
+    CMD_CLEAR = 3
+
+    STATUS_READY = 1
+    STATUS_BUSY = 2
+
+    MEM_TYPE_SRAM = 1
+    ACCESS_READ_WRITE = 1
+
+    def __init__(self, size=65536, data_bytes=4, burst_max=64, mem_type=MEM_TYPE_SRAM, reg_latency=0.0,
+                 op_delay=0.0):
+        super().__init__(reg_latency, op_delay)
+        if burst_max > len(self.wr_data) * 4 or burst_max % data_bytes:
+            raise ValueError(f'Maximum burst of {burst_max}B not supported with {data_bytes}B words')
+        self.mem = bytearray(size)
+        self.data_bytes = data_bytes
+        self.burst_max = burst_max
+
+        info = self.peek('info')
+        info.mem_type = mem_type
+        info.access = self.ACCESS_READ_WRITE
+        info.alignment = data_bytes
+        self.poke('info', info)
+        self.poke('info_depth', size // data_bytes)
+        self.poke('info_size_upper', size >> 32)
+        self.poke('info_size_lower', size & 0xffffffff)
+        burst = self.peek('info_burst')
+        burst.min = data_bytes
+        burst.max = burst_max
+        self.poke('info_burst', burst)
+        self.poke('status', self.STATUS_READY)
+
+    def _on_read(self, name, index):
+        value = super()._on_read(name, index)
+        if name == 'status':
+            # Done/error/timeout flags are cleared by the read.
+            status = self.peek('status')
+            status.done = 0
+            status.error = 0
+            status.timeout = 0
+            self.poke('status', status)
+        return value
+
+    def _on_write(self, name, index, value):
+        super()._on_write(name, index, value)
+        if name != 'command' or self._pending is not None:
+            return
+        status = self.peek('status')
+        status.code = self.STATUS_BUSY
+        status.done = 0
+        status.error = 0
+        status.timeout = 0
+        status.burst_size = 0
+        self.poke('status', status)
+        # The address and burst length are latched with the command.
+        code = value & 0xff
+        addr = int(self.peek('addr'))
+        size = max(self.peek('burst').len, 1) * self.data_bytes
+        if code == self.CMD_READ:
+            self._issue(lambda: self._read_burst(addr, size))
+        elif code == self.CMD_WRITE:
+            self._issue(lambda: self._write_burst(addr, size))
+        elif code == self.CMD_CLEAR:
+            self._issue(self._clear)
+        else:
+            self._issue(lambda: None)
+
+    def _burst_range(self, addr, size):
+        start = addr * self.data_bytes
+        if size > self.burst_max or start + size > len(self.mem):
+            return None
+        return start
+
+    def _read_burst(self, addr, size):
+        start = self._burst_range(addr, size)
+        if start is None:
+            return 'error'
+        regs = self._values['rd_data']
+        regs[:size // 4] = struct.unpack_from(f'<{size // 4}I', self.mem, start)
+        self._burst_size = size
+
+    def _write_burst(self, addr, size):
+        start = self._burst_range(addr, size)
+        if start is None:
+            return 'error'
+        struct.pack_into(f'<{size // 4}I', self.mem, start, *self._values['wr_data'][:size // 4])
+        self._burst_size = size
+
+    def _clear(self):
+        self.mem[:] = bytes(len(self.mem))
+        self._burst_size = 0
+
+    def _complete(self, fault):
+        burst_size = self.__dict__.pop('_burst_size', 0)
+        status = self.peek('status')
+        status.code = self.STATUS_READY
+        status.done = int(fault is None)
+        status.error = int(fault == 'error')
+        status.timeout = int(fault == 'timeout')
+        status.burst_size = burst_size if fault is None else 0
+        self.poke('status', status)
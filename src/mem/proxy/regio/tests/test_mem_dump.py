@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+# The protocol derives from the regio Protocol class.
+pytest.importorskip('regio')
+
+import mem_dump
+import mem_proxy_protocol
+from mem_proxy_sim import MemProxySim
+
+@pytest.fixture(params=[4, 8, 16], ids=lambda size: f'word{size}')
+def sim(request):
+    sim = MemProxySim(size=4096, data_bytes=request.param, burst_max=64)
+    sim.mem[:] = os.urandom(len(sim.mem))
+    return sim
+
+@pytest.fixture
+def protocol(sim):
+    protocol = mem_proxy_protocol.Protocol(None, 'mem_proxy')
+    protocol.start(sim)
+    return protocol
+
+@pytest.mark.parametrize('name', ['mem.npy', 'mem.bin'])
+def test_dump_restore(sim, protocol, tmp_path, name):
+    path = tmp_path / name
+    contents = bytes(sim.mem)
+    nwords = len(sim.mem) // sim.data_bytes
+    assert mem_dump.dump(protocol, sim, path, chunk_words=50) == nwords
+    sim.mem[:] = bytes(len(sim.mem))
+    assert mem_dump.restore(protocol, sim, path, chunk_words=33) == nwords
+    assert bytes(sim.mem) == contents
+
+def test_dump_range(sim, protocol, tmp_path):
+    path = tmp_path / 'mem.bin'
+    size = sim.data_bytes
+    assert mem_dump.dump(protocol, sim, path, offset=3, nwords=20) == 20
+    assert path.read_bytes() == bytes(sim.mem[3 * size:23 * size])
+    # Restored at another offset.
+    mem_dump.restore(protocol, sim, path, offset=100)
+    assert sim.mem[100 * size:120 * size] == sim.mem[3 * size:23 * size]
+
+def test_dump_npy_load(sim, protocol, tmp_path):
+    np = pytest.importorskip('numpy')
+    path = tmp_path / 'mem.npy'
+    mem_dump.dump(protocol, sim, path)
+    array = np.load(path, mmap_mode='r')
+    assert array.tobytes() == bytes(sim.mem)
+
+def test_out_of_range(sim, protocol, tmp_path):
+    path = tmp_path / 'mem.bin'
+    nwords = len(sim.mem) // sim.data_bytes
+    with pytest.raises(ValueError, match='outside of memory depth'):
+        mem_dump.dump(protocol, sim, path, offset=nwords - 5, nwords=10)
+    mem_dump.dump(protocol, sim, path)
+    with pytest.raises(ValueError, match='outside of memory depth'):
+        mem_dump.restore(protocol, sim, path, offset=1)
+
+def test_bad_files(sim, protocol, tmp_path):
+    path = tmp_path / 'mem.bin'
+    path.write_bytes(bytes(sim.data_bytes + 1))
+    with pytest.raises(ValueError, match='whole number'):
+        mem_dump.restore(protocol, sim, path)
+    # A .npy dump of another word size.
+    other = MemProxySim(size=1024, data_bytes=32 if sim.data_bytes != 32 else 4, burst_max=64)
+    other_protocol = mem_proxy_protocol.Protocol(None, 'other')
+    other_protocol.start(other)
+    path = tmp_path / 'other.npy'
+    mem_dump.dump(other_protocol, other, path)
+    with pytest.raises(ValueError, match='does not hold'):
+        mem_dump.restore(protocol, sim, path)
+
+def test_restore_read_only(sim, protocol, tmp_path):
+    path = tmp_path / 'mem.bin'
+    mem_dump.dump(protocol, sim, path)
+    info = sim.peek('info')
+    info.access = protocol.AccessType.READ_ONLY
+    sim.poke('info', info)
+    with pytest.raises(IOError, match='read-only'):
+        mem_dump.restore(protocol, sim, path)
@@ -0,0 +1,176 @@
+import random
+
+import pytest
+
+# The protocol derives from the regio Protocol class.
+pytest.importorskip('regio')
+
+import mem_proxy_protocol
+from mem_proxy_sim import MemProxySim
+from proxy_metrics import ProtocolMetrics
+
+def _start(sim, **kargs):
+    protocol = mem_proxy_protocol.Protocol(None, 'mem_proxy', timeout=10e-3, **kargs)
+    protocol.start(sim)
+    return protocol
+
+def _word(sim, offset):
+    return int.from_bytes(sim.mem[offset * sim.data_bytes:(offset + 1) * sim.data_bytes], 'little')
+
+@pytest.fixture(params=[4, 8, 16], ids=lambda size: f'word{size}')
+def sim(request, as_proxy):
+    sim = MemProxySim(size=4096, data_bytes=request.param, burst_max=64)
+    sim.mem[:] = random.Random(request.param).randbytes(len(sim.mem))
+    return as_proxy(sim)
+
+@pytest.fixture
+def protocol(sim):
+    return _start(sim)
+
+def test_raw_plan(sim, protocol, raw):
+    assert (protocol._ctx.raw is not None) == raw
+
+def test_read_write(sim, protocol):
+    size = sim.data_bytes
+    value = int.from_bytes(bytes(range(1, size + 1)), 'little')
+    protocol.write(sim, 5, size, value)
+    assert sim.mem[5 * size:6 * size] == bytes(range(1, size + 1))
+    assert protocol.read(sim, 5, size) == value
+    assert protocol.read(sim, 0, size) == _word(sim, 0)
+
+@pytest.mark.parametrize('nwords', [1, 3, 16, 17, 40])
+def test_burst(sim, protocol, nwords):
+    burst_max = 64 // sim.data_bytes
+    offset = 7
+    values = [random.getrandbits(8 * sim.data_bytes) for _ in range(nwords)]
+    sim.commands = 0
+    protocol.write_block(sim, offset, values)
+    assert [_word(sim, offset + i) for i in range(nwords)] == values
+    assert protocol.read_block(sim, offset, nwords) == values
+    # One command per (maximum-sized) burst each way.
+    assert sim.commands == 2 * -(-nwords // burst_max)
+
+def test_burst_len_rewrites(sim, protocol):
+    # The burst length is only rewritten when it changes.
+    protocol.read_block(sim, 0, 2)
+    sim.reset_counters()
+    protocol.read_block(sim, 0, 2)
+    protocol.read_block(sim, 2, 2)
+    reads_writes = sim.writes
+    protocol.read(sim, 0, sim.data_bytes)
+    assert sim.writes - reads_writes == 3 # addr, burst.len, command
+
+def test_transaction_error(sim, protocol):
+    depth = len(sim.mem) // sim.data_bytes
+    with pytest.raises(IOError, match='Transaction error'):
+        protocol.read(sim, depth, sim.data_bytes)
+    with pytest.raises(IOError):
+        protocol.read_block(sim, depth - 1, 2)
+    assert protocol.read(sim, 0, sim.data_bytes) == _word(sim, 0)
+
+def test_fault(sim, protocol):
+    sim.fail_next('error')
+    with pytest.raises(IOError, match='Transaction error'):
+        protocol.write(sim, 0, sim.data_bytes, 1)
+    sim.fail_next('timeout')
+    with pytest.raises(TimeoutError, match='Transaction timeout'):
+        protocol.read(sim, 0, sim.data_bytes)
+    protocol.write(sim, 0, sim.data_bytes, 1)
+    assert protocol.read(sim, 0, sim.data_bytes) == 1
+
+def test_controller_timeout(as_proxy):
+    sim = as_proxy(MemProxySim(size=1024, op_delay=50e-3))
+    protocol = _start(sim, delay=1e-3)
+    protocol.wait_timeout = 5e-3
+    with pytest.raises(TimeoutError, match='Controller timeout'):
+        protocol.read(sim, 0, 4)
+    with pytest.raises(TimeoutError, match='not ready'):
+        protocol.read(sim, 0, 4)
+
+def test_timeout_validation():
+    with pytest.raises(ValueError):
+        mem_proxy_protocol.Protocol(None, 'mem_proxy', timeout=1e-4, delay=1e-3)
+
+def test_metrics(sim):
+    metrics = ProtocolMetrics()
+    protocol = _start(sim, metrics=metrics)
+    protocol.read_block(sim, 0, 20)
+    stats = metrics.as_dict()
+    assert stats['mem_read']['count'] == -(-20 // (64 // sim.data_bytes))
+
+#---------------------------------------------------------------------------------------------------
+# Read cache.
+#---------------------------------------------------------------------------------------------------
+def test_cache_disabled_by_default(sim, protocol):
+    sim.commands = 0
+    for offset in range(8):
+        protocol.read(sim, offset, sim.data_bytes)
+    assert sim.commands == 8
+    assert protocol.cache_hits == 0
+
+def test_cache_read_ahead(sim):
+    protocol = _start(sim, read_cache=4)
+    line = 64 // sim.data_bytes
+    depth = len(sim.mem) // sim.data_bytes
+    sim.commands = 0
+    values = [protocol.read(sim, offset, sim.data_bytes) for offset in range(depth)]
+    assert values == [_word(sim, offset) for offset in range(depth)]
+    assert sim.commands == depth // line
+    assert (protocol.cache_hits, protocol.cache_misses) == (depth - depth // line, depth // line)
+
+def test_cache_write_invalidate(sim):
+    protocol = _start(sim, read_cache=4)
+    size = sim.data_bytes
+    protocol.read(sim, 5, size)
+    protocol.write(sim, 5, size, 0x1234)
+    assert protocol.read(sim, 5, size) == 0x1234
+    protocol.read(sim, 40, size)
+    protocol.write_block(sim, 30, list(range(40)))
+    assert [protocol.read(sim, offset, size) for offset in range(30, 70)] == list(range(40))
+
+def test_cache_lru(sim):
+    protocol = _start(sim, read_cache=2)
+    line = 64 // sim.data_bytes
+    for base in (0, line, 2 * line):
+        protocol.read(sim, base, sim.data_bytes)
+    sim.commands = 0
+    protocol.read(sim, 2 * line + 1, sim.data_bytes) # Most recent line: hit.
+    protocol.read(sim, 1, sim.data_bytes)            # Evicted line: miss.
+    assert sim.commands == 1
+
+def test_cache_random(sim):
+    protocol = _start(sim, read_cache=3)
+    rng = random.Random(0)
+    depth = len(sim.mem) // sim.data_bytes
+    for _ in range(1000):
+        offset = rng.randrange(depth)
+        if rng.random() < 0.3:
+            protocol.write(sim, offset, sim.data_bytes, rng.getrandbits(8 * sim.data_bytes))
+        assert protocol.read(sim, offset, sim.data_bytes) == _word(sim, offset)
+
+def test_cache_stop(sim):
+    protocol = _start(sim, read_cache=4)
+    protocol.read(sim, 0, sim.data_bytes)
+    protocol.stop(sim)
+    sim.mem[:sim.data_bytes] = bytes(sim.data_bytes)
+    protocol.start(sim)
+    assert protocol.read(sim, 0, sim.data_bytes) == 0
+
+def test_cache_live(sim):
+    protocol = _start(sim, read_cache=4, live=True)
+    sim.commands = 0
+    protocol.read(sim, 0, sim.data_bytes)
+    protocol.read(sim, 1, sim.data_bytes)
+    assert sim.commands == 2
+
+def test_cache_read_only(sim):
+    # Read-only memories are written through another path and never cached.
+    info = sim.peek('info')
+    info.access = mem_proxy_protocol.Protocol.AccessType.READ_ONLY
+    sim.poke('info', info)
+    protocol = _start(sim, read_cache=4)
+    sim.commands = 0
+    protocol.read(sim, 0, sim.data_bytes)
+    sim.mem[sim.data_bytes:2 * sim.data_bytes] = bytes(sim.data_bytes)
+    assert protocol.read(sim, 1, sim.data_bytes) == 0
+    assert sim.commands == 2
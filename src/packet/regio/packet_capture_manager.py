@@ -0,0 +1,124 @@
+__all__ = (
+    'PacketCaptureManager',
+)
+
+import concurrent.futures
+import os
+import sys
+import time
+
+try:
+    from proxy_wait import WaitPolicy
+except ImportError:
+    # Callers with only this directory on the module search path: add the shared protocol modules
+    # (src/reg/proxy/regio) from their location in the repository.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(here, '..', '..', 'reg', 'proxy', 'regio'))
+    from proxy_wait import WaitPolicy
+
+class PacketCaptureManager():
+
+    def __init__(self, engines, max_workers=None, debug=0, delay=1e-3):
+        self.engines = {}
+        for engine in engines:
+            if engine.name in self.engines:
+                raise ValueError(f'Duplicate capture engine name {engine.name!r}')
+            self.engines[engine.name] = engine
+        if max_workers is None:
+            max_workers = min(32, max(len(self.engines), 1))
+        self.max_workers = max_workers
+        # Longest interval between two completion polls of the pending engines.
+        self.delay = delay
+        self.__DEBUG = debug
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix='capture')
+        self._readouts = set()
+
+        if self.__DEBUG:
+            print(f'# [CaptureManager] INIT:')
+            print(f'#      Engines: {", ".join(self.engines)}')
+            print(f'#      Workers: {self.max_workers}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self, timeout=None):
+        # Stop the worker pool, waiting up to timeout seconds (indefinitely for None) for the readouts
+        # in progress. Only readouts run in the pool, so an idle engine never holds up the close.
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        (_, not_done) = concurrent.futures.wait(self._readouts, timeout)
+        if not_done:
+            raise TimeoutError(f'{len(not_done)} capture readouts still in progress')
+
+    def _select(self, names):
+        if names is None:
+            return list(self.engines.values())
+        return [self.engines[name] for name in names]
+
+    def _submit(self, engine, status):
+        # Readouts in progress are tracked for close() (the finished ones are dropped here).
+        future = self._executor.submit(engine.read_capture, status)
+        self._readouts = {readout for readout in self._readouts if not readout.done()}
+        self._readouts.add(future)
+        return future
+
+    def trigger(self, names=None):
+        # Arm all (selected) engines before waiting on any of them.
+        for engine in self._select(names):
+            engine.trigger()
+
+    def capture_iter(self, names=None, timeout=None):
+        # Arm the engines, then poll their completion (without blocking on any one engine) and read out
+        # each one from the worker pool as soon as its capture completes. Yields (name, (data, meta)) in
+        # completion order. Engines still pending after timeout seconds (no limit for None) raise a
+        # TimeoutError, as does a failed engine its exception, once the readouts already started have
+        # been drained.
+        engines = self._select(names)
+        self.trigger([engine.name for engine in engines])
+        pending = {engine.name: engine for engine in engines}
+        futures = {}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        error = None
+
+        def sweep():
+            # One status poll of each pending engine; the completed ones are handed to the pool.
+            for name in list(pending):
+                status = pending[name].poll_capture()
+                if status is not None:
+                    futures[self._submit(pending.pop(name), status)] = name
+            return [future for future in futures if future.done()]
+
+        while pending or futures:
+            if pending:
+                remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+                done = WaitPolicy(remaining, self.delay).wait(sweep, lambda done: done or not pending)
+                if done is None:
+                    if self.__DEBUG:
+                        print(f'# [CaptureManager] {", ".join(pending)} TIMEOUT')
+                    if error is None:
+                        error = TimeoutError(f'Capture timeout on {", ".join(pending)}')
+                    pending.clear()
+                    continue
+            else:
+                (done, _) = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if self.__DEBUG:
+                        print(f'# [CaptureManager] {name} FAILED ({e})')
+                    if error is None:
+                        error = e
+                    continue
+                if self.__DEBUG:
+                    print(f'# [CaptureManager] {name} DONE')
+                yield (name, result)
+        if error is not None:
+            raise error
+
+    def capture(self, names=None, timeout=None):
+        # Capture on all (selected) engines concurrently; returns {name: (data, meta)}.
+        return dict(self.capture_iter(names, timeout))
@@ -2,11 +2,23 @@ __all__ = (
     'PacketCaptureProtocol',
 )
 
-import math
+import copy
 import enum
+import os
+import sys
 import time
 
 from packet_mem_protocol import PacketMemProtocol
+try:
+    from proxy_wait import WaitPolicy
+    from reg_window import RegWindow
+except ImportError:
+    # Callers with only this directory on the module search path: add the shared protocol modules
+    # (src/reg/proxy/regio) from their location in the repository.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(here, '..', '..', 'reg', 'proxy', 'regio'))
+    from proxy_wait import WaitPolicy
+    from reg_window import RegWindow
 
 class PacketCaptureProtocol():
 
@@ -20,17 +32,34 @@ class PacketCaptureProtocol():
         READY = 2
         BUSY = 3
 
-    def __init__(self, proxy, name='Capture', debug=0, **kargs):
+    def __init__(self, proxy, name='Capture', debug=0, timeout=100e-3, delay=1e-3, wait_policy=None,
+                 capture_timeout=None, metrics=None, **kargs):
         self.name = name
         self.proxy = proxy
         self.__DEBUG = debug
         self.__TRACE = 0
         self.__MEM_SIZE = int(self.proxy.control.info.mem_size)
         self.__META_BITS = int(self.proxy.control.info.meta_width)
-        self.wait_delay = 1e-3
-        self.wait_count = 100
+        # Metadata register layout (meta[0].byte_0 holds the most significant byte).
+        self._meta_window = RegWindow(-(-self.__META_BITS // 8), 'big')
+        self._meta_regs = self.proxy.control.meta[:self._meta_window.nregs]
+        if wait_policy is None:
+            wait_policy = WaitPolicy(timeout, delay)
+        self.wait_policy = wait_policy
+        # Waiting on a capture is open-ended by default (completion depends on traffic).
+        self.capture_wait_policy = WaitPolicy(capture_timeout, delay)
+        # Optional proxy_metrics.ProtocolMetrics instance. Captures are recorded as 'capture' operations
+        # (completion wait and metadata readout); the packet memory readout is recorded by the packet
+        # memory agent.
+        self.metrics = metrics
+        # A triggered capture cannot be aborted (the engine only leaves the capture state on a packet).
+        # A capture left outstanding (e.g. by a timeout, or by stream() reaching its duration) stays
+        # armed: trigger() then reuses it rather than waiting for a ready engine, and the next wait
+        # (or poll) collects it.
+        self.armed = False
         # Initialize packet memory agent
-        self.packetmem = PacketMemProtocol(proxy.data, f'{name} Mem', debug=self.__DEBUG)
+        self.packetmem = PacketMemProtocol(proxy.data, f'{name} Mem', wait_policy=wait_policy, metrics=metrics,
+                                           debug=self.__DEBUG)
 
         if self.__DEBUG:
             print(f'# [{self.name}] INIT:')
@@ -48,30 +77,34 @@ class PacketCaptureProtocol():
         control.enable = 0
         self.proxy.control.control = control
 
-    def _wait_status(self, test, count=None):
-        while True:
-            status = self.proxy.control.status().proxy
-            if test(status):
-                return status
+    def _wait_status(self, test, policy=None, record=None):
+        if policy is None:
+            policy = self.wait_policy
+        return policy.wait(lambda: self.proxy.control.status().proxy, test, record)
 
-            if count is None: # Loop infinitely for condition...
-                continue
+    def _wait_status_async(self, test, policy=None, record=None):
+        if policy is None:
+            policy = self.wait_policy
+        return policy.wait_async(lambda: self.proxy.control.status().proxy, test, record)
 
-            if count <= 0:
-                return None
-            count -= 1
-            time.sleep(self.wait_delay)
+    def _start_record(self):
+        if self.metrics is None:
+            return None
+        return self.metrics.start('capture')
+
+    def _issue(self, command):
+        cmd = self.proxy.control.command(0).proxy
+        cmd.code = int(command)
+        self.proxy.control.command = int(cmd)
 
     def _transact(self, command):
         # Setup for the transaction.
-        status = self._wait_status(lambda st: st.code == self.StatusCode.READY, count=self.wait_count)
+        status = self._wait_status(lambda st: st.code == self.StatusCode.READY)
         if status is None:
             raise TimeoutError('Controller not ready')
 
         # Trigger the transaction.
-        cmd = self.proxy.control.command(0).proxy
-        cmd.code = int(command)
-        self.proxy.control.command = int(cmd)
+        self._issue(command)
 
         # Wait for the transaction to complete.
         status = self._wait_status(lambda st: st.done or st.error)
@@ -80,55 +113,84 @@ class PacketCaptureProtocol():
         if status.error:
             raise IOError('Transaction error')
 
-    def trigger(self):
-        # Setup for the transaction.
-        status = self._wait_status(lambda st: st.code == self.StatusCode.READY, count=self.wait_count)
+    def _triggered(self, status):
         if status is None:
             raise TimeoutError('Controller not ready')
 
         # Trigger the transaction.
-        cmd = self.proxy.control.command(0).proxy
-        cmd.code = int(self.CommandCode.CAPTURE)
-        self.proxy.control.command = int(cmd)
+        self._issue(self.CommandCode.CAPTURE)
+        self.armed = True
 
         if (self.__DEBUG):
             print(f'# [{self.name}] TRIGGERED')
 
-    def wait_on_capture(self):
-        # Wait for the transaction to complete.
-        status = self._wait_status(lambda st: st.done or st.error, None)
+    def trigger(self):
+        if self.armed:
+            return
+        # Setup for the transaction.
+        self._triggered(self._wait_status(lambda st: st.code == self.StatusCode.READY))
+
+    async def trigger_async(self):
+        if self.armed:
+            return
+        self._triggered(await self._wait_status_async(lambda st: st.code == self.StatusCode.READY))
+
+    def _captured(self, status, record=None):
         if status is None:
             raise TimeoutError('Controller timeout')
+        self.armed = False
         if status.error:
             raise IOError('Transaction error')
         size = int(status.packet_bytes)
         if self.__DEBUG:
             print(f'# [{self.name}] CAPTURE DONE ({size}B captured)')
-        return self._get_capture(size)
-
-    def _get_meta(self):
-        __META_BYTES = math.ceil(self.__META_BITS/8)
-        __META_REGS = math.ceil(__META_BYTES/4)
+        capture = self._get_capture(size, record)
+        if record is not None:
+            self.metrics.finish(record, size)
+        return capture
+
+    def poll_capture(self):
+        # Non-blocking completion check of a triggered capture: a single status read, returning the
+        # status once the capture is done (or failed) and None while it is still pending. The done and
+        # error flags are cleared by the read, so the status is handed back to read_capture().
+        status = self.proxy.control.status().proxy
+        if status.done or status.error:
+            return status
+        return None
+
+    def read_capture(self, status):
+        # Read out the capture completed with status (see poll_capture()); returns (data, meta).
+        return self._captured(status, self._start_record())
 
+    def wait_on_capture(self):
+        # Wait for the transaction to complete.
+        record = self._start_record()
+        return self._captured(
+            self._wait_status(lambda st: st.done or st.error, self.capture_wait_policy, record), record)
+
+    async def wait_on_capture_async(self):
+        # Wait for the transaction to complete without blocking the event loop. Only the completion
+        # wait is asynchronous; reading out the (already captured) packet memory is not.
+        record = self._start_record()
+        return self._captured(
+            await self._wait_status_async(lambda st: st.done or st.error, self.capture_wait_policy, record),
+            record)
+
+    def _get_meta(self, record=None):
         if self.__TRACE:
             print(f'# [{self.name}] GET META')
-
-        meta = 0
-        for i in range(__META_REGS):
-            meta_reg = int(self.proxy.control.meta[i]._r)
-            if self.__TRACE:
-                print(f'#    META[{i}] = 0x{meta_reg:08x}')
-            for j in range(4):
-                byte_idx = i*4 + j
-                if (byte_idx < __META_BYTES):
-                    meta = (meta << 8) + (meta_reg & 0xff)
-                    meta_reg >>= 8
+        words = [int(reg._r) for reg in self._meta_regs]
+        meta = self._meta_window.from_words(words)
         if self.__TRACE:
+            for (i, meta_reg) in enumerate(words):
+                print(f'#    META[{i}] = 0x{meta_reg:08x}')
             print(f'#     META = 0x{meta:x}')
+        if record is not None:
+            record.reg_reads += len(words)
         return meta
 
-    def _get_capture(self, size):
-        meta = self._get_meta()
+    def _get_capture(self, size, record=None):
+        meta = self._get_meta(record)
         if self.__DEBUG:
             print(f'#     META = 0x{meta:x}')
         return (self.packetmem.read(0, size), meta)
@@ -139,3 +201,54 @@ class PacketCaptureProtocol():
     def capture(self):
         self.trigger()
         return self.wait_on_capture()
+
+    def stream(self, writer, count=None, duration=None):
+        # Capture continuously into writer (e.g. a pcap_file.PcapWriter/PcapngWriter), until count
+        # packets have been captured or duration seconds have elapsed. Each capture is read out into
+        # a single reusable buffer; the engine is re-armed as soon as the readout completes and the
+        # record is written while the next capture is pending. Returns the number of packets captured.
+        # The engine is not re-armed once the duration has elapsed, but the capture pending at that
+        # point (if any) is left armed, to be collected by the next capture (see __init__()).
+        buf = memoryview(bytearray(self.__MEM_SIZE))
+        deadline = None if duration is None else time.monotonic() + duration
+        captured = 0
+        if count is not None and count <= 0:
+            return captured
+        self.trigger()
+        while True:
+            policy = self.capture_wait_policy
+            if deadline is not None:
+                # Same wait, bounded by the remaining duration.
+                policy = copy.copy(policy)
+                policy.timeout = max(deadline - time.monotonic(), 0)
+            record = self._start_record()
+            status = self._wait_status(lambda st: st.done or st.error, policy, record)
+            if status is None:
+                if deadline is not None:
+                    break
+                raise TimeoutError('Controller timeout')
+            self.armed = False
+            if status.error:
+                raise IOError('Transaction error')
+            timestamp = time.time_ns()
+            size = int(status.packet_bytes)
+            meta = self._get_meta(record)
+            self.packetmem.readinto(0, buf[:size])
+            if record is not None:
+                self.metrics.finish(record, size)
+            captured += 1
+
+            last = (count is not None and captured >= count) or \
+                   (deadline is not None and time.monotonic() >= deadline)
+            if not last:
+                self.trigger()
+            writer.write(buf[:size], timestamp, meta)
+            if self.__DEBUG:
+                print(f'# [{self.name}] STREAM {captured}: {size}B, META = 0x{meta:x}')
+            if last:
+                break
+        return captured
+
+    async def capture_async(self):
+        await self.trigger_async()
+        return await self.wait_on_capture_async()
@@ -2,9 +2,22 @@ __all__ = (
     'PacketMemProtocol',
 )
 
-import math
 import enum
-import time
+import os
+import struct
+import sys
+import types
+
+try:
+    from proxy_wait import WaitPolicy
+    from reg_shadow import RegShadow
+except ImportError:
+    # Callers with only this directory on the module search path: add the shared protocol modules
+    # (src/reg/proxy/regio) from their location in the repository.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(here, '..', '..', 'reg', 'proxy', 'regio'))
+    from proxy_wait import WaitPolicy
+    from reg_shadow import RegShadow
 
 class PacketMemProtocol():
 
@@ -18,7 +31,8 @@ class PacketMemProtocol():
         READY = 1
         BUSY = 2
 
-    def __init__(self, mem_proxy_if, name='Packet Mem', timeout=100e-3, delay=1e-3, debug=0, **kargs):
+    def __init__(self, mem_proxy_if, name='Packet Mem', timeout=100e-3, delay=1e-3, debug=0, wait_policy=None,
+                 shadow=False, metrics=None, **kargs):
         self.name = name
         self.proxy = mem_proxy_if
         self.__DEBUG = debug
@@ -26,8 +40,21 @@ class PacketMemProtocol():
         self.__SIZE = int(self.proxy.info_size_upper) << 32 + int(self.proxy.info_size_lower)
         self.__MIN_BURST= int(self.proxy.info_burst.min)
         self.__MAX_BURST = int(self.proxy.info_burst.max)
-        self.wait_delay = 1e-3
-        self.wait_count = 100
+        if wait_policy is None:
+            wait_policy = WaitPolicy(timeout, delay)
+        self.wait_policy = wait_policy
+        # Optional shadow of the addr/burst/wr_data registers, to skip redundant writes.
+        self.shadow = RegShadow(shadow)
+        self.metrics = metrics # Optional proxy_metrics.ProtocolMetrics instance.
+        # Data window layout, computed once: the registers a (maximum) burst can touch and the
+        # little-endian packing of each whole number of registers.
+        self.__BURST_LEN_MAX = max(self.__MAX_BURST // self.__MIN_BURST, 1)
+        window_regs = -(-self.__MAX_BURST // 4)
+        self._wr_regs = self.proxy.wr_data[:window_regs]
+        self._rd_regs = self.proxy.rd_data[:window_regs]
+        self._words = [struct.Struct(f'<{n}I') for n in range(window_regs + 1)]
+        # Word indices and masks for a mapped (reg_mmap.RawBlock) controller, None otherwise.
+        self._raw = self._raw_plan(self.proxy)
         if self.__DEBUG:
             print(f'# [{self.name}] INIT:')
             print(f'#      Protocol:        PacketMemProtocol')
@@ -39,31 +66,67 @@ class PacketMemProtocol():
             print(f'#      Burst (max):     {self.__MAX_BURST}B')
             print(f'#      Burst Len (max): {self._get_burst_len_max()}')
 
+    @property
+    def burst_min(self):
+        return self.__MIN_BURST
+
+    @property
+    def burst_max(self):
+        return self.__MAX_BURST
+
     def _get_burst_len_max(self):
-        return math.floor(self.__MAX_BURST/self.__MIN_BURST)
+        return self.__BURST_LEN_MAX
 
     def _get_burst_len(self, size_in_bytes):
-        burst_len = math.ceil(size_in_bytes/self.__MIN_BURST)
-        return min(burst_len, self._get_burst_len_max())
+        return min(-(-size_in_bytes // self.__MIN_BURST), self.__BURST_LEN_MAX)
+
+    def _wait_status(self, test, record=None):
+        return self.wait_policy.wait(lambda: self.proxy.status().proxy, test, record)
 
-    def _wait_status(self, test):
-        count = self.wait_count
-        while True:
-            status = self.proxy.status().proxy
-            if test(status):
-                return status
+    @staticmethod
+    def _raw_plan(proxy):
+        if not hasattr(proxy, 'raw_words'):
+            return None
+        raw = types.SimpleNamespace(words=proxy.raw_words)
+        for name in ('command', 'status', 'wr_data', 'rd_data'):
+            setattr(raw, name, proxy.raw_index(name))
+        for name in ('done', 'error', 'timeout'):
+            (shift, mask) = proxy.raw_field('status', name)
+            setattr(raw, name, mask << shift)
+        raw.code = proxy.raw_field('status', 'code')
+        raw.command_shift = proxy.raw_field('command', 'code')[0]
+        return raw
+
+    def _transact_raw(self, command, record=None):
+        # Same transaction as _transact(), on the words of a mapped controller.
+        raw = self._raw
+        words = raw.words
+        status_index = raw.status
+        poll = lambda: words[status_index]
+
+        (code_shift, code_mask) = raw.code
+        ready = int(self.StatusCode.READY)
+        if self.wait_policy.wait(poll, lambda st: (st >> code_shift) & code_mask == ready, record) is None:
+            raise TimeoutError('Controller not ready')
 
-            if count is None: # Loop infinitely for condition...
-                continue
+        words[raw.command] = int(command) << raw.command_shift
+        if record is not None:
+            record.reg_writes += 1
 
-            if count <= 0:
-                return None
-            count -= 1
-            time.sleep(self.wait_delay)
+        complete = raw.done | raw.timeout | raw.error
+        status = self.wait_policy.wait(poll, lambda st: st & complete, record)
+        if status is None:
+            raise TimeoutError('Controller timeout')
+        if status & raw.timeout:
+            raise TimeoutError('Transaction timeout')
+        if status & raw.error:
+            raise IOError('Transaction error')
 
-    def _transact(self, command):
+    def _transact(self, command, record=None):
+        if self._raw is not None:
+            return self._transact_raw(command, record)
         # Setup for the transaction.
-        status = self._wait_status(lambda st: st.code == self.StatusCode.READY)
+        status = self._wait_status(lambda st: st.code == self.StatusCode.READY, record)
         if status is None:
             raise TimeoutError('Controller not ready')
 
@@ -71,9 +134,11 @@ class PacketMemProtocol():
         cmd = self.proxy.command(0).proxy
         cmd.code = int(command)
         self.proxy.command = int(cmd)
+        if record is not None:
+            record.reg_writes += 1
 
         # Wait for the transaction to complete.
-        status = self._wait_status(lambda st: st.done or st.timeout or st.error)
+        status = self._wait_status(lambda st: st.done or st.timeout or st.error, record)
         if status is None:
             raise TimeoutError('Controller timeout')
         if status.timeout:
@@ -81,102 +146,193 @@ class PacketMemProtocol():
         if status.error:
             raise IOError('Transaction error')
 
+    def invalidate(self):
+        # Forget all host-side state about the controller registers (e.g. after a reset).
+        self.shadow.invalidate()
+
+    def reset(self):
+        # Pulse the (soft) block reset of the memory controller.
+        control = self.proxy.control().proxy
+        control.reset = 1
+        self.proxy.control = control
+        control.reset = 0
+        self.proxy.control = control
+        self.invalidate()
+
+    def enable(self):
+        control = self.proxy.control().proxy
+        control.enable = 1
+        self.proxy.control = control
+        self.invalidate()
+
+    def disable(self):
+        control = self.proxy.control().proxy
+        control.enable = 0
+        self.proxy.control = control
+        self.invalidate()
+
     def nop(self):
         self._transact(self.CommandCode.NOP)
 
     def write(self, addr, data):
+        # Walk the source buffer by offset; memoryview slices reference the data without copying it.
+        data = self._as_bytes(data)
         size = len(data)
         if self.__DEBUG:
             print(f'# [{self.name}] WRITE {size}B to address 0x{addr:x}')
-        while len(data) > 0:
-            if (len(data) > self.__MAX_BURST):
-                burst_len = self._write_burst(addr, data[0:self.__MAX_BURST])
-                data = data[self.__MAX_BURST:]
-            else:
-                burst_len = self._write_burst(addr, data)
-                data = []
+        record = None
+        if self.metrics is not None:
+            record = self.metrics.start('packet_mem_write')
+        offset = 0
+        while offset < size:
+            burst_size = min(size - offset, self.__MAX_BURST)
+            burst_len = self._write_burst(addr, data[offset:offset + burst_size], record)
+            offset += burst_size
             addr += burst_len
+        if record is not None:
+            self.metrics.finish(record, size)
 
-    def read(self, addr, size):
-        data = []
+    def readinto(self, addr, buffer):
+        # Fill buffer (any writable buffer, e.g. bytearray, memoryview or mmap) with len(buffer)
+        # bytes read from the packet memory, starting at addr. Returns the number of bytes read.
+        data = memoryview(buffer).cast('B')
+        size = len(data)
         if self.__DEBUG:
             print(f'# [{self.name}] READ {size}B from address 0x{addr:x}')
-        while len(data) < size:
-            if ((size - len(data)) > self.__MAX_BURST):
-                (burst_len, new_data) = self._read_burst(addr, self.__MAX_BURST)
-                data.extend(new_data)
-            else:
-                (burst_len, new_data) = self._read_burst(addr, size - len(data))
-                data.extend(new_data)
+        record = None
+        if self.metrics is not None:
+            record = self.metrics.start('packet_mem_read')
+        offset = 0
+        while offset < size:
+            burst_size = min(size - offset, self.__MAX_BURST)
+            burst_len = self._read_burst(addr, data, offset, burst_size, record)
+            offset += burst_size
             addr += burst_len
-        return data
+        if record is not None:
+            self.metrics.finish(record, size)
+        return size
+
+    def read_bytes(self, addr, size):
+        # Read size bytes from the packet memory, starting at addr, as a bytes object.
+        data = bytearray(size)
+        self.readinto(addr, data)
+        return bytes(data)
+
+    def read(self, addr, size):
+        # Same as read_bytes(), as a list of byte values (the original interface).
+        return list(self.read_bytes(addr, size))
+
+    @staticmethod
+    def _as_bytes(data):
+        # Present packet data as a flat byte view; sequences of ints are accepted for compatibility.
+        try:
+            return memoryview(data).cast('B')
+        except TypeError:
+            return memoryview(bytes(data))
 
-    def _set_wr_data(self, data):
+    def _set_wr_data(self, data, burst_size):
+        # Registers are loaded little-endian (wr_data[0].byte_0 holds byte 0). Only the registers
+        # covered by the burst are written; bytes past the end of the data are zero-padded.
         size = len(data)
-        wr_regs = len(self.proxy.wr_data)
         if self.__TRACE:
-            print(f'# [{self.name}] SET_WR_DATA to {data}')
-        for i in range(wr_regs):
-            wr_data = 0
-            for j in range(4):
-                byte_idx = i*4 + j
-                if (byte_idx < size):
-                    wr_data = wr_data + (data[byte_idx] << j*8)
-            self.proxy.wr_data[i]._r = wr_data
+            print(f'# [{self.name}] SET_WR_DATA to {bytes(data)}')
+        full_regs = size // 4
+        words = list(self._words[full_regs].unpack_from(data))
+        if size % 4:
+            words.append(int.from_bytes(data[full_regs*4:], 'little'))
+        words.extend([0] * (-(-burst_size // 4) - len(words)))
+        written = 0
+        raw = self._raw
+        for (i, wr_data) in enumerate(words):
+            if self.shadow.update(('wr_data', i), wr_data):
+                if raw is not None:
+                    raw.words[raw.wr_data + i] = wr_data
+                else:
+                    self._wr_regs[i]._r = wr_data
+                written += 1
             if self.__TRACE:
                 print(f'#    WR_REG[{i:2d}] = 0x{wr_data:08x}')
+        # Number of registers actually written.
+        return written
 
-    def _get_rd_data(self, size):
-        data = [0]*size
-        rd_regs = len(self.proxy.rd_data)
+    def _get_rd_data(self, data, offset, size):
+        # Unpack the little-endian read data registers directly into data[offset:offset+size].
+        rd_regs = -(-size // 4)
         if self.__TRACE:
             print(f'# [{self.name}] GET_RD_DATA')
-        for i in range(rd_regs):
-            rd_reg = self.proxy.rd_data[i]
-            rd_data = int(rd_reg._r)
-            for j in range(4):
-                byte_idx = i*4 + j
-                if (byte_idx < size):
-                    data[byte_idx] = (rd_data >> j*8) & 0xff
-            if self.__TRACE:
-                print(f'#    RD_REG[{i:2d}] = 0x{rd_data:08x}')
+        raw = self._raw
+        if raw is not None:
+            words = [raw.words[raw.rd_data + i] for i in range(rd_regs)]
+        else:
+            words = [int(reg._r) for reg in self._rd_regs[:rd_regs]]
+        full_regs = size // 4
+        self._words[full_regs].pack_into(data, offset, *words[:full_regs])
+        if size % 4:
+            data[offset + full_regs*4:offset + size] = words[-1].to_bytes(4, 'little')[:size % 4]
         if self.__TRACE:
-            print(f'#    DATA: {data}')
-        return data
+            for (i, rd_data) in enumerate(words):
+                print(f'#    RD_REG[{i:2d}] = 0x{rd_data:08x}')
+            print(f'#    DATA: {bytes(data[offset:offset + size])}')
 
-    def _write_burst(self, addr, data):
+    def _write_burst(self, addr, data, outer=None):
         size = len(data)
         if (size > self.__MAX_BURST):
             return 0
         if self.__DEBUG:
             print(f'#     WRITE {len(data)}B to address 0x{addr:04x}')
+        record = None
+        if self.metrics is not None:
+            record = self.metrics.start('mem_burst_write')
+        burst_len = self._get_burst_len(size)
         # Configure transfer
         # - write data
-        self._set_wr_data(data)
+        writes = self._set_wr_data(data, burst_len * self.__MIN_BURST)
         # - address
-        self.proxy.addr = addr
+        if self.shadow.update('addr', addr):
+            self.proxy.addr = addr
+            writes += 1
         # - burst length
-        burst_len = self._get_burst_len(size)
-        self.proxy.burst.len = burst_len
+        if self.shadow.update('burst.len', burst_len):
+            self.proxy.burst.len = burst_len
+            writes += 1
         # Execute write
-        self._transact(self.CommandCode.WRITE)
-        return self._get_burst_len(size)
+        if record is not None:
+            record.reg_writes += writes
+        self._transact(self.CommandCode.WRITE, record)
+        if record is not None:
+            self.metrics.finish(record, size)
+            if outer is not None:
+                outer.merge(record)
+        return burst_len
 
-    def _read_burst(self, addr, size):
+    def _read_burst(self, addr, data, offset, size, outer=None):
         if (size > self.__MAX_BURST):
             return 0
         if self.__DEBUG:
             print(f'#     READ {size}B from address 0x{addr:04x}')
+        record = None
+        if self.metrics is not None:
+            record = self.metrics.start('mem_burst_read')
+        writes = 0
         # Configure transfer
         # - address
-        self.proxy.addr = addr
+        if self.shadow.update('addr', addr):
+            self.proxy.addr = addr
+            writes += 1
         # - burst length
         burst_len = self._get_burst_len(size)
-        self.proxy.burst.len = burst_len
+        if self.shadow.update('burst.len', burst_len):
+            self.proxy.burst.len = burst_len
+            writes += 1
         # Execute read
-        self._transact(self.CommandCode.READ)
+        if record is not None:
+            record.reg_writes += writes
+        self._transact(self.CommandCode.READ, record)
         # Read data
-        return (self._get_burst_len(size), self._get_rd_data(size))
-
-
-        
+        self._get_rd_data(data, offset, size)
+        if record is not None:
+            record.reg_reads += -(-size // 4)
+            self.metrics.finish(record, size)
+            if outer is not None:
+                outer.merge(record)
+        return burst_len
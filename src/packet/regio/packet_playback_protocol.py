@@ -2,11 +2,24 @@ __all__ = (
     'PacketPlaybackProtocol',
 )
 
-import math
 import enum
-import time
+import os
+import sys
 
 from packet_mem_protocol import PacketMemProtocol
+from pcap_file import open_reader
+try:
+    from proxy_wait import WaitPolicy
+    from reg_shadow import RegShadow
+    from reg_window import RegWindow
+except ImportError:
+    # Callers with only this directory on the module search path: add the shared protocol modules
+    # (src/reg/proxy/regio) from their location in the repository.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(here, '..', '..', 'reg', 'proxy', 'regio'))
+    from proxy_wait import WaitPolicy
+    from reg_shadow import RegShadow
+    from reg_window import RegWindow
 
 class PacketPlaybackProtocol():
 
@@ -23,17 +36,33 @@ class PacketPlaybackProtocol():
         READY = 2
         BUSY = 3
 
-    def __init__(self, proxy, name='Playback', debug=0, **kargs):
+    def __init__(self, proxy, name='Playback', debug=0, timeout=100e-3, delay=1e-3, wait_policy=None, shadow=False,
+                 mem_cache=False, metrics=None, **kargs):
         self.name = name
         self.proxy = proxy
         self.__DEBUG = debug
         self.__TRACE = 0
         self.__MEM_SIZE = int(self.proxy.control.info.mem_size)
         self.__META_BITS = int(self.proxy.control.info.meta_width)
-        self.wait_delay = 1e-3
-        self.wait_count = 100
+        # Metadata register layout (meta[0].byte_0 holds the most significant byte).
+        self._meta_window = RegWindow(-(-self.__META_BITS // 8), 'big')
+        self._meta_regs = self.proxy.control.meta[:self._meta_window.nregs]
+        if wait_policy is None:
+            wait_policy = WaitPolicy(timeout, delay)
+        self.wait_policy = wait_policy
+        # Optional shadow of the config/meta registers, to skip redundant writes.
+        self.shadow = RegShadow(shadow)
+        # Optional proxy_metrics.ProtocolMetrics instance. Sends are recorded as 'playback_send'
+        # operations (config/meta writes and controller handshakes); loading the packet memory is
+        # recorded by the packet memory agent.
+        self.metrics = metrics
         # Initialize packet memory agent
-        self.packetmem = PacketMemProtocol(proxy.data, f'{name} Mem', debug=self.__DEBUG)
+        self.packetmem = PacketMemProtocol(proxy.data, f'{name} Mem', wait_policy=wait_policy, shadow=shadow,
+                                           metrics=metrics, debug=self.__DEBUG)
+        # Optional host-side copy of the packet memory contents (see _load()).
+        self.mem_cache = mem_cache
+        self._resident = memoryview(bytearray(self.__MEM_SIZE))
+        self._resident_size = 0
 
         if (self.__DEBUG):
             print(f'# [{self.name}] INIT:')
@@ -41,62 +70,92 @@ class PacketPlaybackProtocol():
             print(f'#      Size: {self.__MEM_SIZE}B')
             print(f'#      Meta width: {self.__META_BITS}b')
 
+    def reset(self):
+        # Pulse the (soft) block reset. All host-side state is dropped, as the registers are back to
+        # their reset values.
+        control = self.proxy.control.control().proxy
+        control.reset = 1
+        self.proxy.control.control = control
+        control.reset = 0
+        self.proxy.control.control = control
+        self.invalidate()
+
     def enable(self):
         control = self.proxy.control.control().proxy
         control.enable = 1
         self.proxy.control.control = control
+        # The register shadows are not trusted across a change of the block state.
+        self.shadow.invalidate()
+        self.packetmem.invalidate()
 
     def disable(self):
         control = self.proxy.control.control().proxy
         control.enable = 0
         self.proxy.control.control = control
+        self.shadow.invalidate()
+        self.packetmem.invalidate()
 
-    def _set_config(self, size, burst_size=1):
+    def invalidate(self):
+        # Forget all host-side state about the controller registers and packet memory (e.g. after a
+        # reset, or after the packet memory was written through another path).
+        self.shadow.invalidate()
+        self.packetmem.invalidate()
+        self._resident_size = 0
+
+    def _load(self, data):
+        # Load the packet into packet memory. With the memory cache enabled, a copy of what is
+        # resident in packet memory is kept on the host and only the (max-size) bursts whose
+        # contents differ from it are written; resending an identical packet writes nothing.
+        if not self.mem_cache:
+            self.packetmem.write(0, data)
+            return
+        data = self.packetmem._as_bytes(data)
+        size = len(data)
+        if size > self.__MEM_SIZE:
+            raise ValueError(f'Packet of {size}B exceeds the playback memory size of {self.__MEM_SIZE}B')
+        burst_min = self.packetmem.burst_min
+        burst_max = self.packetmem.burst_max
+        resident = self._resident
+        for offset in range(0, size, burst_max):
+            end = min(offset + burst_max, size)
+            if end <= self._resident_size and resident[offset:end] == data[offset:end]:
+                continue
+            self.packetmem.write(offset // burst_min, data[offset:end])
+            # The tail of the last (partial) burst is zero-filled by the memory write.
+            burst_end = min(-(-end // burst_min) * burst_min, self.__MEM_SIZE)
+            resident[offset:end] = data[offset:end]
+            resident[end:burst_end] = bytes(burst_end - end)
+            self._resident_size = max(self._resident_size, burst_end)
+
+    def _set_config(self, size, burst_size=1, record=None):
+        if not self.shadow.update('config', (size, burst_size)):
+            return
         config = self.proxy.control.config().proxy
         config.packet_bytes = size
         config.burst_size = burst_size
         self.proxy.control.config = config
+        if record is not None:
+            record.reg_reads += 1
+            record.reg_writes += 1
 
-    def _set_meta(self, meta):
-        __META_BYTES = math.ceil(self.__META_BITS/8)
-        __META_REGS = math.ceil(__META_BYTES/4)
-
+    def _set_meta(self, meta, record=None):
         if self.__TRACE:
             print(f'# [{self.name}] SET META: 0x{meta:x}')
-
-        meta_bytes = []
-        for i in range(__META_BYTES):
-            meta_bytes.append(meta & 0xff)
-            meta >>= 8
-
-        for i in range(__META_REGS):
-            meta_reg = 0
-            for j in range(4):
-                byte_idx = i*4 + j
-                if (byte_idx < __META_BYTES):
-                    meta_reg = meta_reg  + (meta_bytes.pop() << 8*j)
+        for (i, meta_reg) in enumerate(self._meta_window.to_words(meta)):
             if self.__TRACE:
                 print(f'#     META[{i}] = 0x{meta_reg:08x}')
-            self.proxy.control.meta[i]._r = meta_reg
+            if self.shadow.update(('meta', i), meta_reg):
+                self._meta_regs[i]._r = meta_reg
+                if record is not None:
+                    record.reg_writes += 1
 
-    def _wait_status(self, test):
-        count = self.wait_count
-        while True:
-            status = self.proxy.control.status().proxy
-            if test(status):
-                return status
+    def _wait_status(self, test, record=None):
+        return self.wait_policy.wait(lambda: self.proxy.control.status().proxy, test, record)
 
-            if count is None: # Loop infinitely for condition...
-                continue
-
-            if count <= 0:
-                return None
-            count -= 1
-            time.sleep(self.wait_delay)
+    def _wait_status_async(self, test, record=None):
+        return self.wait_policy.wait_async(lambda: self.proxy.control.status().proxy, test, record)
 
-    def _transact(self, command):
-        # Setup for the transaction.
-        status = self._wait_status(lambda st: st.code == self.StatusCode.READY)
+    def _issue(self, status, command, record=None):
         if status is None:
             raise TimeoutError('Controller not ready')
 
@@ -104,9 +163,10 @@ class PacketPlaybackProtocol():
         cmd = self.proxy.control.command(0).proxy
         cmd.code = int(command)
         self.proxy.control.command = int(cmd)
+        if record is not None:
+            record.reg_writes += 1
 
-        # Wait for the transaction to complete.
-        status = self._wait_status(lambda st: st.done or st.timeout or st.error)
+    def _complete(self, status):
         if status is None:
             raise TimeoutError('Controller timeout')
         if status.timeout:
@@ -114,24 +174,87 @@ class PacketPlaybackProtocol():
         if status.error:
             raise IOError('Transaction error')
 
+    def _transact(self, command, record=None):
+        # Setup for the transaction.
+        self._issue(self._wait_status(lambda st: st.code == self.StatusCode.READY, record), command, record)
+
+        # Wait for the transaction to complete.
+        self._complete(self._wait_status(lambda st: st.done or st.timeout or st.error, record))
+
+    async def _transact_async(self, command, record=None):
+        self._issue(await self._wait_status_async(lambda st: st.code == self.StatusCode.READY, record),
+                    command, record)
+        self._complete(await self._wait_status_async(lambda st: st.done or st.timeout or st.error, record))
+
     def nop(self):
         self._transact(self.CommandCode.NOP)
 
-    def send(self, data, meta=0, err=0, burst=1):
+    def _start_record(self):
+        if self.metrics is None:
+            return None
+        return self.metrics.start('playback_send')
+
+    def _prepare(self, data, meta, burst, record=None):
         size = len(data)
         if (self.__DEBUG):
             print(f'# [{self.name}] SEND:')
             print(f'#     SIZE: {size:d}B')
             print(f'#     META: 0x{meta:x}')
         # Configure transaction
-        self._set_config(size, burst)
-        self._set_meta(meta)
+        self._set_config(size, burst, record)
+        self._set_meta(meta, record)
         # Write packet memory
-        self.packetmem.write(0, data)
-        # Issue transaction
+        self._load(data)
+        # Select command
         if burst > 1:
-            self._transact(self.CommandCode.SEND_BURST)
+            return self.CommandCode.SEND_BURST
         elif burst < 1:
-            self._transact(self.CommandCode.SEND_CONTINUOUS)
-        else:
-            self._transact(self.CommandCode.SEND_ONE)
+            return self.CommandCode.SEND_CONTINUOUS
+        return self.CommandCode.SEND_ONE
+
+    def send(self, data, meta=0, err=0, burst=1):
+        record = self._start_record()
+        self._transact(self._prepare(data, meta, burst, record), record)
+        if record is not None:
+            self.metrics.finish(record, len(data))
+
+    def send_pcap(self, path, meta=0, burst_max=0xffff):
+        # Replay the records of a pcap/pcapng file in order, returning the number of packets sent.
+        # Records are streamed lazily from the file; each one is staged in a pre-sized buffer and
+        # runs of consecutive identical records (same data and metadata) are folded into a single
+        # SEND_BURST command of up to burst_max packets. Records without metadata (anything but a
+        # pcapng file carrying 'meta=0x...' comments) are sent with the given meta value.
+        staged = memoryview(bytearray(self.__MEM_SIZE))
+        staged_size = 0
+        staged_meta = None
+        burst = 0
+        sent = 0
+        with open_reader(path) as reader:
+            for (_, data, record_meta) in reader:
+                size = len(data)
+                if size > self.__MEM_SIZE:
+                    raise ValueError(f'Packet of {size}B exceeds the playback memory size of {self.__MEM_SIZE}B')
+                if record_meta is None:
+                    record_meta = meta
+                if burst and burst < burst_max and record_meta == staged_meta and \
+                   staged[:staged_size] == data:
+                    burst += 1
+                    continue
+                if burst:
+                    self.send(staged[:staged_size], staged_meta, burst=burst)
+                    sent += burst
+                staged[:size] = data
+                staged_size = size
+                staged_meta = record_meta
+                burst = 1
+        if burst:
+            self.send(staged[:staged_size], staged_meta, burst=burst)
+            sent += burst
+        return sent
+
+    async def send_async(self, data, meta=0, err=0, burst=1):
+        # Only the controller handshakes are awaited; the packet memory is loaded synchronously.
+        record = self._start_record()
+        await self._transact_async(self._prepare(data, meta, burst, record), record)
+        if record is not None:
+            self.metrics.finish(record, len(data))
@@ -0,0 +1,242 @@
+__all__ = (
+    'PacketCaptureSim',
+    'PacketPlaybackSim',
+)
+
+import collections
+import math
+import os
+import sys
+
+try:
+    from mem_proxy_sim import MemProxySim
+    from proxy_sim import SimController
+except ImportError:
+    # Callers with only this directory on the module search path: add the shared simulation modules
+    # (src/mem/proxy/regio, src/reg/proxy/regio) from their location in the repository.
+    here = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(here, '..', '..', 'mem', 'proxy', 'regio'))
+    sys.path.append(os.path.join(here, '..', '..', 'reg', 'proxy', 'regio'))
+    from mem_proxy_sim import MemProxySim
+    from proxy_sim import SimController
+
+# Behavioural models of the packet capture/playback controllers (see packet_capture.yaml,
+# packet_playback.yaml and the packet_capture/packet_playback RTL), for running the packet protocols
+# without hardware. Each model exposes the `control` register block and the `data` packet memory
+# (a MemProxySim) of the corresponding decoder.
+
+class _PacketControl(SimController):
+    _BYTES = (('byte_0', 8), ('byte_1', 8), ('byte_2', 8), ('byte_3', 8))
+
+    STATUS_RESET = 0
+    STATUS_DISABLED = 1
+    STATUS_READY = 2
+    STATUS_BUSY = 3
+
+    CMD_NOP = 0
+
+    def __init__(self, owner, mem_size, meta_width, enabled, reg_latency, op_delay):
+        super().__init__(reg_latency, op_delay)
+        if meta_width > 32 * len(self.meta):
+            raise ValueError(f'Metadata width of {meta_width}b exceeds the metadata registers')
+        self.owner = owner
+        info = self.peek('info')
+        info.mem_size = mem_size
+        info.meta_width = meta_width
+        self.poke('info', info)
+        self.poke('monitor', 0x2) # Memory init done.
+        self.poke('control', int(enabled) << 1)
+        self.poke('status', self.STATUS_READY if enabled else self.STATUS_DISABLED)
+
+    @property
+    def meta_bytes(self):
+        return math.ceil(int(self.peek('info').meta_width) / 8)
+
+    def _set_code(self, code):
+        status = self.peek('status')
+        status.code = code
+        self.poke('status', status)
+
+    def _idle_code(self):
+        return self.STATUS_READY if self.peek('control').enable else self.STATUS_DISABLED
+
+    def _on_read(self, name, index):
+        value = super()._on_read(name, index)
+        if name == 'status':
+            # Done/error/timeout flags are cleared by the read.
+            status = self.peek('status')
+            status.done = 0
+            status.error = 0
+            if 'timeout' in self._fields['status']:
+                status.timeout = 0
+            self.poke('status', status)
+        return value
+
+    def _on_write(self, name, index, value):
+        super()._on_write(name, index, value)
+        if name == 'control' and self._pending is None:
+            self._set_code(self._idle_code())
+        elif name == 'command':
+            self._command(value & 0xff)
+
+    def _command(self, code):
+        # Commands are only accepted when ready.
+        if self._pending is not None or self.peek('status').code != self.STATUS_READY:
+            return
+        status = self.peek('status')
+        status.code = self.STATUS_BUSY
+        status.done = 0
+        status.error = 0
+        if 'timeout' in self._fields['status']:
+            status.timeout = 0
+        self.poke('status', status)
+        self._issue(self._operation(code))
+
+    def _operation(self, code):
+        return lambda: None
+
+    def _complete(self, fault):
+        status = self.peek('status')
+        status.code = self._idle_code()
+        status.done = int(fault is None)
+        status.error = int(fault == 'error')
+        if 'timeout' in self._fields['status']:
+            status.timeout = int(fault == 'timeout')
+        self.poke('status', status)
+
+class _CaptureControl(_PacketControl):
+    REGS = {
+        'info':    ((('mem_size', 20), ('meta_width', 10)), None, 0),
+        'control': ((('reset', 1), ('enable', 1)), None, 0),
+        'monitor': ((('reset', 1), ('init_done', 1)), None, 0),
+        'command': ((('code', 8),), None, 0),
+        'status':  ((('code', 8), ('done', 1), ('error', 1), ('rsvd', 6), ('packet_bytes', 16)), None, 0),
+        'meta':    (_PacketControl._BYTES, 8, 0),
+    }
+
+    CMD_CAPTURE = 1
+
+    def _operation(self, code):
+        if code == self.CMD_CAPTURE:
+            return self.owner._capture
+        return lambda: None
+
+    def _complete(self, fault):
+        if fault is not None:
+            status = self.peek('status')
+            status.packet_bytes = 0
+            self.poke('status', status)
+        super()._complete(fault)
+
+class PacketCaptureSim():
+    # Packets offered with receive() are queued; each CAPTURE command stores the next queued packet
+    # (truncated to the packet memory size) and its metadata, completing no earlier than op_delay
+    # after the command and otherwise as soon as a packet is available.
+
+    def __init__(self, mem_size=16384, meta_width=64, data_bytes=4, burst_max=64, enabled=False,
+                 reg_latency=0.0, op_delay=0.0, mem_op_delay=0.0):
+        self.control = _CaptureControl(self, mem_size, meta_width, enabled, reg_latency, op_delay)
+        self.data = MemProxySim(mem_size, data_bytes, burst_max, reg_latency=reg_latency, op_delay=mem_op_delay)
+        self.received = collections.deque()
+        self.captured = 0
+
+    def receive(self, data, meta=0):
+        # Offer a packet (with metadata) to the capture engine.
+        with self.control._lock:
+            self.received.append((bytes(data), meta))
+            self.control.advance()
+
+    def _capture(self):
+        if not self.received:
+            return False # Keep waiting for a packet.
+        (data, meta) = self.received.popleft()
+        data = data[:len(self.data.mem)]
+        self.data.mem[:len(data)] = data
+        control = self.control
+        status = control.peek('status')
+        status.packet_bytes = len(data)
+        control.poke('status', status)
+        meta_bytes = (meta & ((1 << (8 * control.meta_bytes)) - 1)).to_bytes(control.meta_bytes, 'big')
+        for i in range(len(control.meta)):
+            control.poke('meta', int.from_bytes(meta_bytes[4*i:4*i + 4], 'little'), i)
+        self.captured += 1
+
+class _PlaybackControl(_PacketControl):
+    REGS = {
+        'info':    ((('mem_size', 20), ('meta_width', 10)), None, 0),
+        'control': ((('reset', 1), ('enable', 1)), None, 0),
+        'monitor': ((('reset', 1), ('init_done', 1)), None, 0),
+        'command': ((('code', 8),), None, 0),
+        'config':  ((('packet_bytes', 16), ('burst_size', 16)), None, 1 << 16),
+        'status':  ((('code', 8), ('done', 1), ('error', 1), ('timeout', 1)), None, 0),
+        'meta':    (_PacketControl._BYTES, 8, 0),
+    }
+
+    CMD_SEND_ONE = 1
+    CMD_SEND_BURST = 2
+    CMD_SEND_CONTINUOUS = 3
+    CMD_STOP = 4
+
+    def _command(self, code):
+        # STOP is the only command accepted while sending continuously.
+        if code == self.CMD_STOP and self.owner.continuous:
+            self.__dict__['_pending'] = None
+            self._complete(None)
+            return
+        super()._command(code)
+
+    def _operation(self, code):
+        if code in (self.CMD_SEND_ONE, self.CMD_SEND_BURST):
+            # The packet is read out of memory when the command is accepted.
+            return self.owner._send(code == self.CMD_SEND_BURST)
+        if code == self.CMD_SEND_CONTINUOUS:
+            return self.owner._send_continuous()
+        return lambda: None
+
+    def _complete(self, fault):
+        self.owner.continuous = False
+        super()._complete(fault)
+
+class PacketPlaybackSim():
+    # Transmitted packets are appended to `sent` as (data, meta) tuples, one per packet (a burst
+    # appends burst_size entries). SEND_CONTINUOUS appends the packet once and keeps the controller
+    # busy until a STOP command.
+
+    def __init__(self, mem_size=16384, meta_width=64, data_bytes=4, burst_max=64, enabled=False,
+                 reg_latency=0.0, op_delay=0.0, mem_op_delay=0.0):
+        self.control = _PlaybackControl(self, mem_size, meta_width, enabled, reg_latency, op_delay)
+        self.data = MemProxySim(mem_size, data_bytes, burst_max, reg_latency=reg_latency, op_delay=mem_op_delay)
+        self.sent = []
+        self.continuous = False
+
+    def _packet(self):
+        control = self.control
+        size = control.peek('config').packet_bytes
+        if size > len(self.data.mem):
+            return None
+        meta_bytes = b''.join(int(control.peek('meta', i)).to_bytes(4, 'little') for i in range(len(control.meta)))
+        meta = int.from_bytes(meta_bytes[:control.meta_bytes], 'big')
+        return (bytes(self.data.mem[:size]), meta)
+
+    def _send(self, burst):
+        packet = self._packet()
+        count = max(self.control.peek('config').burst_size, 1) if burst else 1
+        def operation():
+            if packet is None:
+                return 'error'
+            self.sent.extend([packet] * count)
+        return operation
+
+    def _send_continuous(self):
+        packet = self._packet()
+        self.continuous = True
+        started = []
+        def operation():
+            if packet is None:
+                self.continuous = False
+                return 'error'
+            if not started:
+                self.sent.append(packet)
+                started.append(True)
+            return False # Busy until stopped.
+        return operation
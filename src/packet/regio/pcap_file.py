@@ -0,0 +1,295 @@
+__all__ = (
+    'LINKTYPE_ETHERNET',
+    'PcapWriter',
+    'PcapngWriter',
+    'open_writer',
+    'PcapReader',
+    'PcapngReader',
+    'open_reader',
+)
+
+import struct
+import time
+
+LINKTYPE_ETHERNET = 1
+
+# Default size of the file write buffer; bounds the memory held by a writer regardless of the number
+# of packets written.
+BUFFER_SIZE = 1 << 20
+
+class PcapWriter():
+    # Classic libpcap file format. Per-packet metadata has no representation in this format and is
+    # dropped (use PcapngWriter to keep it).
+
+    MAGIC_US = 0xa1b2c3d4
+    MAGIC_NS = 0xa1b23c4d
+
+    def __init__(self, path, linktype=LINKTYPE_ETHERNET, snaplen=65535, nanosecond=True,
+                 buffer_size=BUFFER_SIZE):
+        self.path = path
+        self.snaplen = snaplen
+        self.nanosecond = nanosecond
+        self.count = 0
+        self._file = open(path, 'wb', buffering=buffer_size)
+        magic = self.MAGIC_NS if nanosecond else self.MAGIC_US
+        self._file.write(struct.pack('<IHHiIII', magic, 2, 4, 0, 0, snaplen, linktype))
+        self._record = struct.Struct('<IIII')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def flush(self):
+        self._file.flush()
+
+    def write(self, data, timestamp=None, meta=None):
+        # timestamp is in nanoseconds since the epoch (defaults to now).
+        if timestamp is None:
+            timestamp = time.time_ns()
+        (ts_sec, ts_frac) = divmod(timestamp, 1000000000)
+        if not self.nanosecond:
+            ts_frac //= 1000
+        size = len(data)
+        incl_len = min(size, self.snaplen)
+        self._file.write(self._record.pack(ts_sec, ts_frac, incl_len, size))
+        self._file.write(data[:incl_len])
+        self.count += 1
+
+class PcapngWriter():
+    # pcapng file format (single section, single interface, nanosecond timestamps). The packet
+    # metadata is recorded as an Enhanced Packet Block comment of the form 'meta=0x...'.
+
+    SHB_TYPE = 0x0a0d0d0a
+    IDB_TYPE = 0x00000001
+    EPB_TYPE = 0x00000006
+    BYTE_ORDER_MAGIC = 0x1a2b3c4d
+
+    OPT_ENDOFOPT = 0
+    OPT_COMMENT = 1
+    OPT_IF_TSRESOL = 9
+
+    def __init__(self, path, linktype=LINKTYPE_ETHERNET, snaplen=65535, buffer_size=BUFFER_SIZE):
+        self.path = path
+        self.snaplen = snaplen
+        self.count = 0
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._write_block(self.SHB_TYPE, struct.pack('<IHHq', self.BYTE_ORDER_MAGIC, 1, 0, -1))
+        self._write_block(self.IDB_TYPE, struct.pack('<HHI', linktype, 0, snaplen) +
+                          self._option(self.OPT_IF_TSRESOL, b'\x09') + self._end_of_options())
+        self._epb = struct.Struct('<IIIIIII')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def flush(self):
+        self._file.flush()
+
+    @staticmethod
+    def _pad(size):
+        return -size % 4
+
+    @classmethod
+    def _option(cls, code, value):
+        return struct.pack('<HH', code, len(value)) + value + bytes(cls._pad(len(value)))
+
+    @classmethod
+    def _end_of_options(cls):
+        return struct.pack('<HH', cls.OPT_ENDOFOPT, 0)
+
+    def _write_block(self, block_type, body):
+        length = 12 + len(body)
+        self._file.write(struct.pack('<II', block_type, length))
+        self._file.write(body)
+        self._file.write(struct.pack('<I', length))
+
+    def write(self, data, timestamp=None, meta=None):
+        # timestamp is in nanoseconds since the epoch (defaults to now).
+        if timestamp is None:
+            timestamp = time.time_ns()
+        size = len(data)
+        incl_len = min(size, self.snaplen)
+        options = b''
+        if meta is not None:
+            options = self._option(self.OPT_COMMENT, f'meta=0x{meta:x}'.encode()) + self._end_of_options()
+        length = self._epb.size + incl_len + self._pad(incl_len) + len(options) + 4
+        self._file.write(self._epb.pack(self.EPB_TYPE, length, 0, timestamp >> 32, timestamp & 0xffffffff,
+                                        incl_len, size))
+        self._file.write(data[:incl_len])
+        self._file.write(bytes(self._pad(incl_len)))
+        self._file.write(options)
+        self._file.write(struct.pack('<I', length))
+        self.count += 1
+
+def open_writer(path, **kargs):
+    # Select the file format from the file extension (.pcapng or classic pcap otherwise).
+    if str(path).endswith('.pcapng'):
+        return PcapngWriter(path, **kargs)
+    return PcapWriter(path, **kargs)
+
+class _Reader():
+    # Readers stream records lazily from the file. Packet data is returned as a memoryview into a
+    # single buffer owned by the reader, which is reused (and grown if needed) from one record to
+    # the next; copy the data to keep it beyond the next iteration.
+
+    def __init__(self, path, buffer_size=BUFFER_SIZE, snaplen=65535):
+        self.path = path
+        self._file = open(path, 'rb', buffering=buffer_size)
+        self._buf = bytearray(snaplen)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def _read(self, size):
+        data = self._file.read(size)
+        if len(data) != size:
+            raise EOFError(f'Truncated capture file {self.path}')
+        return data
+
+    def _read_data(self, size, padded_size=None):
+        if len(self._buf) < size:
+            self._buf = bytearray(size)
+        view = memoryview(self._buf)[:size]
+        if self._file.readinto(view) != size:
+            raise EOFError(f'Truncated capture file {self.path}')
+        if padded_size is not None and padded_size > size:
+            self._read(padded_size - size)
+        return view
+
+class PcapReader(_Reader):
+    # Classic libpcap file format (either byte order, microsecond or nanosecond timestamps). Yields
+    # (timestamp, data, meta) tuples, with the timestamp in nanoseconds and meta always None.
+
+    def __init__(self, path, **kargs):
+        super().__init__(path, **kargs)
+        header = self._read(24)
+        for endian in ('<', '>'):
+            magic = struct.unpack(endian + 'I', header[:4])[0]
+            if magic in (PcapWriter.MAGIC_US, PcapWriter.MAGIC_NS):
+                break
+        else:
+            raise ValueError(f'{path} is not a pcap file')
+        self.nanosecond = magic == PcapWriter.MAGIC_NS
+        (_, _, _, _, _, self.snaplen, self.linktype) = struct.unpack(endian + 'IHHiIII', header)
+        self._record = struct.Struct(endian + 'IIII')
+
+    def __iter__(self):
+        scale = 1 if self.nanosecond else 1000
+        while True:
+            header = self._file.read(self._record.size)
+            if not header:
+                return
+            if len(header) != self._record.size:
+                raise EOFError(f'Truncated capture file {self.path}')
+            (ts_sec, ts_frac, incl_len, _) = self._record.unpack(header)
+            yield (ts_sec * 1000000000 + ts_frac * scale, self._read_data(incl_len), None)
+
+class PcapngReader(_Reader):
+    # pcapng file format. Yields (timestamp, data, meta) tuples for Enhanced and Simple Packet Blocks,
+    # with the timestamp in nanoseconds (None for Simple Packet Blocks) and meta decoded from a
+    # 'meta=0x...' comment (as written by PcapngWriter), or None.
+
+    SPB_TYPE = 0x00000003
+
+    def __init__(self, path, **kargs):
+        super().__init__(path, **kargs)
+        self._endian = '<'
+        self._tsresol = []
+        self.linktype = None
+
+    def _options(self, data):
+        endian = self._endian
+        offset = 0
+        while offset + 4 <= len(data):
+            (code, length) = struct.unpack_from(endian + 'HH', data, offset)
+            if code == PcapngWriter.OPT_ENDOFOPT:
+                return
+            yield (code, bytes(data[offset + 4:offset + 4 + length]))
+            offset += 4 + length + (-length % 4)
+
+    def _section(self, body):
+        for endian in ('<', '>'):
+            if struct.unpack_from(endian + 'I', body)[0] == PcapngWriter.BYTE_ORDER_MAGIC:
+                self._endian = endian
+                break
+        else:
+            raise ValueError(f'{self.path} is not a pcapng file')
+        self._tsresol = []
+
+    def _interface(self, body):
+        (linktype, _, _) = struct.unpack_from(self._endian + 'HHI', body)
+        if self.linktype is None:
+            self.linktype = linktype
+        tsresol = 1000 # Microsecond resolution by default.
+        for (code, value) in self._options(body[8:]):
+            if code == PcapngWriter.OPT_IF_TSRESOL:
+                if value[0] & 0x80:
+                    tsresol = 1e9 / (1 << (value[0] & 0x7f))
+                else:
+                    tsresol = 10 ** (9 - value[0])
+        self._tsresol.append(tsresol)
+
+    def _meta(self, options):
+        for (code, value) in self._options(options):
+            if code == PcapngWriter.OPT_COMMENT and value.startswith(b'meta='):
+                return int(value[5:], 0)
+        return None
+
+    def __iter__(self):
+        while True:
+            header = self._file.read(8)
+            if not header:
+                return
+            if len(header) != 8:
+                raise EOFError(f'Truncated capture file {self.path}')
+            block_type = struct.unpack('<I', header[:4])[0]
+            if block_type == PcapngWriter.SHB_TYPE:
+                # Byte order is not known until the byte-order magic has been read.
+                magic = self._read(4)
+                self._section(magic)
+                length = struct.unpack(self._endian + 'I', header[4:])[0]
+                self._read(length - 12)
+                continue
+            (block_type, length) = struct.unpack(self._endian + 'II', header)
+            if block_type == PcapngWriter.EPB_TYPE:
+                (if_id, ts_high, ts_low, incl_len, _) = struct.unpack(self._endian + 'IIIII', self._read(20))
+                data = self._read_data(incl_len, incl_len + (-incl_len % 4))
+                options = self._read(length - 32 - incl_len - (-incl_len % 4))
+                timestamp = int(((ts_high << 32) | ts_low) * self._tsresol[if_id])
+                yield (timestamp, data, self._meta(options))
+                self._read(4)
+            elif block_type == self.SPB_TYPE:
+                orig_len = struct.unpack(self._endian + 'I', self._read(4))[0]
+                incl_len = length - 16
+                data = self._read_data(min(orig_len, incl_len), incl_len)
+                yield (None, data, None)
+                self._read(4)
+            elif block_type == PcapngWriter.IDB_TYPE:
+                self._interface(self._read(length - 12))
+                self._read(4)
+            else:
+                self._read(length - 8)
+
+def open_reader(path, **kargs):
+    # Select the reader from the file's magic number.
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic == struct.pack('<I', PcapngWriter.SHB_TYPE):
+        return PcapngReader(path, **kargs)
+    return PcapReader(path, **kargs)
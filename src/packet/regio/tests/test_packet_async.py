@@ -0,0 +1,134 @@
+import asyncio
+import time
+
+import pytest
+
+from packet_capture_protocol import PacketCaptureProtocol
+from packet_playback_protocol import PacketPlaybackProtocol
+from packet_sim import PacketCaptureSim, PacketPlaybackSim
+from proxy_metrics import OpRecord
+from proxy_wait import WaitPolicy
+
+# The asyncio API is run with asyncio.run() from plain tests.
+
+def _capture(**kargs):
+    sim = PacketCaptureSim(mem_size=2048, meta_width=64, enabled=True)
+    return (sim, PacketCaptureProtocol(sim, timeout=10e-3, **kargs))
+
+def _playback(**kargs):
+    sim = PacketPlaybackSim(mem_size=2048, meta_width=64, enabled=True, **kargs)
+    return (sim, PacketPlaybackProtocol(sim, timeout=100e-3))
+
+async def _ticker(ticks, period=1e-3):
+    # Counts event loop turns while the waits are pending.
+    while True:
+        await asyncio.sleep(period)
+        ticks.append(time.monotonic())
+
+def test_wait_async():
+    policy = WaitPolicy(timeout=20e-3, delay=1e-3)
+    record = OpRecord('wait')
+    status = [0]
+    async def main():
+        wait = asyncio.ensure_future(policy.wait_async(lambda: status[0], bool, record))
+        await asyncio.sleep(10e-3)
+        status[0] = 5
+        return await wait
+    assert asyncio.run(main()) == 5
+    # The wait slept between polls (at most one per 1ms after the backoff) rather than spinning.
+    assert 2 <= record.polls < 25
+    assert record.sleep > 0
+
+def test_wait_async_fast_path():
+    record = OpRecord('wait')
+    assert asyncio.run(WaitPolicy().wait_async(lambda: 1, bool, record)) == 1
+    assert (record.polls, record.sleep) == (1, 0.0)
+
+def test_wait_async_timeout():
+    # The wait returns None; raising TimeoutError is left to the caller.
+    record = OpRecord('wait')
+    start = time.monotonic()
+    assert asyncio.run(WaitPolicy(timeout=10e-3, delay=1e-3).wait_async(lambda: 0, bool, record)) is None
+    assert 10e-3 <= time.monotonic() - start < 100e-3
+    assert record.polls < 25
+
+def test_capture_async_engines():
+    # Several capture engines waiting on one loop, with packets arriving later.
+    engines = [_capture(capture_timeout=1.0) for _ in range(4)]
+    ticks = []
+    async def feed():
+        for (i, (sim, _)) in enumerate(engines):
+            await asyncio.sleep(5e-3)
+            sim.receive(bytes([i]) * (60 + i), meta=i)
+    async def main():
+        ticker = asyncio.ensure_future(_ticker(ticks))
+        try:
+            (captures, _) = await asyncio.gather(
+                asyncio.gather(*(capture.capture_async() for (_, capture) in engines)), feed())
+        finally:
+            ticker.cancel()
+        return captures
+    captures = asyncio.run(main())
+    assert [(bytes(data), meta) for (data, meta) in captures] == [(bytes([i]) * (60 + i), i) for i in range(4)]
+    assert not any(capture.armed for (_, capture) in engines)
+    # The loop kept running during the waits, and the engines were polled at the sleep rate.
+    assert len(ticks) >= 10
+    for (sim, _) in engines:
+        assert sim.control.polls < 100
+
+def test_send_async_engines():
+    # Sends on several playback engines overlap: the total time is that of one send, not the sum.
+    engines = [_playback(op_delay=50e-3) for _ in range(4)]
+    ticks = []
+    async def main():
+        ticker = asyncio.ensure_future(_ticker(ticks))
+        try:
+            await asyncio.gather(*(playback.send_async(bytes([i]) * 64, meta=i)
+                                   for (i, (_, playback)) in enumerate(engines)))
+        finally:
+            ticker.cancel()
+    start = time.monotonic()
+    asyncio.run(main())
+    assert time.monotonic() - start < 150e-3
+    assert [sim.sent for (sim, _) in engines] == [[(bytes([i]) * 64, i)] for i in range(4)]
+    assert len(ticks) >= 20
+    for (sim, _) in engines:
+        assert sim.control.polls < 100
+
+def test_capture_async_timeout():
+    (sim, capture) = _capture(capture_timeout=10e-3)
+    with pytest.raises(TimeoutError, match='Controller timeout'):
+        asyncio.run(capture.capture_async())
+    # The engine stays armed, and the outstanding capture is collected by the next one.
+    assert capture.armed
+    sim.receive(b'late', meta=5)
+    (data, meta) = asyncio.run(capture.capture_async())
+    assert (bytes(data), meta) == (b'late', 5)
+    assert sim.captured == 1
+
+def test_capture_async_error():
+    (sim, capture) = _capture(capture_timeout=100e-3)
+    sim.control.fail_next('error')
+    sim.receive(b'x' * 10)
+    with pytest.raises(IOError, match='Transaction error'):
+        asyncio.run(capture.capture_async())
+    assert not capture.armed
+
+def test_send_async_timeout():
+    # The controller is still busy when the wait times out.
+    (sim, playback) = _playback(op_delay=1.0)
+    playback.wait_policy = WaitPolicy(timeout=10e-3, delay=1e-3)
+    with pytest.raises(TimeoutError, match='Controller timeout'):
+        asyncio.run(playback.send_async(b'x' * 10))
+
+@pytest.mark.parametrize(('fault', 'error', 'match'), [('error', IOError, 'Transaction error'),
+                                                       ('timeout', TimeoutError, 'Transaction timeout')])
+def test_send_async_fault(fault, error, match):
+    (sim, playback) = _playback()
+    sim.control.fail_next(fault)
+    with pytest.raises(error, match=match):
+        asyncio.run(playback.send_async(b'x' * 10))
+    assert sim.sent == []
+    # The controller is ready again.
+    asyncio.run(playback.send_async(b'y' * 10, meta=1))
+    assert sim.sent == [(b'y' * 10, 1)]
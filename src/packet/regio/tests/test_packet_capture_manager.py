@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from packet_capture_manager import PacketCaptureManager
+from packet_capture_protocol import PacketCaptureProtocol
+from packet_sim import PacketCaptureSim
+
+def _engines(count, **kargs):
+    sims = [PacketCaptureSim(mem_size=2048, meta_width=64, enabled=True, **kargs) for _ in range(count)]
+    engines = [PacketCaptureProtocol(sim, f'port{i}', timeout=10e-3) for (i, sim) in enumerate(sims)]
+    return (sims, engines)
+
+def test_capture():
+    (sims, engines) = _engines(6)
+    for (i, sim) in enumerate(sims):
+        sim.receive(bytes([i]) * (64 + i), meta=i)
+    with PacketCaptureManager(engines, max_workers=2) as manager:
+        results = manager.capture(timeout=1.0)
+    assert results == {f'port{i}': (list(bytes([i]) * (64 + i)), i) for i in range(6)}
+    assert not any(engine.armed for engine in engines)
+
+def test_capture_selected():
+    (sims, engines) = _engines(3)
+    sims[1].receive(b'one', meta=1)
+    with PacketCaptureManager(engines) as manager:
+        assert manager.capture(['port1'], timeout=1.0) == {'port1': (list(b'one'), 1)}
+    assert not engines[0].armed
+
+def test_capture_iter_order():
+    (sims, engines) = _engines(2)
+    sims[1].receive(b'first')
+    with PacketCaptureManager(engines) as manager:
+        results = manager.capture_iter(timeout=1.0)
+        assert next(results)[0] == 'port1'
+        sims[0].receive(b'second')
+        assert next(results)[0] == 'port0'
+
+def test_duplicate_names():
+    (_, engines) = _engines(1)
+    with pytest.raises(ValueError, match='Duplicate'):
+        PacketCaptureManager(engines * 2)
+
+def test_timeout():
+    (sims, engines) = _engines(3)
+    sims[0].receive(b'a')
+    sims[2].receive(b'c')
+    results = {}
+    with PacketCaptureManager(engines) as manager:
+        start = time.monotonic()
+        with pytest.raises(TimeoutError, match='port1'):
+            for (name, result) in manager.capture_iter(timeout=20e-3):
+                results[name] = result
+        assert time.monotonic() - start < 0.5
+    # The captures that completed are still delivered; the idle port is left armed.
+    assert sorted(results) == ['port0', 'port2']
+    assert engines[1].armed
+
+def test_error():
+    (sims, engines) = _engines(2)
+    sims[0].control.fail_next('error')
+    sims[0].receive(b'a')
+    sims[1].receive(b'b')
+    with PacketCaptureManager(engines) as manager:
+        with pytest.raises(IOError, match='Transaction error'):
+            manager.capture(timeout=1.0)
+
+def test_close_idle():
+    # An engine still waiting for traffic does not hold up the close.
+    (_, engines) = _engines(2)
+    manager = PacketCaptureManager(engines)
+    manager.trigger()
+    start = time.monotonic()
+    manager.close(timeout=1.0)
+    assert time.monotonic() - start < 0.5
+
+def test_close_timeout():
+    # Slow readout (register latency on the packet memory).
+    (sims, engines) = _engines(1, reg_latency=2e-3)
+    sims[0].receive(bytes(2048))
+    manager = PacketCaptureManager(engines)
+    manager.trigger()
+    status = engines[0].wait_policy.wait(engines[0].poll_capture, lambda st: st is not None)
+    manager._submit(engines[0], status)
+    with pytest.raises(TimeoutError, match='readouts still in progress'):
+        manager.close(timeout=1e-3)
+    manager.close()
@@ -0,0 +1,106 @@
+import pytest
+
+from packet_capture_protocol import PacketCaptureProtocol
+from packet_sim import PacketCaptureSim
+from pcap_file import PcapngReader, PcapngWriter
+from proxy_wait import WaitPolicy
+
+class _Writer():
+    def __init__(self):
+        self.records = []
+
+    def write(self, data, timestamp, meta):
+        self.records.append((bytes(data), meta))
+
+@pytest.fixture
+def sim():
+    return PacketCaptureSim(mem_size=2048, meta_width=64, enabled=True)
+
+@pytest.fixture
+def capture(sim):
+    return PacketCaptureProtocol(sim, timeout=10e-3, capture_timeout=50e-3)
+
+def test_capture(sim, capture):
+    sim.receive(b'\x01\x02\x03' * 30, meta=0x1122334455667788)
+    (data, meta) = capture.capture()
+    assert bytes(data) == b'\x01\x02\x03' * 30
+    assert meta == 0x1122334455667788
+    assert not capture.armed
+
+def test_capture_timeout_keeps_engine_armed(sim, capture):
+    with pytest.raises(TimeoutError):
+        capture.capture()
+    assert capture.armed
+    # The outstanding capture is collected by the next one, rather than timing out on ready.
+    sim.receive(b'late', meta=5)
+    (data, meta) = capture.capture()
+    assert (bytes(data), meta) == (b'late', 5)
+    assert sim.captured == 1
+
+def test_stream_count(sim, capture):
+    for i in range(3):
+        sim.receive(bytes([i]) * (60 + i), meta=i)
+    writer = _Writer()
+    assert capture.stream(writer, count=3) == 3
+    assert writer.records == [(bytes([i]) * (60 + i), i) for i in range(3)]
+    assert not capture.armed
+
+def test_stream_duration_then_capture(sim, capture):
+    sim.receive(b'a' * 64, meta=1)
+    sim.receive(b'b' * 65, meta=2)
+    writer = _Writer()
+    assert capture.stream(writer, duration=50e-3) == 2
+    assert writer.records == [(b'a' * 64, 1), (b'b' * 65, 2)]
+    # The engine was re-armed before the duration elapsed and is still waiting for a packet.
+    assert capture.armed
+    sim.receive(b'c' * 66, meta=3)
+    (data, meta) = capture.capture()
+    assert (bytes(data), meta) == (b'c' * 66, 3)
+    sim.receive(b'd' * 67, meta=4)
+    (data, meta) = capture.capture()
+    assert (bytes(data), meta) == (b'd' * 67, 4)
+
+def test_stream_duration_policy(sim, capture):
+    # The duration only bounds the configured capture wait.
+    capture.capture_wait_policy = WaitPolicy(None, delay=2e-3, spin=0, min_delay=1e-3, backoff=1.5)
+    policies = []
+    wait_status = capture._wait_status
+    capture._wait_status = lambda test, policy=None, record=None: \
+        policies.append(policy) or wait_status(test, policy, record)
+    sim.receive(b'a' * 64, meta=1)
+    assert capture.stream(_Writer(), duration=20e-3) == 1
+    # Capture waits (the trigger waits use the default policy).
+    policies = [policy for policy in policies if policy is not None]
+    assert len(policies) == 2
+    for policy in policies:
+        assert (policy.delay, policy.spin, policy.min_delay, policy.backoff) == (2e-3, 0, 1e-3, 1.5)
+        assert 0 <= policy.timeout <= 20e-3
+    assert capture.capture_wait_policy.timeout is None
+
+def test_stream_pcapng(sim, capture, tmp_path):
+    path = tmp_path / 'capture.pcapng'
+    for i in range(3):
+        sim.receive(bytes([i]) * (60 + i), meta=0x1122334455667700 + i)
+    with PcapngWriter(path) as writer:
+        assert capture.stream(writer, count=3) == 3
+    with PcapngReader(path) as reader:
+        records = [(timestamp, bytes(data), meta) for (timestamp, data, meta) in reader]
+    assert [record[1:] for record in records] == [(bytes([i]) * (60 + i), 0x1122334455667700 + i)
+                                                   for i in range(3)]
+    timestamps = [record[0] for record in records]
+    assert timestamps == sorted(timestamps)
+
+def test_stream_duration_idle(sim, capture):
+    writer = _Writer()
+    assert capture.stream(writer, duration=20e-3) == 0
+    assert writer.records == []
+    capture.trigger()
+    sim.receive(b'x' * 10)
+    assert bytes(capture.wait_on_capture()[0]) == b'x' * 10
+
+def test_stream_error(sim, capture):
+    sim.control.fail_next('error')
+    sim.receive(b'x' * 10)
+    with pytest.raises(IOError):
+        capture.stream(_Writer(), count=1)
+    assert not capture.armed
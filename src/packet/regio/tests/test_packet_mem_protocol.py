@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from mem_proxy_sim import MemProxySim
+from packet_mem_protocol import PacketMemProtocol
+
+@pytest.fixture(params=[4, 8], ids=lambda size: f'word{size}')
+def sim(request, as_proxy):
+    return as_proxy(MemProxySim(size=4096, data_bytes=request.param, burst_max=64))
+
+@pytest.fixture
+def packetmem(sim):
+    return PacketMemProtocol(sim, timeout=10e-3)
+
+def test_raw_plan(packetmem, raw):
+    assert (packetmem._raw is not None) == raw
+
+@pytest.mark.parametrize('size', [1, 3, 4, 63, 64, 65, 200, 1500])
+def test_roundtrip(sim, packetmem, size):
+    data = bytes((7 * i + size) & 0xff for i in range(size))
+    packetmem.write(0, data)
+    assert bytes(sim.mem[:size]) == data
+    assert packetmem.read_bytes(0, size) == data
+    # Bursts are issued at maximum size.
+    sim.commands = 0
+    packetmem.read_bytes(0, size)
+    assert sim.commands == -(-size // 64)
+
+def test_read_types(sim, packetmem):
+    sim.mem[:8] = bytes(range(1, 9))
+    assert packetmem.read(0, 8) == list(range(1, 9))
+    assert isinstance(packetmem.read_bytes(0, 8), bytes)
+
+def test_readinto(sim, packetmem):
+    sim.mem[:8] = bytes(range(1, 9))
+    buf = bytearray(6)
+    assert packetmem.readinto(0, memoryview(buf)[1:5]) == 4
+    assert buf == b'\x00\x01\x02\x03\x04\x00'
+
+def test_write_address(sim, packetmem):
+    # Addresses are in units of the minimum burst (memory word).
+    packetmem.write(3, b'\xaa' * 5)
+    offset = 3 * sim.data_bytes
+    assert bytes(sim.mem[offset:offset + 5]) == b'\xaa' * 5
+    assert packetmem.read_bytes(3, 5) == b'\xaa' * 5
+
+def test_write_int_list(sim, packetmem):
+    packetmem.write(0, [1, 2, 3])
+    assert bytes(sim.mem[:3]) == b'\x01\x02\x03'
+
+def test_shadow(sim):
+    packetmem = PacketMemProtocol(sim, timeout=10e-3, shadow=True)
+    data = bytes(range(64))
+    packetmem.write(0, data)
+    sim.reset_counters()
+    packetmem.write(0, data)
+    assert sim.writes == 1 # Command only.
+    assert bytes(sim.mem[:64]) == data
+
+@pytest.mark.parametrize('method', ['reset', 'enable', 'disable', 'invalidate'])
+def test_shadow_invalidate(sim, method):
+    packetmem = PacketMemProtocol(sim, timeout=10e-3, shadow=True)
+    data = bytes(range(64))
+    packetmem.write(0, data)
+    getattr(packetmem, method)()
+    sim.reset_counters()
+    packetmem.write(0, data)
+    # Data window, address, burst length and command.
+    assert sim.writes == 64 // 4 + 3
+
+def test_shadow_disabled(sim, packetmem):
+    data = bytes(range(64))
+    packetmem.write(0, data)
+    sim.reset_counters()
+    packetmem.write(0, data)
+    assert sim.writes > 1
+
+def test_errors(sim, packetmem):
+    with pytest.raises(IOError, match='Transaction error'):
+        packetmem.read_bytes(len(sim.mem) // sim.data_bytes, 4)
+    sim.fail_next('error')
+    with pytest.raises(IOError, match='Transaction error'):
+        packetmem.write(0, b'x')
+    sim.fail_next('timeout')
+    with pytest.raises(TimeoutError, match='Transaction timeout'):
+        packetmem.read_bytes(0, 4)
+    packetmem.write(0, b'ok')
+    assert packetmem.read_bytes(0, 2) == b'ok'
+
+def test_controller_timeout(as_proxy):
+    sim = as_proxy(MemProxySim(size=1024, op_delay=50e-3))
+    packetmem = PacketMemProtocol(sim, timeout=5e-3)
+    with pytest.raises(TimeoutError, match='Controller timeout'):
+        packetmem.read_bytes(0, 4)
+
+@pytest.mark.parametrize('module', ['packet_mem_protocol', 'packet_capture_protocol', 'packet_playback_protocol',
+                                    'packet_capture_manager', 'packet_sim'])
+def test_import_standalone(tmp_path, module):
+    # The shared modules of src/reg/proxy/regio are found with only this directory on the path.
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    subprocess.run([sys.executable, '-c', f'import {module}'], cwd=tmp_path, env=env, check=True)
@@ -0,0 +1,113 @@
+import pytest
+
+from packet_playback_protocol import PacketPlaybackProtocol
+from packet_sim import PacketPlaybackSim
+from pcap_file import PcapngWriter, PcapWriter
+
+@pytest.fixture
+def sim():
+    return PacketPlaybackSim(mem_size=2048, meta_width=64, enabled=True)
+
+@pytest.fixture
+def playback(sim):
+    return PacketPlaybackProtocol(sim, timeout=10e-3)
+
+def test_send(sim, playback):
+    playback.send(b'\x01\x02\x03' * 30, meta=0x1122334455667788)
+    playback.send(b'short', meta=7, burst=3)
+    assert sim.sent == [(b'\x01\x02\x03' * 30, 0x1122334455667788)] + [(b'short', 7)] * 3
+
+def test_send_continuous(sim, playback):
+    # The controller stays busy until stopped, so the commands are issued without waiting for done.
+    assert playback._prepare(b'loop', 1, 0) == PacketPlaybackProtocol.CommandCode.SEND_CONTINUOUS
+    playback._issue(sim.control.status().proxy, PacketPlaybackProtocol.CommandCode.SEND_CONTINUOUS)
+    assert sim.continuous
+    playback._issue(sim.control.status().proxy, PacketPlaybackProtocol.CommandCode.STOP)
+    assert not sim.continuous
+    assert sim.sent == [(b'loop', 1)]
+
+def test_send_pcap(sim, playback, tmp_path):
+    path = tmp_path / 'packets.pcapng'
+    records = [(b'a' * 60, 1)] * 3 + [(b'a' * 60, 2), (b'b' * 61, 2), (b'b' * 61, 2)]
+    with PcapngWriter(path) as writer:
+        for (data, meta) in records:
+            writer.write(data, meta=meta)
+    assert playback.send_pcap(path) == len(records)
+    assert sim.sent == records
+    # Runs of identical records are folded into bursts.
+    assert sim.control.commands == 3
+
+def test_send_pcap_burst_max(sim, playback, tmp_path):
+    path = tmp_path / 'packets.pcap'
+    with PcapWriter(path) as writer:
+        for _ in range(5):
+            writer.write(b'x' * 64)
+    assert playback.send_pcap(path, meta=9, burst_max=2) == 5
+    assert sim.sent == [(b'x' * 64, 9)] * 5
+    assert sim.control.commands == 3
+
+def test_send_pcap_oversize(sim, playback, tmp_path):
+    path = tmp_path / 'packets.pcap'
+    with PcapWriter(path) as writer:
+        writer.write(b'x' * 4096)
+    with pytest.raises(ValueError, match='exceeds'):
+        playback.send_pcap(path)
+
+def test_mem_cache(sim):
+    playback = PacketPlaybackProtocol(sim, timeout=10e-3, mem_cache=True)
+    packet = bytes(range(256)) * 2
+    playback.send(packet)
+    commands = sim.data.commands
+    sim.data.reset_counters()
+    playback.send(packet)
+    assert sim.data.writes == 0
+    # Only the burst that changed is rewritten.
+    changed = bytearray(packet)
+    changed[100] ^= 0xff
+    playback.send(changed)
+    assert sim.data.commands == commands + 1
+    assert sim.sent == [(packet, 0)] * 2 + [(bytes(changed), 0)]
+
+def test_mem_cache_invalidate(sim):
+    playback = PacketPlaybackProtocol(sim, timeout=10e-3, mem_cache=True)
+    playback.send(b'p' * 100)
+    sim.data.mem[:100] = bytes(100)
+    playback.invalidate()
+    playback.send(b'p' * 100)
+    assert sim.sent[-1] == (b'p' * 100, 0)
+
+def test_shadow(sim):
+    playback = PacketPlaybackProtocol(sim, timeout=10e-3, shadow=True)
+    playback.send(b'x' * 64, meta=3)
+    sim.control.reset_counters()
+    playback.send(b'x' * 64, meta=3)
+    # Status polls and the command only: config and meta are unchanged.
+    assert sim.control.writes == 1
+    assert sim.sent == [(b'x' * 64, 3)] * 2
+
+@pytest.mark.parametrize('method', ['reset', 'enable', 'disable', 'invalidate'])
+def test_shadow_invalidate(sim, method):
+    playback = PacketPlaybackProtocol(sim, timeout=10e-3, shadow=True)
+    playback.send(b'x' * 64, meta=3)
+    getattr(playback, method)()
+    playback.enable()
+    # Lost register state (e.g. by the block reset).
+    sim.control.poke('config', 0)
+    for i in range(len(sim.control.meta)):
+        sim.control.poke('meta', 0, i)
+    playback.send(b'x' * 64, meta=3)
+    assert sim.sent[-1] == (b'x' * 64, 3)
+
+def test_errors(sim, playback):
+    sim.control.fail_next('error')
+    with pytest.raises(IOError, match='Transaction error'):
+        playback.send(b'x')
+    sim.control.fail_next('timeout')
+    with pytest.raises(TimeoutError, match='Transaction timeout'):
+        playback.send(b'x')
+    playback.disable()
+    with pytest.raises(TimeoutError, match='not ready'):
+        playback.send(b'x')
+    playback.enable()
+    playback.send(b'x')
+    assert sim.sent == [(b'x', 0)]
@@ -0,0 +1,58 @@
+import pytest
+
+from pcap_file import PcapngReader, PcapngWriter, PcapReader, PcapWriter, open_reader, open_writer
+
+# (timestamp in ns, data, meta) records, with metadata wider than 64b and records without any.
+RECORDS = [
+    (1700000000123456789, b'\x01' * 60, 0x1122334455667788),
+    (1700000000123456790, b'\x02' * 61, None),
+    (1700000001000000000, b'\x03' * 1500, (1 << 100) | 5),
+    (0, b'', 0),
+]
+
+def _read(reader):
+    with reader:
+        return [(timestamp, bytes(data), meta) for (timestamp, data, meta) in reader]
+
+def _write(writer, records):
+    with writer:
+        for (timestamp, data, meta) in records:
+            writer.write(data, timestamp, meta)
+    assert writer.count == len(records)
+
+def test_pcapng(tmp_path):
+    path = tmp_path / 'packets.pcapng'
+    _write(PcapngWriter(path), RECORDS)
+    assert _read(PcapngReader(path)) == RECORDS
+    assert isinstance(open_reader(path), PcapngReader)
+
+@pytest.mark.parametrize('nanosecond', [True, False], ids=['ns', 'us'])
+def test_pcap(tmp_path, nanosecond):
+    # Metadata is dropped, and timestamps truncated to microseconds unless nanosecond.
+    path = tmp_path / 'packets.pcap'
+    _write(PcapWriter(path, nanosecond=nanosecond), RECORDS)
+    scale = 1 if nanosecond else 1000
+    assert _read(PcapReader(path)) == [(timestamp // scale * scale, data, None)
+                                       for (timestamp, data, _) in RECORDS]
+    assert isinstance(open_reader(path), PcapReader)
+
+@pytest.mark.parametrize('name', ['packets.pcap', 'packets.pcapng'])
+def test_snaplen(tmp_path, name):
+    path = tmp_path / name
+    _write(open_writer(path, snaplen=64), RECORDS)
+    assert [data for (_, data, _) in _read(open_reader(path))] == [data[:64] for (_, data, _) in RECORDS]
+
+def test_default_timestamp(tmp_path):
+    path = tmp_path / 'packets.pcapng'
+    with PcapngWriter(path) as writer:
+        writer.write(b'x', meta=1)
+    ((timestamp, data, meta),) = _read(PcapngReader(path))
+    assert timestamp > 0 and (data, meta) == (b'x', 1)
+
+@pytest.mark.parametrize('name', ['packets.pcap', 'packets.pcapng'])
+def test_truncated(tmp_path, name):
+    path = tmp_path / name
+    _write(open_writer(path), RECORDS[:1])
+    path.write_bytes(path.read_bytes()[:-10])
+    with pytest.raises(EOFError, match='Truncated'):
+        _read(open_reader(path))
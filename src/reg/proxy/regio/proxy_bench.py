@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+#---------------------------------------------------------------------------------------------------
+# Throughput benchmarks for the register-indirect data paths, run against the simulated controllers
+# (see proxy_sim.py, mem_proxy_sim.py and packet_sim.py):
+#
+#   reg     reg_proxy_protocol.Protocol read/write/read_many/write_many
+#   mem     mem_proxy_protocol.Protocol read/write/read_block/write_block
+#   packet  PacketMemProtocol write/readinto
+#
+# Each case is swept over transfer size, burst size, wait policy and simulated register latency,
+# and reports throughput (ops/s, bytes/s), per-operation latency percentiles, register accesses per
+# byte and status polls per operation. Results can be stored as a JSON baseline and later runs
+# checked against it; the check fails (exit code 1) if a case is slower than the baseline by more
+# than the tolerance, makes a different number of register accesses per byte, or was not run. Only
+# the baseline cases of the selected suites (--suite) and cases (--match) are checked.
+#
+# The register accesses exclude the status polls (address, burst, command and data window accesses
+# only), so they are fixed by the protocol and checked exactly on any host. The number of polls
+# depends on timing and is only reported. Throughput baselines are host-specific; record them on the
+# machine that checks them, or check the accesses only (--accesses-only).
+#
+# The protocol and simulator modules are found on PYTHONPATH (as for pytest, see pytest.ini); from
+# the repository root:
+#
+#   export PYTHONPATH=src/reg/proxy/regio:src/mem/proxy/regio:src/packet/regio
+#   python3 src/reg/proxy/regio/proxy_bench.py --quick --save-baseline baseline.json
+#   python3 src/reg/proxy/regio/proxy_bench.py --quick --baseline baseline.json --tolerance 0.25
+#
+# The register accesses of the quick sweep are checked in CI against proxy_bench_baseline.json (see
+# .gitlab-ci.yml).
+#
+# The reg and mem suites need the regio library (the protocols derive from its Protocol class, see
+# tools/regio) and are skipped when it is not importable, which fails a check against a baseline
+# that includes them; check the packet suite alone with --suite packet.
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'WAIT_POLICIES',
+    'BenchResult',
+    'run_suites',
+    'compare',
+    'main',
+)
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from mem_proxy_sim import MemProxySim
+from packet_mem_protocol import PacketMemProtocol
+from proxy_sim import RegProxySim
+from proxy_wait import WaitPolicy
+
+#---------------------------------------------------------------------------------------------------
+# Named completion wait policies (see proxy_wait.WaitPolicy).
+WAIT_POLICIES = {
+    'default': lambda: WaitPolicy(),
+    'spin':    lambda: WaitPolicy(spin=1e-3),              # Busy-poll for the whole transaction.
+    'sleep':   lambda: WaitPolicy(spin=0),                 # Back off from the first poll.
+    'fixed':   lambda: WaitPolicy(spin=0, min_delay=1e-3), # Fixed 1ms poll interval.
+}
+
+# Sweeps (full and --quick).
+SWEEPS = {
+    'full': {
+        'reg_latency': (0.0, 1e-6, 5e-6),
+        'wait':        ('default', 'spin', 'sleep'),
+        'reg_batch':   (1, 16),
+        'mem_words':   (1, 16, 256),
+        'mem_bytes':   (4, 8, 16),
+        'packet_size': (64, 256, 1500, 9000),
+        'burst_max':   (16, 32, 64),
+    },
+    'quick': {
+        'reg_latency': (0.0, 1e-6),
+        'wait':        ('default', 'sleep'),
+        'reg_batch':   (1, 16),
+        'mem_words':   (1, 64),
+        'mem_bytes':   (4, 16),
+        'packet_size': (64, 1500),
+        'burst_max':   (64,),
+    },
+}
+
+#---------------------------------------------------------------------------------------------------
+class BenchResult:
+    __slots__ = ('name', 'ops', 'nbytes', 'seconds', 'latencies', 'accesses', 'polls')
+
+    def __init__(self, name, ops, nbytes, seconds, latencies, accesses, polls):
+        self.name = name
+        self.ops = ops
+        self.nbytes = nbytes
+        self.seconds = seconds
+        self.latencies = sorted(latencies)
+        self.accesses = accesses
+        self.polls = polls
+
+    def percentile(self, pct):
+        index = min(int(len(self.latencies) * pct / 100), len(self.latencies) - 1)
+        return self.latencies[index]
+
+    def as_dict(self):
+        return {
+            'ops': self.ops,
+            'bytes': self.nbytes,
+            'seconds': self.seconds,
+            'ops_per_s': self.ops / self.seconds,
+            'bytes_per_s': self.nbytes / self.seconds,
+            'p50_us': self.percentile(50) * 1e6,
+            'p90_us': self.percentile(90) * 1e6,
+            'p99_us': self.percentile(99) * 1e6,
+            'accesses_per_byte': self.accesses / self.nbytes if self.nbytes else 0.0,
+            'polls_per_op': self.polls / self.ops,
+        }
+
+#---------------------------------------------------------------------------------------------------
+def _measure(name, op, nbytes, blocks, duration, min_ops=20):
+    # Time op() repeatedly for at least `duration` seconds (and min_ops operations), counting the
+    # register accesses (other than status polls) and the status polls made on the simulated blocks.
+    op() # Warm-up (also primes any write shadows).
+    for block in blocks:
+        block.reset_counters()
+    latencies = []
+    start = time.perf_counter()
+    end = start + duration
+    now = start
+    while now < end or len(latencies) < min_ops:
+        t = time.perf_counter()
+        op()
+        now = time.perf_counter()
+        latencies.append(now - t)
+    seconds = now - start
+    polls = sum(block.polls for block in blocks)
+    accesses = sum(block.reads + block.writes for block in blocks) - polls
+    ops = len(latencies)
+    return BenchResult(name, ops, ops * nbytes, seconds, latencies, accesses, polls)
+
+def _reg_cases(sweep, op_delay):
+    import reg_proxy_protocol
+
+    for latency in sweep['reg_latency']:
+        for wait in sweep['wait']:
+            sim = RegProxySim(reg_latency=latency, op_delay=op_delay)
+            protocol = reg_proxy_protocol.Protocol(None, 'bench', wait_policy=WAIT_POLICIES[wait]())
+            protocol.start(sim)
+            tag = f'wait={wait}/lat={latency:g}'
+            for batch in sweep['reg_batch']:
+                offsets = list(range(batch))
+                pairs = [(i, i) for i in range(batch)]
+                if batch == 1:
+                    ops = (('read', lambda: protocol.read(sim, 0, 4)),
+                           ('write', lambda: protocol.write(sim, 0, 4, 0x5a5a5a5a)))
+                else:
+                    ops = (('read_many', lambda: protocol.read_many(sim, offsets)),
+                           ('write_many', lambda: protocol.write_many(sim, pairs)))
+                for (op_name, op) in ops:
+                    yield (f'reg.{op_name}/regs={batch}/{tag}', op, 4 * batch, (sim,))
+
+def _mem_cases(sweep, op_delay):
+    import mem_proxy_protocol
+
+    for latency in sweep['reg_latency']:
+        for wait in sweep['wait']:
+            for data_bytes in sweep['mem_bytes']:
+                sim = MemProxySim(data_bytes=data_bytes, reg_latency=latency, op_delay=op_delay)
+                protocol = mem_proxy_protocol.Protocol(None, 'bench', wait_policy=WAIT_POLICIES[wait]())
+                protocol.start(sim)
+                tag = f'word={data_bytes}/wait={wait}/lat={latency:g}'
+                for words in sweep['mem_words']:
+                    values = [(1 << (8 * data_bytes)) - 1 - i for i in range(words)]
+                    if words == 1:
+                        ops = (('read', lambda: protocol.read(sim, 0, data_bytes)),
+                               ('write', lambda: protocol.write(sim, 0, data_bytes, values[0])))
+                    else:
+                        ops = (('read_block', lambda: protocol.read_block(sim, 0, words)),
+                               ('write_block', lambda: protocol.write_block(sim, 0, values)))
+                    for (op_name, op) in ops:
+                        yield (f'mem.{op_name}/words={words}/{tag}', op, words * data_bytes, (sim,))
+
+def _packet_cases(sweep, op_delay):
+    for latency in sweep['reg_latency']:
+        for wait in sweep['wait']:
+            for burst_max in sweep['burst_max']:
+                sim = MemProxySim(16384, data_bytes=8, burst_max=burst_max, reg_latency=latency,
+                                  op_delay=op_delay)
+                mem = PacketMemProtocol(sim, 'Bench Mem', wait_policy=WAIT_POLICIES[wait]())
+                tag = f'burst={burst_max}/wait={wait}/lat={latency:g}'
+                for size in sweep['packet_size']:
+                    data = bytes(i & 0xff for i in range(size))
+                    buf = bytearray(size)
+                    ops = (('write', lambda: mem.write(0, data)),
+                           ('readinto', lambda: mem.readinto(0, buf)))
+                    for (op_name, op) in ops:
+                        yield (f'packet.{op_name}/size={size}/{tag}', op, size, (sim,))
+
+SUITES = {
+    'reg': _reg_cases,
+    'mem': _mem_cases,
+    'packet': _packet_cases,
+}
+
+def run_suites(suites, sweep, op_delay=2e-6, duration=0.1, match='', log=None):
+    # Each suite generates (name, op, bytes per op, simulated blocks) cases; cases are measured as
+    # they are generated, as they share the simulated controller of their sweep point.
+    results = {}
+    for suite in suites:
+        try:
+            for (name, op, nbytes, blocks) in SUITES[suite](sweep, op_delay):
+                if match not in name:
+                    continue
+                results[name] = _measure(name, op, nbytes, blocks, duration).as_dict()
+                if log is not None:
+                    log(name, results[name])
+        except ImportError as e:
+            print(f'Skipping {suite} suite ({e})', file=sys.stderr)
+    return results
+
+#---------------------------------------------------------------------------------------------------
+def compare(results, baseline, tolerance=None):
+    # Return a list of (case, message) regressions against the baseline cases. Every baseline case
+    # must have been run, with the same register accesses per byte (up to rounding); the throughput
+    # is only checked if a tolerance is given.
+    regressions = []
+    for (name, base) in baseline.items():
+        result = results.get(name)
+        if result is None:
+            regressions.append((name, 'not run'))
+            continue
+        if tolerance is not None and result['ops_per_s'] < base['ops_per_s'] * (1 - tolerance):
+            regressions.append((name, f'{result["ops_per_s"]:.0f} ops/s vs. baseline {base["ops_per_s"]:.0f} ops/s'))
+        if abs(result['accesses_per_byte'] - base['accesses_per_byte']) > 1e-9 * base['accesses_per_byte']:
+            regressions.append((name, f'{result["accesses_per_byte"]:.3f} accesses/B vs. baseline '
+                                      f'{base["accesses_per_byte"]:.3f} accesses/B'))
+    return regressions
+
+def _print_result(name, result):
+    print(f'{name:<60s} {result["ops_per_s"]:>11.0f} ops/s {result["bytes_per_s"] / 1e6:>9.3f} MB/s '
+          f'p50 {result["p50_us"]:>9.1f}us p99 {result["p99_us"]:>9.1f}us '
+          f'{result["accesses_per_byte"]:>6.3f} acc/B {result["polls_per_op"]:>6.2f} polls/op', flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the register-indirect proxy protocols against '
+                                                 'simulated controllers.')
+    parser.add_argument('--suite', action='append', choices=sorted(SUITES),
+                        help='Suite to run (repeatable; default: all).')
+    parser.add_argument('--quick', action='store_true', help='Run the reduced sweep.')
+    parser.add_argument('--wait', action='append', choices=sorted(WAIT_POLICIES),
+                        help='Wait policy to sweep (repeatable; overrides the sweep).')
+    parser.add_argument('--latency', action='append', type=float,
+                        help='Simulated register access latency to sweep, in seconds (repeatable).')
+    parser.add_argument('--match', default='', help='Only run cases whose name contains this string.')
+    parser.add_argument('--duration', type=float, default=0.1, help='Minimum run time per case (s).')
+    parser.add_argument('--op-delay', type=float, default=2e-6, help='Simulated command completion delay (s).')
+    parser.add_argument('--json', help='Write the results to this JSON file.')
+    parser.add_argument('--save-baseline', help='Store the results as a baseline JSON file.')
+    parser.add_argument('--baseline', help='Check the results against this baseline JSON file.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed fractional throughput drop against the baseline.')
+    parser.add_argument('--accesses-only', action='store_true',
+                        help='Only check the register accesses against the baseline, not the throughput.')
+    args = parser.parse_args(argv)
+
+    suites = args.suite or list(SUITES)
+    sweep = dict(SWEEPS['quick' if args.quick else 'full'])
+    if args.wait:
+        sweep['wait'] = args.wait
+    if args.latency:
+        sweep['reg_latency'] = args.latency
+    results = run_suites(suites, sweep, args.op_delay, args.duration, args.match,
+                         _print_result)
+
+    report = {
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'sweep': 'quick' if args.quick else 'full',
+        'op_delay': args.op_delay,
+        'cases': results,
+    }
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['cases']
+        baseline = {name: case for (name, case) in baseline.items()
+                    if name.split('.', 1)[0] in suites and args.match in name}
+        regressions = compare(results, baseline, None if args.accesses_only else args.tolerance)
+        for (name, message) in regressions:
+            print(f'REGRESSION {name}: {message}')
+        if regressions:
+            print(f'FAIL ({len(regressions)} regressions)')
+            return 1
+        print('PASS')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'ProtocolMetrics',
+    'OpRecord',
+)
+
+import bisect
+import threading
+import time
+
+#---------------------------------------------------------------------------------------------------
+# Accumulator for a single protocol operation (register transaction, memory burst, capture, ...).
+# Protocols fill in the counters as the operation progresses; the wait engine adds its polls and
+# sleep time directly (see WaitPolicy.wait()).
+class OpRecord:
+    __slots__ = ('op', 'start', 'polls', 'sleep', 'reg_reads', 'reg_writes', 'nbytes')
+
+    def __init__(self, op):
+        self.op = op
+        self.polls = 0
+        self.sleep = 0.0
+        self.reg_reads = 0
+        self.reg_writes = 0
+        self.nbytes = 0
+        self.start = time.perf_counter()
+
+    def merge(self, other):
+        # Fold the counters of a sub-operation (e.g. one burst of a larger transfer) into this one.
+        self.polls += other.polls
+        self.sleep += other.sleep
+        self.reg_reads += other.reg_reads
+        self.reg_writes += other.reg_writes
+
+#---------------------------------------------------------------------------------------------------
+class _OpStats:
+    __slots__ = ('count', 'seconds', 'polls', 'sleep', 'reg_reads', 'reg_writes', 'nbytes', 'buckets')
+
+    def __init__(self, nbuckets):
+        self.count = 0
+        self.seconds = 0.0
+        self.polls = 0
+        self.sleep = 0.0
+        self.reg_reads = 0
+        self.reg_writes = 0
+        self.nbytes = 0
+        self.buckets = [0] * (nbuckets + 1) # Last bucket is +Inf.
+
+#---------------------------------------------------------------------------------------------------
+# Per-operation counters and latency histograms for the regio proxy protocols. A single instance
+# can be shared by any number of protocols (and threads); pass it as the `metrics` argument of a
+# protocol to enable instrumentation. Protocols without metrics pay no instrumentation cost.
+#
+# Operation types recorded by the protocols:
+#   reg_read, reg_write                      reg_proxy transactions
+#   mem_read, mem_write                      mem_proxy bursts
+#   mem_burst_read, mem_burst_write          packet memory bursts
+#   packet_mem_read, packet_mem_write        packet memory transfers (all bursts of a read/write)
+#   capture, playback_send                   packet capture/playback operations
+class ProtocolMetrics:
+    # Latency histogram bucket upper bounds, in seconds.
+    BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+               1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0)
+
+    def __init__(self, prefix='regio_proxy', labels=None, buckets=None):
+        self.prefix = prefix
+        self.labels = dict(labels or {})
+        self.buckets = tuple(sorted(buckets)) if buckets is not None else self.BUCKETS
+        self._ops = {}
+        self._lock = threading.Lock()
+
+    def start(self, op):
+        return OpRecord(op)
+
+    def finish(self, record, nbytes=0):
+        elapsed = time.perf_counter() - record.start
+        bucket = bisect.bisect_left(self.buckets, elapsed)
+        with self._lock:
+            stats = self._ops.get(record.op)
+            if stats is None:
+                stats = self._ops[record.op] = _OpStats(len(self.buckets))
+            stats.count += 1
+            stats.seconds += elapsed
+            stats.polls += record.polls
+            stats.sleep += record.sleep
+            # Status polls are register reads too.
+            stats.reg_reads += record.reg_reads + record.polls
+            stats.reg_writes += record.reg_writes
+            stats.nbytes += nbytes or record.nbytes
+            stats.buckets[bucket] += 1
+        return elapsed
+
+    def reset(self):
+        with self._lock:
+            self._ops.clear()
+
+    def as_dict(self):
+        result = {}
+        with self._lock:
+            for (op, stats) in self._ops.items():
+                cumulative = 0
+                histogram = {}
+                for (bound, count) in zip(self.buckets + (float('inf'),), stats.buckets):
+                    cumulative += count
+                    histogram[bound] = cumulative
+                result[op] = {
+                    'count': stats.count,
+                    'seconds': stats.seconds,
+                    'polls': stats.polls,
+                    'sleep_seconds': stats.sleep,
+                    'reg_reads': stats.reg_reads,
+                    'reg_writes': stats.reg_writes,
+                    'bytes': stats.nbytes,
+                    'histogram': histogram,
+                }
+        return result
+
+    def _labels(self, **extra):
+        labels = dict(self.labels, **extra)
+        return '{' + ','.join(f'{key}="{value}"' for (key, value) in labels.items()) + '}'
+
+    def to_prometheus(self):
+        # Render all metrics in the Prometheus text exposition format.
+        ops = self.as_dict()
+        name = f'{self.prefix}_op_seconds'
+        lines = [
+            f'# HELP {name} Protocol operation latency.',
+            f'# TYPE {name} histogram',
+        ]
+        for (op, stats) in ops.items():
+            for (bound, count) in stats['histogram'].items():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{self._labels(op=op, le=le)} {count}')
+            lines.append(f'{name}_sum{self._labels(op=op)} {stats["seconds"]!r}')
+            lines.append(f'{name}_count{self._labels(op=op)} {stats["count"]}')
+
+        counters = (
+            ('polls', 'polls_total', 'Status register polls.'),
+            ('sleep_seconds', 'sleep_seconds_total', 'Time slept while waiting on the controller.'),
+            ('reg_reads', 'reg_reads_total', 'Register reads.'),
+            ('reg_writes', 'reg_writes_total', 'Register writes.'),
+            ('bytes', 'bytes_total', 'Data bytes transferred.'),
+        )
+        for (key, suffix, desc) in counters:
+            name = f'{self.prefix}_op_{suffix}'
+            lines.append(f'# HELP {name} {desc}')
+            lines.append(f'# TYPE {name} counter')
+            for (op, stats) in ops.items():
+                lines.append(f'{name}{self._labels(op=op)} {stats[key]!r}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,330 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'SimBlock',
+    'SimController',
+    'SimRawBlock',
+    'RegProxySim',
+)
+
+import threading
+import time
+
+from reg_value import RegValue
+
+#---------------------------------------------------------------------------------------------------
+# Behavioural, in-memory models of the register-indirect controllers, for exercising the regio
+# protocols without hardware (e.g. in CI, or when profiling a protocol).
+#
+# A simulated block exposes the same access patterns as a regio register proxy:
+#   int(block.reg), block.reg._r                     register read
+#   block.reg = value, block.reg._r = value          register write (value may be a RegValue)
+#   block.reg().proxy.field, block.reg(0).proxy      register value with named field access
+#   block.reg.field, block.reg.field = value         field read, field read-modify-write
+#   block.array[i], block.array[i:j], len(...)       register arrays
+#
+# Every register access costs `reg_latency` seconds (busy-waited, to model the round trip over the
+# host bus with sub-millisecond resolution) and is counted in `reads`/`writes`. Reads of the status
+# register of a controller are also counted in `polls`, as their number depends on timing. Commands
+# complete `op_delay` seconds after they are issued; the controller reports BUSY in the meantime.
+#---------------------------------------------------------------------------------------------------
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+#---------------------------------------------------------------------------------------------------
+class _SimReg:
+    __slots__ = ('_block', '_name', '_index')
+
+    def __init__(self, block, name, index):
+        object.__setattr__(self, '_block', block)
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_index', index)
+
+    def __call__(self, value=None):
+        if value is None:
+            value = self._block._read(self._name, self._index)
+        return RegValue(self._block._fields[self._name], value)
+
+    def __int__(self):
+        return self._block._read(self._name, self._index)
+
+    def __index__(self):
+        return int(self)
+
+    @property
+    def _r(self):
+        return self._block._read(self._name, self._index)
+
+    @_r.setter
+    def _r(self, value):
+        self._block._write(self._name, self._index, int(value))
+
+    def __getattr__(self, name):
+        return getattr(self(), name)
+
+    def __setattr__(self, name, value):
+        if name == '_r':
+            object.__setattr__(self, name, value)
+            return
+        reg = self()
+        setattr(reg, name, value)
+        self._block._write(self._name, self._index, int(reg))
+
+class _SimRegArray:
+    __slots__ = ('_regs',)
+
+    def __init__(self, block, name, count):
+        self._regs = [_SimReg(block, name, i) for i in range(count)]
+
+    def __len__(self):
+        return len(self._regs)
+
+    def __getitem__(self, index):
+        return self._regs[index]
+
+    def __iter__(self):
+        return iter(self._regs)
+
+#---------------------------------------------------------------------------------------------------
+class SimBlock:
+    # Register block. Subclasses describe their registers in REGS as
+    #   name: (fields, count, init)
+    # where fields is a sequence of (field name, width) pairs, LSB first, count is None for a single
+    # register and init is the reset value. Register accesses go through _on_read()/_on_write(),
+    # which subclasses override to implement side effects (clear-on-read, write events, ...). Reads
+    # of the registers in STATUS_REGS are also counted as polls.
+    REGS = {}
+    STATUS_REGS = ()
+
+    def __init__(self, reg_latency=0.0):
+        d = self.__dict__
+        d['reg_latency'] = reg_latency
+        d['reads'] = 0
+        d['writes'] = 0
+        d['polls'] = 0
+        d['_lock'] = threading.RLock()
+        d['_fields'] = {}
+        d['_values'] = {}
+        d['_counts'] = {}
+        for (name, (fields, count, init)) in self.REGS.items():
+            layout = {}
+            lsb = 0
+            for (field, width) in fields:
+                layout[field] = (lsb, width)
+                lsb += width
+            d['_fields'][name] = layout
+            d['_counts'][name] = count
+            d['_values'][name] = [init] * (1 if count is None else count)
+            # Register objects are created once and found as plain instance attributes.
+            d[name] = _SimReg(self, name, None) if count is None else _SimRegArray(self, name, count)
+
+    def __setattr__(self, name, value):
+        if self._counts.get(name, 0) is None:
+            self._write(name, None, int(value))
+        else:
+            object.__setattr__(self, name, value)
+
+    def reset_counters(self):
+        self.__dict__['reads'] = 0
+        self.__dict__['writes'] = 0
+        self.__dict__['polls'] = 0
+
+    def _read(self, name, index):
+        if self.reg_latency:
+            _spin(self.reg_latency)
+        with self._lock:
+            self.__dict__['reads'] += 1
+            if name in self.STATUS_REGS:
+                self.__dict__['polls'] += 1
+            self.advance()
+            return self._on_read(name, index or 0)
+
+    def _write(self, name, index, value):
+        if self.reg_latency:
+            _spin(self.reg_latency)
+        with self._lock:
+            self.__dict__['writes'] += 1
+            self.advance()
+            self._on_write(name, index or 0, value & 0xffffffff)
+
+    def _on_read(self, name, index):
+        return self._values[name][index]
+
+    def _on_write(self, name, index, value):
+        self._values[name][index] = value
+
+    # Direct (zero-cost, uncounted) access to register state, for the models themselves.
+    def peek(self, name, index=0):
+        return RegValue(self._fields[name], self._values[name][index])
+
+    def poke(self, name, value, index=0):
+        self._values[name][index] = int(value) & 0xffffffff
+
+    def advance(self):
+        pass
+
+#---------------------------------------------------------------------------------------------------
+class _SimWords:
+    # Word-indexed registers of a block, in REGS order (i.e. at their word offsets in the regio
+    # specification), accessed through the model.
+    __slots__ = ('_block', '_regs')
+
+    def __init__(self, block):
+        self._block = block
+        self._regs = []
+        for (name, count) in block._counts.items():
+            self._regs.extend((name, None if count is None else i) for i in range(count or 1))
+
+    def __len__(self):
+        return len(self._regs)
+
+    def __getitem__(self, index):
+        (name, i) = self._regs[index]
+        return self._block._read(name, i)
+
+    def __setitem__(self, index, value):
+        (name, i) = self._regs[index]
+        self._block._write(name, i, value)
+
+class SimRawBlock:
+    # Simulated block presented as a mapped register block (see reg_mmap.RawBlock), so that the
+    # protocols run their raw hot paths against the model. raw_words, raw_index() and raw_field()
+    # are those of a RawBlock; all other attributes are those of the block.
+    def __init__(self, block):
+        d = self.__dict__
+        d['block'] = block
+        d['raw_words'] = _SimWords(block)
+        d['_offsets'] = {}
+        offset = 0
+        for (name, count) in block._counts.items():
+            d['_offsets'][name] = offset
+            offset += count or 1
+
+    def __getattr__(self, name):
+        return getattr(self.block, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.block, name, value)
+
+    def raw_index(self, name, index=0):
+        return self._offsets[name] + index
+
+    def raw_field(self, name, field):
+        (lsb, width) = self.block._fields[name][field]
+        return (lsb, (1 << width) - 1)
+
+#---------------------------------------------------------------------------------------------------
+class SimController(SimBlock):
+    # Block with a command/status handshake. A command is accepted by _issue() and completes
+    # `op_delay` seconds later, when the model next observes the clock (on any register access or
+    # explicit advance()). fail_next() makes the next command terminate with an error or timeout
+    # instead of completing.
+    STATUS_REGS = ('status',)
+
+    def __init__(self, reg_latency=0.0, op_delay=0.0):
+        super().__init__(reg_latency)
+        d = self.__dict__
+        d['op_delay'] = op_delay
+        d['commands'] = 0
+        d['_pending'] = None
+        d['_deadline'] = 0.0
+        d['_faults'] = []
+
+    @property
+    def busy(self):
+        self.advance()
+        return self._pending is not None
+
+    def fail_next(self, fault='error', count=1):
+        if fault not in ('error', 'timeout'):
+            raise ValueError(f'Unknown fault {fault!r}')
+        with self._lock:
+            self._faults.extend([fault] * count)
+
+    def _issue(self, operation):
+        # operation() is called on completion and returns a fault to report (or None).
+        self.__dict__['commands'] += 1
+        self.__dict__['_pending'] = operation
+        self.__dict__['_deadline'] = time.monotonic() + self.op_delay
+        if not self.op_delay:
+            self.advance()
+
+    def advance(self):
+        if self._pending is None:
+            return
+        with self._lock:
+            operation = self._pending
+            if operation is None or time.monotonic() < self._deadline:
+                return
+            fault = self._faults.pop(0) if self._faults else None
+            if fault is None:
+                fault = operation()
+                if fault is False:
+                    return # Operation still in progress (e.g. waiting on external input).
+            self.__dict__['_pending'] = None
+            self._complete(fault)
+
+    def _complete(self, fault):
+        raise NotImplementedError
+
+#---------------------------------------------------------------------------------------------------
+# Model of the reg_proxy controller (see reg_proxy.yaml). The proxied register space is held in the
+# `target` list (one 32-bit register per entry); accesses beyond it end with an error. The status
+# done/error flags are sticky until read.
+class RegProxySim(SimController):
+    REGS = {
+        'command':    ((('wr_rd_n', 1),), None, 0),
+        'status':     ((('ready', 1), ('done', 1), ('error', 1)), None, 1),
+        'address':    ((), None, 0),
+        'wr_data':    ((), None, 0),
+        'wr_byte_en': ((('byte_0', 1), ('byte_1', 1), ('byte_2', 1), ('byte_3', 1)), None, 0xf),
+        'rd_data':    ((), None, 0),
+    }
+
+    def __init__(self, size=4096, reg_latency=0.0, op_delay=0.0):
+        super().__init__(reg_latency, op_delay)
+        self.target = [0] * (size // 4)
+
+    def _on_read(self, name, index):
+        value = super()._on_read(name, index)
+        if name == 'status':
+            # Flags are cleared by the read; the controller is ready again once idle.
+            self.poke('status', int(self._pending is None))
+        return value
+
+    def _on_write(self, name, index, value):
+        super()._on_write(name, index, value)
+        if name == 'command' and self._pending is None:
+            self.poke('status', 0)
+            self._issue(self._write_target if value & 1 else self._read_target)
+
+    def _target_index(self):
+        addr = int(self.peek('address'))
+        if addr & 3 or addr // 4 >= len(self.target):
+            return None
+        return addr // 4
+
+    def _read_target(self):
+        index = self._target_index()
+        if index is None:
+            return 'error'
+        self.poke('rd_data', self.target[index])
+
+    def _write_target(self):
+        index = self._target_index()
+        if index is None:
+            return 'error'
+        mask = 0
+        for i in range(4):
+            if (int(self.peek('wr_byte_en')) >> i) & 1:
+                mask |= 0xff << (8 * i)
+        self.target[index] = (self.target[index] & ~mask) | (int(self.peek('wr_data')) & mask)
+
+    def _complete(self, fault):
+        status = self.peek('status')
+        status.ready = 1
+        # The reg_proxy has no timeout flag; a timed out transaction is reported as an error.
+        status.done = int(fault is None)
+        status.error = int(fault is not None)
+        self.poke('status', status)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'WaitPolicy',
+    'INLINE_WAIT',
+    'INLINE_FILES',
+    'update_inline',
+    'main',
+)
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+#---------------------------------------------------------------------------------------------------
+# Completion wait engine shared by the register-indirect proxy protocols.
+#
+# A wait first busy-polls for up to `spin` seconds (fast transactions complete within a handful of
+# register reads), then sleeps between polls with an exponentially increasing delay, starting at
+# `min_delay` and capped at `delay`. The overall wait is bounded by a deadline on the monotonic
+# clock rather than by an iteration count. A `timeout` of None waits indefinitely (still backing
+# off, so an idle wait does not pin a CPU). The asyncio variant skips the spin phase and yields to
+# the event loop between polls.
+#
+# The protocols embedded into a regmap (INLINE_FILES) cannot import this module and carry a copy of
+# the same loop, generated from INLINE_WAIT (see update_inline()); a WaitPolicy can still be passed
+# to them (wait_policy=) to override it.
+class WaitPolicy:
+    def __init__(self, timeout=100e-3, delay=1e-3, spin=50e-6, min_delay=10e-6, backoff=2.0):
+        if timeout is not None and timeout < 0:
+            raise ValueError(f'Timeout {timeout} must be non-negative')
+        if delay < 0 or spin < 0 or min_delay < 0:
+            raise ValueError('Wait delays must be non-negative')
+        if backoff < 1:
+            raise ValueError(f'Backoff factor {backoff} must be at least 1')
+
+        self.timeout = timeout
+        self.delay = delay
+        self.spin = spin
+        self.min_delay = min(min_delay, delay)
+        self.backoff = backoff
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(timeout={self.timeout}, delay={self.delay}, '
+                f'spin={self.spin}, min_delay={self.min_delay}, backoff={self.backoff})')
+
+    def delays(self):
+        # Generate the sequence of sleep intervals used once the spin phase has expired.
+        delay = self.min_delay
+        while True:
+            yield delay
+            delay = min(delay * self.backoff, self.delay)
+
+    def wait(self, poll, test, record=None):
+        # Fast path: condition already satisfied on the first poll.
+        status = poll()
+        if test(status):
+            if record is not None:
+                record.polls += 1
+            return status
+
+        now = time.monotonic()
+        deadline = None if self.timeout is None else now + self.timeout
+        spin_end = now + self.spin
+        delays = self.delays()
+        polls = 1
+        slept = 0.0
+        while True:
+            if deadline is not None and now >= deadline:
+                status = None
+                break
+
+            if now >= spin_end:
+                delay = next(delays)
+                if deadline is not None:
+                    delay = min(delay, deadline - now)
+                time.sleep(delay)
+                slept += delay
+
+            status = poll()
+            polls += 1
+            if test(status):
+                break
+            now = time.monotonic()
+
+        # Optional instrumentation (see proxy_metrics.OpRecord).
+        if record is not None:
+            record.polls += polls
+            record.sleep += slept
+        return status
+
+    async def wait_async(self, poll, test, record=None):
+        status = poll()
+        if test(status):
+            if record is not None:
+                record.polls += 1
+            return status
+
+        now = time.monotonic()
+        deadline = None if self.timeout is None else now + self.timeout
+        delays = self.delays()
+        polls = 1
+        slept = 0.0
+        while True:
+            if deadline is not None and now >= deadline:
+                status = None
+                break
+
+            delay = next(delays)
+            if deadline is not None:
+                delay = min(delay, deadline - now)
+            await asyncio.sleep(delay)
+            slept += delay
+
+            status = poll()
+            polls += 1
+            if test(status):
+                break
+            now = time.monotonic()
+
+        if record is not None:
+            record.polls += polls
+            record.sleep += slept
+        return status
+
+
+#---------------------------------------------------------------------------------------------------
+# Completion wait of the protocols embedded into a regmap, which cannot import this module: the
+# WaitPolicy.wait() algorithm with the WaitPolicy defaults, as Protocol methods using the protocol's
+# wait_timeout and wait_delay. It is kept between the INLINE_BEGIN and INLINE_END lines of each of
+# INLINE_FILES (paths from the repository root); run this module to update them after a change, or
+# with --check to check them (as the unit tests do).
+INLINE_BEGIN = '    # BEGIN proxy_wait.INLINE_WAIT (generated by proxy_wait.py, do not edit)\n'
+INLINE_END = '    # END proxy_wait.INLINE_WAIT\n'
+
+INLINE_FILES = (
+    'src/reg/proxy/regio/reg_proxy_protocol.py',
+    'src/mem/proxy/regio/mem_proxy_protocol.py',
+)
+
+INLINE_WAIT = '''\
+    # Completion wait (the proxy_wait.WaitPolicy algorithm, kept inline since this file is embedded
+    # into the regmap). The status is busy-polled for up to WAIT_SPIN seconds, then polled with an
+    # exponentially increasing sleep in between, from WAIT_MIN_DELAY up to the delay, until the
+    # timeout deadline (none for a timeout of None).
+    WAIT_SPIN = 50e-6
+    WAIT_MIN_DELAY = 10e-6
+    WAIT_BACKOFF = 2.0
+
+    def _wait(self, poll, test, record=None):
+        if self.wait_policy is not None:
+            return self.wait_policy.wait(poll, test, record)
+
+        status = poll()
+        polls = 1
+        slept = 0.0
+        if not test(status):
+            now = time.monotonic()
+            deadline = None if self.wait_timeout is None else now + self.wait_timeout
+            spin_end = now + self.WAIT_SPIN
+            delay = min(self.WAIT_MIN_DELAY, self.wait_delay)
+            while True:
+                if deadline is not None and now >= deadline:
+                    status = None
+                    break
+                if now >= spin_end:
+                    sleep = delay if deadline is None else min(delay, deadline - now)
+                    time.sleep(sleep)
+                    slept += sleep
+                    delay = min(delay * self.WAIT_BACKOFF, self.wait_delay)
+                status = poll()
+                polls += 1
+                if test(status):
+                    break
+                now = time.monotonic()
+
+        # Optional instrumentation (see proxy_metrics.OpRecord).
+        if record is not None:
+            record.polls += polls
+            record.sleep += slept
+        return status
+'''
+
+def update_inline(path, check=False):
+    # Replace the generated wait of the file at path with INLINE_WAIT, unless check is set. Returns
+    # True if the file was (or, with check, would be) changed.
+    with open(path) as f:
+        text = f.read()
+    begin = text.find(INLINE_BEGIN)
+    end = text.find(INLINE_END, begin)
+    if begin < 0 or end < 0:
+        raise ValueError(f'No generated wait found in {path}')
+    begin += len(INLINE_BEGIN)
+    if text[begin:end] == INLINE_WAIT:
+        return False
+    if not check:
+        with open(path, 'w') as f:
+            f.write(text[:begin] + INLINE_WAIT + text[end:])
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Update the completion wait of the embedded proxy protocols.')
+    parser.add_argument('--check', action='store_true', help='Only check that they are up to date.')
+    parser.add_argument('--root', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 4),
+                        help='Repository root.')
+    args = parser.parse_args(argv)
+
+    stale = [path for path in INLINE_FILES if update_inline(os.path.join(args.root, path), args.check)]
+    for path in stale:
+        print(f'{path}: {"out of date" if args.check else "updated"}')
+    return 1 if args.check and stale else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'RegSpec',
+    'RegLayout',
+    'load_layout',
+    'RawBlock',
+    'RegMap',
+)
+
+import mmap
+import os
+import sys
+
+from reg_value import RegValue
+
+#---------------------------------------------------------------------------------------------------
+# Direct register access through a memory mapping of the register space (a PCI BAR resource file,
+# e.g. /sys/bus/pci/devices/<bdf>/resource0, or any file standing in for one), bypassing the regio
+# object proxies.
+#
+# Register offsets and field masks/shifts are computed once from the regio YAML specifications
+# (load_layout()). A RawBlock presents the mapped registers with the same access patterns as a regio
+# proxy (int(block.reg), block.reg._r, block.reg().proxy.field, block.array[i], ...), so it can be
+# passed to any of the protocols; the reg_proxy, mem_proxy and packet memory protocols additionally
+# detect a RawBlock and run their hot paths directly on its `raw_words` memoryview, using word
+# indices from raw_index() and (shift, mask) pairs from raw_field().
+#
+# Registers are accessed one 32-bit word at a time (never by slice copies, which may be split into
+# wider or narrower bus accesses than the hardware supports).
+#---------------------------------------------------------------------------------------------------
+class RegSpec:
+    __slots__ = ('name', 'offset', 'count', 'access', 'fields')
+
+    def __init__(self, name, offset, count, access, fields):
+        self.name = name
+        self.offset = offset   # Word offset within the block.
+        self.count = count     # None for a single register.
+        self.access = access
+        self.fields = fields   # {name: (lsb, width)}
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.name!r}, offset={self.offset}, count={self.count})'
+
+class RegLayout:
+    # Layout of a register block (`regs`) or of a decoder (`interfaces`, mapping interface names to
+    # (byte offset, RegLayout) pairs).
+    def __init__(self, name, regs=None, interfaces=None, size=0):
+        self.name = name
+        self.regs = regs or {}
+        self.interfaces = interfaces or {}
+        self.size = size # Bytes.
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.name!r}, size=0x{self.size:x})'
+
+#---------------------------------------------------------------------------------------------------
+def _find_root(path, include):
+    # !include paths are relative to the repository root; search upwards from the including file.
+    directory = os.path.dirname(os.path.abspath(path))
+    while True:
+        if os.path.exists(os.path.join(directory, include)):
+            return directory
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            raise FileNotFoundError(f'Cannot resolve !include {include} from {path}')
+        directory = parent
+
+def _load_yaml(path, root=None):
+    # PyYAML (also a dependency of regio itself) is only needed to load layouts from the YAML
+    # specifications; RawBlock and RegMap work on any RegLayout.
+    try:
+        import yaml
+    except ImportError as e:
+        raise ImportError('Loading register layouts requires PyYAML (pip install pyyaml)') from e
+
+    class Loader(yaml.SafeLoader):
+        pass
+
+    def include(loader, node):
+        target = loader.construct_scalar(node)
+        if not target.endswith(('.yaml', '.yml')):
+            return target # e.g. protocol sources; not needed for the layout.
+        base = root if root is not None else _find_root(path, target)
+        return _load_yaml(os.path.join(base, target), base)
+
+    Loader.add_constructor('!include', include)
+    with open(path) as f:
+        return yaml.load(f, Loader)
+
+def _block_layout(spec):
+    regs = {}
+    default = {'width': 32, 'access': 'rw', 'init': 0}
+    offset = 0
+    for entry in spec.get('regs', []):
+        if 'default' in entry:
+            default = dict(default, **entry['default'])
+            continue
+        if 'name' not in entry:
+            raise ValueError(f'Unsupported register entry {entry!r} in block {spec.get("name")}')
+        width = entry.get('width', default['width'])
+        if width > 32:
+            raise ValueError(f'Register {entry["name"]} of {width}b not supported')
+        fields = {}
+        lsb = 0
+        for field in entry.get('fields', []):
+            fields[field['name']] = (lsb, field['width'])
+            lsb += field['width']
+        count = entry.get('count')
+        regs[entry['name']] = RegSpec(entry['name'], offset, count, entry.get('access', default['access']), fields)
+        offset += 1 if count is None else count
+    return RegLayout(spec.get('name'), regs=regs, size=4 * offset)
+
+def _decoder_layout(spec):
+    interfaces = {}
+    size = 0
+    for entry in spec.get('interfaces', []):
+        if 'block' in entry:
+            layout = _block_layout(entry['block'])
+        else:
+            layout = _decoder_layout(entry['decoder'])
+        address = entry.get('address', 0)
+        interfaces[entry['name']] = (address, layout)
+        size = max(size, address + (1 << entry['width'] if 'width' in entry else layout.size))
+    return RegLayout(spec.get('name'), interfaces=interfaces, size=size)
+
+def load_layout(path, root=None):
+    # Load the layout of a regio block or decoder YAML specification. `root` is the directory that
+    # !include paths are relative to (found by searching upwards from path by default).
+    spec = _load_yaml(path, root)
+    if 'interfaces' in spec:
+        return _decoder_layout(spec)
+    return _block_layout(spec)
+
+#---------------------------------------------------------------------------------------------------
+class _RawReg:
+    __slots__ = ('_words', '_index', '_fields')
+
+    def __init__(self, words, index, fields):
+        object.__setattr__(self, '_words', words)
+        object.__setattr__(self, '_index', index)
+        object.__setattr__(self, '_fields', fields)
+
+    def __call__(self, value=None):
+        if value is None:
+            value = self._words[self._index]
+        return RegValue(self._fields, value)
+
+    def __int__(self):
+        return self._words[self._index]
+
+    def __index__(self):
+        return self._words[self._index]
+
+    @property
+    def _r(self):
+        return self._words[self._index]
+
+    @_r.setter
+    def _r(self, value):
+        self._words[self._index] = int(value) & 0xffffffff
+
+    def __getattr__(self, name):
+        return getattr(self(), name)
+
+    def __setattr__(self, name, value):
+        if name == '_r':
+            object.__setattr__(self, name, value)
+            return
+        reg = self()
+        setattr(reg, name, value)
+        self._words[self._index] = int(reg)
+
+class RawBlock:
+    # Mapped register block (or decoder) at word offset `base` of the `words` memoryview.
+    def __init__(self, words, base, layout):
+        d = self.__dict__
+        d['raw_words'] = words
+        d['raw_base'] = base
+        d['raw_layout'] = layout
+        d['_regs'] = layout.regs
+        for (name, spec) in layout.regs.items():
+            index = base + spec.offset
+            if spec.count is None:
+                d[name] = _RawReg(words, index, spec.fields)
+            else:
+                d[name] = [_RawReg(words, index + i, spec.fields) for i in range(spec.count)]
+        for (name, (address, sublayout)) in layout.interfaces.items():
+            d[name] = RawBlock(words, base + address // 4, sublayout)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.raw_layout.name!r}, base=0x{4 * self.raw_base:x})'
+
+    def __setattr__(self, name, value):
+        spec = self._regs.get(name)
+        if spec is None or spec.count is not None:
+            raise AttributeError(f'Cannot assign to {name}')
+        self.raw_words[self.raw_base + spec.offset] = int(value) & 0xffffffff
+
+    # Hot path support. The raw_ prefix keeps these clear of register names.
+    def raw_index(self, name, index=0):
+        # Index in raw_words of a register.
+        return self.raw_base + self._regs[name].offset + index
+
+    def raw_field(self, name, field):
+        # (shift, mask) of a register field.
+        (lsb, width) = self._regs[name].fields[field]
+        return (lsb, (1 << width) - 1)
+
+#---------------------------------------------------------------------------------------------------
+class RegMap:
+    # Memory mapping of a register space described by `layout` (a RegLayout or the path of a YAML
+    # specification). `offset` (page aligned) and `size` select the mapped region of the file; the
+    # size defaults to that of the layout.
+    def __init__(self, path, layout, offset=0, size=None, writable=True):
+        if sys.byteorder != 'little':
+            raise RuntimeError('Mapped register access requires a little-endian host')
+        if not isinstance(layout, RegLayout):
+            layout = load_layout(layout)
+        self.path = path
+        self.layout = layout
+        size = layout.size if size is None else size
+        self._file = open(path, 'r+b' if writable else 'rb')
+        try:
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self._mmap = mmap.mmap(self._file.fileno(), size, access=access, offset=offset)
+        except Exception:
+            self._file.close()
+            raise
+        self._view = memoryview(self._mmap)
+        self.words = self._view.cast('I')
+        self.root = RawBlock(self.words, 0, layout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.words.release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def block(self, path=''):
+        # Block or decoder at a dotted interface path (e.g. 'data' or 'state.cache'), or the root.
+        block = self.root
+        for name in filter(None, path.split('.')):
+            block = getattr(block, name)
+        return block
@@ -4,79 +4,214 @@ __all__ = (
 )
 
 import time
+import types
 
 from regio.regmap.io import methods
 
 #---------------------------------------------------------------------------------------------------
 class Protocol(methods.Protocol):
-    def __init__(self, spec, if_name, timeout=100e-3, delay=1e-3):
+    def __init__(self, spec, if_name, timeout=100e-3, delay=1e-3, wait_policy=None, metrics=None):
         super().__init__(spec, if_name)
 
-        if timeout is None:
-            self.wait_count = None
-        elif timeout < delay:
+        if timeout is not None and timeout < delay:
             raise ValueError(f'Timeout {timeout} must be greater than the delay of {delay}')
-        elif delay > 0:
-            self.wait_delay = delay
-            self.wait_count = int(timeout / delay)
-        else:
-            self.wait_delay = 0
-            self.wait_count = 0
-
-    def _wait_status(self, proxy, test):
-        count = self.wait_count
-        while True:
-            status = proxy.status().proxy
-            if test(status):
-                return status
-
-            if count is None: # Loop infinitely for condition...
-                continue
-
-            if count <= 0:
-                return None
-            count -= 1
-            time.sleep(self.wait_delay)
-
-    def _transact(self, proxy, offset, value):
+        self.wait_timeout = timeout
+        self.wait_delay = delay
+        # Optional replacement for the built-in completion wait: any object with a wait(poll, test,
+        # record) method, such as proxy_wait.WaitPolicy.
+        self.wait_policy = wait_policy
+        self.metrics = metrics # Optional proxy_metrics.ProtocolMetrics instance.
+        self._raw = None
+
+    # BEGIN proxy_wait.INLINE_WAIT (generated by proxy_wait.py, do not edit)
+    # Completion wait (the proxy_wait.WaitPolicy algorithm, kept inline since this file is embedded
+    # into the regmap). The status is busy-polled for up to WAIT_SPIN seconds, then polled with an
+    # exponentially increasing sleep in between, from WAIT_MIN_DELAY up to the delay, until the
+    # timeout deadline (none for a timeout of None).
+    WAIT_SPIN = 50e-6
+    WAIT_MIN_DELAY = 10e-6
+    WAIT_BACKOFF = 2.0
+
+    def _wait(self, poll, test, record=None):
+        if self.wait_policy is not None:
+            return self.wait_policy.wait(poll, test, record)
+
+        status = poll()
+        polls = 1
+        slept = 0.0
+        if not test(status):
+            now = time.monotonic()
+            deadline = None if self.wait_timeout is None else now + self.wait_timeout
+            spin_end = now + self.WAIT_SPIN
+            delay = min(self.WAIT_MIN_DELAY, self.wait_delay)
+            while True:
+                if deadline is not None and now >= deadline:
+                    status = None
+                    break
+                if now >= spin_end:
+                    sleep = delay if deadline is None else min(delay, deadline - now)
+                    time.sleep(sleep)
+                    slept += sleep
+                    delay = min(delay * self.WAIT_BACKOFF, self.wait_delay)
+                status = poll()
+                polls += 1
+                if test(status):
+                    break
+                now = time.monotonic()
+
+        # Optional instrumentation (see proxy_metrics.OpRecord).
+        if record is not None:
+            record.polls += polls
+            record.sleep += slept
+        return status
+    # END proxy_wait.INLINE_WAIT
+
+    # Raw status register bits (see reg_proxy.yaml). The status register is clear-on-read, so each
+    # poll decodes all flags from a single read rather than through a field proxy.
+    STATUS_READY = 1 << 0
+    STATUS_DONE = 1 << 1
+    STATUS_ERROR = 1 << 2
+
+    def _wait_status(self, proxy, mask, record=None):
+        return self._wait(lambda: int(proxy.status), lambda st: st & mask, record)
+
+    @staticmethod
+    def _err_msg(addr, value):
+        if value is not None:
+            return f'writing value 0x{value:x} to register address 0x{addr:x}'
+        return f'reading from register address 0x{addr:x}'
+
+    def _transact(self, proxy, offset, value, ready=False):
         addr = offset << 2 # Register offset given in words, not bytes.
         do_write = value is not None
-        if do_write:
-            err_msg = f'writing value 0x{value:x} to register address 0x{addr:x}'
-        else:
-            err_msg = f'reading from register address 0x{addr:x}'
+        record = None
+        if self.metrics is not None:
+            record = self.metrics.start('reg_write' if do_write else 'reg_read')
 
-        # Setup for the transaction.
-        status = self._wait_status(proxy, lambda st: st.ready)
-        if status is None:
-            raise TimeoutError('Controller not ready for ' + err_msg)
+        # Setup for the transaction. The ready poll is skipped when the caller knows that the
+        # controller is idle (i.e. the previous transaction has already reported done).
+        if not ready:
+            status = self._wait_status(proxy, self.STATUS_READY, record)
+            if status is None:
+                raise TimeoutError('Controller not ready for ' + self._err_msg(addr, value))
 
         proxy.address = addr
+        writes = 1
         if do_write:
             proxy.wr_data = value
+            writes += 1
 
-        # Trigger the transaction.
-        cmd = proxy.command(0).proxy
-        cmd.wr_rd_n = int(do_write)
-        proxy.command = int(cmd)
+        # Trigger the transaction (command.wr_rd_n is bit 0 of the command register).
+        proxy.command = int(do_write)
+        writes += 1
 
         # Wait for the transaction to complete.
-        status = self._wait_status(proxy, lambda st: st.done or st.error)
+        status = self._wait_status(proxy, self.STATUS_DONE | self.STATUS_ERROR, record)
         if status is None:
-            raise TimeoutError('Controller timeout when ' + err_msg)
-        if status.error:
-            raise IOError('Transaction error ' + err_msg)
+            raise TimeoutError('Controller timeout when ' + self._err_msg(addr, value))
+        if status & self.STATUS_ERROR:
+            raise IOError('Transaction error ' + self._err_msg(addr, value))
 
         # Read the data fetched by the transaction.
+        reads = 0
+        if not do_write:
+            value = int(proxy.rd_data)
+            reads += 1
+        if record is not None:
+            record.reg_writes += writes
+            record.reg_reads += reads
+            self.metrics.finish(record, 4)
+        if not do_write:
+            return value
+
+    def _transact_raw(self, raw, offset, value, ready=False):
+        # Same transaction as _transact(), on the words of a mapped (reg_mmap.RawBlock) proxy.
+        addr = offset << 2
+        do_write = value is not None
+        record = None
+        if self.metrics is not None:
+            record = self.metrics.start('reg_write' if do_write else 'reg_read')
+        words = raw.words
+        status_index = raw.status
+        poll = lambda: words[status_index]
+
+        if not ready:
+            ready_mask = raw.ready
+            if self._wait(poll, lambda st: st & ready_mask, record) is None:
+                raise TimeoutError('Controller not ready for ' + self._err_msg(addr, value))
+
+        words[raw.address] = addr
+        writes = 1
+        if do_write:
+            words[raw.wr_data] = value & 0xffffffff
+            writes += 1
+        words[raw.command] = raw.write if do_write else 0
+        writes += 1
+
+        done_mask = raw.done | raw.error
+        status = self._wait(poll, lambda st: st & done_mask, record)
+        if status is None:
+            raise TimeoutError('Controller timeout when ' + self._err_msg(addr, value))
+        if status & raw.error:
+            raise IOError('Transaction error ' + self._err_msg(addr, value))
+
+        reads = 0
+        if not do_write:
+            value = words[raw.rd_data]
+            reads += 1
+        if record is not None:
+            record.reg_writes += writes
+            record.reg_reads += reads
+            self.metrics.finish(record, 4)
         if not do_write:
-            return int(proxy.rd_data)
+            return value
+
+    @staticmethod
+    def _raw_plan(proxy):
+        # Word indices and status/command masks for a mapped proxy (see reg_mmap.py), or None for a
+        # regio proxy.
+        if not hasattr(proxy, 'raw_words'):
+            return None
+        raw = types.SimpleNamespace(proxy=proxy, words=proxy.raw_words)
+        for name in ('command', 'status', 'address', 'wr_data', 'rd_data'):
+            setattr(raw, name, proxy.raw_index(name))
+        for name in ('ready', 'done', 'error'):
+            (shift, mask) = proxy.raw_field('status', name)
+            setattr(raw, name, mask << shift)
+        (shift, mask) = proxy.raw_field('command', 'wr_rd_n')
+        raw.write = mask << shift
+        return raw
+
+    def _transact_any(self, proxy, offset, value, ready=False):
+        raw = self._raw
+        if raw is not None and raw.proxy is proxy:
+            return self._transact_raw(raw, offset, value, ready)
+        return self._transact(proxy, offset, value, ready)
 
     def start(self, proxy):
         proxy.wr_byte_en = 0xf # Enable all byte lanes for writing.
+        self._raw = self._raw_plan(proxy)
         super().start(proxy)
 
     def read(self, proxy, offset, size):
-        return self._transact(proxy, offset, None)
+        return self._transact_any(proxy, offset, None)
 
     def write(self, proxy, offset, size, value):
-        self._transact(proxy, offset, int(value))
+        self._transact_any(proxy, offset, int(value))
+
+    def read_many(self, proxy, offsets):
+        # Read a batch of registers. The controller returns to ready as soon as a transaction is
+        # done, so only the first transaction of the batch polls for ready.
+        values = []
+        ready = False
+        for offset in offsets:
+            values.append(self._transact_any(proxy, offset, None, ready))
+            ready = True
+        return values
+
+    def write_many(self, proxy, pairs):
+        # Write a batch of (offset, value) pairs, polling for ready only before the first one.
+        ready = False
+        for (offset, value) in pairs:
+            self._transact_any(proxy, offset, int(value), ready)
+            ready = True
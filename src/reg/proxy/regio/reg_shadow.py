@@ -0,0 +1,37 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'RegShadow',
+)
+
+#---------------------------------------------------------------------------------------------------
+# Host-side shadow of the values last written to write-only/read-write proxy registers.
+#
+# Protocols route register writes through update(), which reports whether the write is needed:
+#
+#     if self.shadow.update('addr', addr):
+#         self.proxy.addr = addr
+#
+# Writes of an unchanged value are dropped. The shadow assumes that nothing but the owning protocol
+# modifies the shadowed registers; it must be invalidated whenever that does not hold (e.g. after a
+# block reset, or after the registers were written through another path). A disabled shadow
+# requests every write.
+class RegShadow:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._values = {}
+        self.skipped = 0
+
+    def update(self, key, value):
+        if not self.enabled:
+            return True
+        if self._values.get(key, self) == value:
+            self.skipped += 1
+            return False
+        self._values[key] = value
+        return True
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._values.clear()
+        else:
+            self._values.pop(key, None)
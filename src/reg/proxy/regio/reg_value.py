@@ -0,0 +1,42 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'RegValue',
+)
+
+#---------------------------------------------------------------------------------------------------
+# Register value with named field access (what calling a register returns in regio), shared by the
+# simulated (proxy_sim.py) and memory-mapped (reg_mmap.py) register blocks.
+class RegValue:
+    __slots__ = ('_fields', '_value')
+
+    def __init__(self, fields, value=0):
+        object.__setattr__(self, '_fields', fields)
+        object.__setattr__(self, '_value', int(value))
+
+    @property
+    def proxy(self):
+        return self
+
+    def __int__(self):
+        return self._value
+
+    def __index__(self):
+        return self._value
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(0x{self._value:08x})'
+
+    def __getattr__(self, name):
+        try:
+            (lsb, width) = self._fields[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        return (self._value >> lsb) & ((1 << width) - 1)
+
+    def __setattr__(self, name, value):
+        try:
+            (lsb, width) = self._fields[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        mask = ((1 << width) - 1) << lsb
+        object.__setattr__(self, '_value', (self._value & ~mask) | ((int(value) << lsb) & mask))
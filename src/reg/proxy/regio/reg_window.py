@@ -0,0 +1,42 @@
+#---------------------------------------------------------------------------------------------------
+__all__ = (
+    'RegWindow',
+)
+
+import struct
+
+#---------------------------------------------------------------------------------------------------
+# Precompiled layout of a byte array carried by a window of 32-bit registers, where register i holds
+# bytes 4i..4i+3 of the array (byte 4i in bits 7:0), as used for the packet metadata and the
+# mem_proxy data windows. `byteorder` gives the mapping between the array and an integer value:
+# 'big' when byte 0 holds the most significant byte (packet metadata), 'little' otherwise.
+#
+# Everything that depends only on the window size is computed once, so converting a value to or
+# from register words is a single integer conversion plus one struct call.
+class RegWindow:
+    def __init__(self, nbytes, byteorder='little', max_regs=None):
+        if byteorder not in ('big', 'little'):
+            raise ValueError(f'Unknown byte order {byteorder!r}')
+        self.nbytes = nbytes
+        self.byteorder = byteorder
+        self.nregs = -(-nbytes // 4)
+        if max_regs is not None and self.nregs > max_regs:
+            raise ValueError(f'{nbytes}B does not fit in a window of {max_regs} registers')
+        # Mask of the valid bits of a value, and of the valid bytes of the last register.
+        self.mask = (1 << (8 * nbytes)) - 1
+        self.last_mask = (1 << (8 * (nbytes - 4 * (self.nregs - 1)))) - 1 if nbytes else 0
+        self._pad = bytes(4 * self.nregs - nbytes)
+        self._struct = struct.Struct(f'<{self.nregs}I')
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.nbytes}, {self.byteorder!r})'
+
+    def to_words(self, value):
+        # Register words carrying value (truncated to the window size).
+        data = (value & self.mask).to_bytes(self.nbytes, self.byteorder) + self._pad
+        return self._struct.unpack(data)
+
+    def from_words(self, words):
+        # Value carried by the register words (bytes past the window size are ignored).
+        data = self._struct.pack(*words)
+        return int.from_bytes(data[:self.nbytes], self.byteorder)
@@ -0,0 +1,41 @@
+import json
+
+import proxy_bench
+from proxy_bench import compare
+
+def _case(ops_per_s=1000.0, accesses_per_byte=0.5):
+    return {'ops_per_s': ops_per_s, 'accesses_per_byte': accesses_per_byte}
+
+def test_compare():
+    baseline = {'a': _case(), 'b': _case(), 'c': _case()}
+    results = {'a': _case(ops_per_s=100.0), 'b': _case(accesses_per_byte=0.75), 'd': _case()}
+    assert compare(results, baseline) == [
+        ('b', '0.750 accesses/B vs. baseline 0.500 accesses/B'),
+        ('c', 'not run'),
+    ]
+    assert [name for (name, _) in compare(results, baseline, tolerance=0.25)] == ['a', 'b', 'c']
+    assert compare(baseline, baseline, tolerance=0.0) == []
+
+def _main(tmp_path, *args):
+    return proxy_bench.main(['--quick', '--suite', 'packet', '--wait', 'sleep', '--latency', '0',
+                             '--duration', '0', *args])
+
+def test_main_baseline(tmp_path, capsys):
+    path = tmp_path / 'baseline.json'
+    assert _main(tmp_path, '--save-baseline', str(path)) == 0
+    assert _main(tmp_path, '--baseline', str(path), '--accesses-only') == 0
+    assert capsys.readouterr().out.endswith('PASS\n')
+
+    # Baseline cases of the selected suites that were not run fail the check, others are ignored.
+    report = json.loads(path.read_text())
+    cases = report['cases']
+    case = next(iter(cases.values()))
+    cases['packet.write/size=128/burst=64/wait=sleep/lat=0'] = case
+    cases['reg.read/regs=1/wait=sleep/lat=0'] = case
+    path.write_text(json.dumps(report))
+    assert _main(tmp_path, '--baseline', str(path), '--accesses-only') == 1
+    out = capsys.readouterr().out
+    assert 'REGRESSION packet.write/size=128/burst=64/wait=sleep/lat=0: not run' in out
+    assert 'reg.read' not in out
+    assert out.endswith('FAIL (1 regressions)\n')
+    assert _main(tmp_path, '--baseline', str(path), '--accesses-only', '--match', 'readinto') == 0
@@ -0,0 +1,140 @@
+import os
+import time
+
+import pytest
+
+import proxy_wait
+from proxy_metrics import OpRecord
+from proxy_wait import INLINE_FILES, INLINE_WAIT, WaitPolicy, update_inline
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), *[os.pardir] * 5)
+
+class Clock:
+    # Simulated time: each poll takes POLL seconds, and sleeps are recorded rather than slept.
+    POLL = 10e-6
+
+    def __init__(self, monkeypatch):
+        self.now = 0.0
+        self.sleeps = []
+        monkeypatch.setattr(time, 'monotonic', lambda: self.now)
+        monkeypatch.setattr(time, 'sleep', self.sleep)
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+def _inline(timeout, delay):
+    # INLINE_WAIT as the methods of a bare class (the embedded protocols need regio).
+    scope = {'time': time}
+    exec(f'class Inline:\n    wait_policy = None\n{INLINE_WAIT}', scope)
+    inline = scope['Inline']()
+    (inline.wait_timeout, inline.wait_delay) = (timeout, delay)
+    return inline._wait
+
+def _protocol(module):
+    def wait(timeout, delay):
+        pytest.importorskip('regio')
+        return __import__(module).Protocol(None, 'proxy', timeout=timeout, delay=delay)._wait
+    return wait
+
+WAITS = {
+    'policy': lambda timeout, delay: WaitPolicy(timeout, delay).wait,
+    'inline': _inline,
+    'reg_proxy': _protocol('reg_proxy_protocol'),
+    'mem_proxy': _protocol('mem_proxy_protocol'),
+}
+
+# (timeout, delay, number of polls until done or None for never).
+CASES = [
+    (10e-3, 1e-3, 1),     # Done on the first poll.
+    (10e-3, 1e-3, 4),     # Done while spinning.
+    (10e-3, 1e-3, 20),    # Done while backing off.
+    (10e-3, 1e-3, None),  # Timeout, with the last sleep cut short.
+    (1e-3, 1e-3, None),
+    (10e-3, 0.0, None),   # No sleep.
+    (None, 1e-3, 40),     # No timeout.
+]
+
+def _run(wait, monkeypatch, done):
+    clock = Clock(monkeypatch)
+    polls = []
+    def poll():
+        clock.now += Clock.POLL
+        polls.append(clock.now)
+        return len(polls)
+    record = OpRecord('wait')
+    status = wait(poll, lambda status: done is not None and status >= done, record)
+    return (status, len(polls), clock.sleeps, record.polls, record.sleep)
+
+@pytest.mark.parametrize('name', list(WAITS)[1:])
+@pytest.mark.parametrize(('timeout', 'delay', 'done'), CASES)
+def test_wait(monkeypatch, name, timeout, delay, done):
+    # All the waits poll and sleep exactly like WaitPolicy.wait().
+    expected = _run(WAITS['policy'](timeout, delay), monkeypatch, done)
+    assert _run(WAITS[name](timeout, delay), monkeypatch, done) == expected
+
+    (status, polls, sleeps, record_polls, record_sleep) = expected
+    assert status == done and polls == record_polls
+    assert record_sleep == sum(sleeps)
+    if done is None:
+        # The deadline starts after the first poll, and is checked after each poll.
+        assert timeout <= Clock.POLL * polls + record_sleep <= timeout + 3 * Clock.POLL
+    else:
+        assert polls == done
+
+def test_wait_phases(monkeypatch):
+    # Spin for 50us (5 polls of 10us after the first one), then back off from 10us up to the delay.
+    (status, polls, sleeps, _, _) = _run(WaitPolicy(10e-3, 1e-3).wait, monkeypatch, 20)
+    assert sleeps == [10e-6, 20e-6, 40e-6, 80e-6, 160e-6, 320e-6, 640e-6] + [1e-3] * 7
+    assert polls == 1 + 5 + len(sleeps) == 20
+
+def test_delays():
+    delays = WaitPolicy(delay=1e-3, min_delay=1e-4, backoff=2.0).delays()
+    assert [next(delays) for _ in range(6)] == [1e-4, 2e-4, 4e-4, 8e-4, 1e-3, 1e-3]
+    delays = WaitPolicy(delay=1e-3, min_delay=1e-4, backoff=1.0).delays()
+    assert [next(delays) for _ in range(3)] == [1e-4] * 3
+    # The minimum delay is capped to the delay.
+    delays = WaitPolicy(delay=5e-6).delays()
+    assert [next(delays) for _ in range(3)] == [5e-6] * 3
+
+def test_inline_defaults():
+    scope = {'time': time}
+    exec(f'class Inline:\n{INLINE_WAIT}', scope)
+    policy = WaitPolicy()
+    assert (scope['Inline'].WAIT_SPIN, scope['Inline'].WAIT_MIN_DELAY, scope['Inline'].WAIT_BACKOFF) == \
+           (policy.spin, policy.min_delay, policy.backoff)
+
+@pytest.mark.parametrize('path', INLINE_FILES)
+def test_inline_files(path):
+    # The embedded copies are up to date (run proxy_wait.py otherwise).
+    assert not update_inline(os.path.join(ROOT, path), check=True)
+
+def _copy(tmp_path, path, edit=lambda text: text):
+    with open(os.path.join(ROOT, path)) as f:
+        text = f.read()
+    copy = tmp_path / path
+    copy.parent.mkdir(parents=True, exist_ok=True)
+    copy.write_text(edit(text))
+    return (copy, text)
+
+def test_update_inline(tmp_path):
+    (path, text) = _copy(tmp_path, INLINE_FILES[0],
+                         lambda text: text.replace('WAIT_BACKOFF = 2.0', 'WAIT_BACKOFF = 3.0'))
+    assert update_inline(path, check=True)
+    assert path.read_text() != text
+    assert update_inline(path)
+    assert path.read_text() == text
+    assert not update_inline(path)
+
+    path.write_text('class Protocol:\n    pass\n')
+    with pytest.raises(ValueError, match='No generated wait'):
+        update_inline(path)
+
+def test_main(tmp_path, capsys):
+    for path in INLINE_FILES:
+        _copy(tmp_path, path, lambda text: text.replace('return status\n    # END', 'return  status\n    # END'))
+    assert proxy_wait.main(['--check', '--root', str(tmp_path)]) == 1
+    assert proxy_wait.main(['--root', str(tmp_path)]) == 0
+    assert proxy_wait.main(['--check', '--root', str(tmp_path)]) == 0
+    assert capsys.readouterr().out == ''.join(f'{path}: out of date\n' for path in INLINE_FILES) + \
+                                      ''.join(f'{path}: updated\n' for path in INLINE_FILES)
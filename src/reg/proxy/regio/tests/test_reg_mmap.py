@@ -0,0 +1,123 @@
+import os
+
+import pytest
+
+from mem_proxy_sim import MemProxySim
+from proxy_sim import RegProxySim, SimRawBlock
+from reg_mmap import RawBlock, RegLayout, RegMap, RegSpec, load_layout
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), *[os.pardir] * 5))
+REG_PROXY_YAML = os.path.join(ROOT, 'src/reg/proxy/regio/reg_proxy.yaml')
+MEM_PROXY_YAML = os.path.join(ROOT, 'src/mem/proxy/regio/mem_proxy.yaml')
+CAPTURE_YAML = os.path.join(ROOT, 'src/packet/regio/packet_capture_decoder.yaml')
+
+def _layout():
+    # Block of two single registers and a register array, without a YAML specification.
+    return RegLayout('test', regs={
+        'control': RegSpec('control', 0, None, 'rw', {'enable': (0, 1), 'mode': (4, 4)}),
+        'status': RegSpec('status', 1, None, 'ro', {}),
+        'data': RegSpec('data', 2, 4, 'rw', {}),
+    }, size=24)
+
+@pytest.fixture
+def regfile(tmp_path):
+    path = tmp_path / 'resource0'
+    path.write_bytes(bytes(4096))
+    return path
+
+def test_regmap(regfile):
+    with RegMap(regfile, _layout()) as regmap:
+        block = regmap.block()
+        block.status = 0x12345678
+        block.data[2]._r = 0xdeadbeef
+        block.control.mode = 5
+        block.control.enable = 1
+        assert int(block.status) == 0x12345678
+        assert block.control().proxy.mode == 5
+        assert block.control.enable == 1
+        assert [int(reg) for reg in block.data] == [0, 0, 0xdeadbeef, 0]
+        with pytest.raises(AttributeError):
+            block.data = 1
+    # Registers are little-endian 32-bit words at their offsets.
+    contents = regfile.read_bytes()
+    assert contents[:24] == bytes.fromhex('51000000 78563412 00000000 00000000 efbeadde 00000000')
+
+def test_regmap_read_only(regfile):
+    regfile.write_bytes(bytes.fromhex('01000000 02000000') + bytes(4088))
+    with RegMap(regfile, _layout(), writable=False) as regmap:
+        assert int(regmap.root.status) == 2
+        assert regmap.root.control.enable == 1
+        with pytest.raises(TypeError):
+            regmap.root.status = 3
+
+def test_regmap_offset(regfile):
+    # The mapping starts at a page aligned offset of the file.
+    regfile.write_bytes(bytes(4096) + bytes.fromhex('aa000000') + bytes(4092))
+    with RegMap(regfile, _layout(), offset=4096) as regmap:
+        assert int(regmap.root.control) == 0xaa
+
+def test_load_layout():
+    pytest.importorskip('yaml')
+    layout = load_layout(REG_PROXY_YAML)
+    assert (layout.name, layout.size) == ('reg_proxy', 24)
+    block = RawBlock(None, 0, layout)
+    assert [block.raw_index(name) for name in ('command', 'status', 'address', 'wr_data', 'rd_data')] == \
+           [0, 1, 2, 3, 5]
+    assert [block.raw_field('status', name) for name in ('ready', 'done', 'error')] == [(0, 1), (1, 1), (2, 1)]
+    assert block.raw_field('command', 'wr_rd_n') == (0, 1)
+
+def test_load_layout_include():
+    # The decoder !includes the block specifications, relative to the repository root.
+    pytest.importorskip('yaml')
+    layout = load_layout(CAPTURE_YAML)
+    assert sorted(layout.interfaces) == ['control', 'counts', 'data']
+    (address, mem) = layout.interfaces['data']
+    assert (address, mem.name) == (0x400, 'mem_proxy')
+    assert layout.size == 0x400 + (1 << 10)
+    block = RawBlock(None, 0, layout)
+    assert block.data.raw_index('status') == 0x400 // 4 + mem.regs['status'].offset
+    assert block.data.raw_index('rd_data', 3) == 0x400 // 4 + mem.regs['rd_data'].offset + 3
+    assert block.data.raw_field('status', 'burst_size') == (11, 0x1ff)
+
+def test_load_layout_include_root(tmp_path):
+    yaml = pytest.importorskip('yaml')
+    (tmp_path / 'blocks').mkdir()
+    with open(tmp_path / 'blocks' / 'block.yaml', 'w') as f:
+        yaml.safe_dump({'name': 'block', 'regs': [{'name': 'a'}, {'name': 'b', 'count': 2}]}, f)
+    (tmp_path / 'top.yaml').write_text('name: top\n'
+                                       'interfaces:\n'
+                                       '  - block: !include blocks/block.yaml\n'
+                                       '    address: 0x20\n'
+                                       '    name: sub\n')
+    layout = load_layout(tmp_path / 'top.yaml', root=tmp_path)
+    assert layout.size == 0x20 + 12
+    block = RawBlock(None, 0, layout)
+    assert block.sub.raw_index('b', 1) == 0x20 // 4 + 2
+
+def test_load_layout_wide_register(tmp_path):
+    pytest.importorskip('yaml')
+    (tmp_path / 'wide.yaml').write_text('name: wide\nregs:\n  - name: a\n    width: 64\n')
+    with pytest.raises(ValueError, match='64b not supported'):
+        load_layout(tmp_path / 'wide.yaml')
+
+def test_regmap_yaml(regfile):
+    pytest.importorskip('yaml')
+    with RegMap(regfile, CAPTURE_YAML) as regmap:
+        data = regmap.block('data')
+        data.addr = 0x55
+        assert regmap.words[data.raw_index('addr')] == 0x55
+
+@pytest.mark.parametrize(('sim', 'path'), [(RegProxySim, REG_PROXY_YAML), (MemProxySim, MEM_PROXY_YAML)],
+                         ids=['reg_proxy', 'mem_proxy'])
+def test_sim_layout(sim, path):
+    # The simulated controllers lay out their registers as in the specification, so the raw paths
+    # run against them (through SimRawBlock) see the same word indices and fields as on a RegMap.
+    pytest.importorskip('yaml')
+    layout = load_layout(path)
+    block = RawBlock(None, 0, layout)
+    raw = SimRawBlock(sim())
+    for (name, spec) in layout.regs.items():
+        assert raw.raw_index(name) == block.raw_index(name)
+        for field in spec.fields:
+            assert raw.raw_field(name, field) == block.raw_field(name, field)
+    assert len(raw.raw_words) == layout.size // 4
@@ -0,0 +1,137 @@
+import pytest
+
+# The protocol derives from the regio Protocol class.
+pytest.importorskip('regio')
+
+import reg_proxy_protocol
+from proxy_metrics import ProtocolMetrics
+from proxy_sim import RegProxySim
+from proxy_wait import WaitPolicy
+
+@pytest.fixture
+def sim(as_proxy):
+    return as_proxy(RegProxySim(size=4096))
+
+@pytest.fixture
+def protocol(sim):
+    protocol = reg_proxy_protocol.Protocol(None, 'reg_proxy', timeout=10e-3)
+    protocol.start(sim)
+    return protocol
+
+def test_raw_plan(sim, protocol, raw):
+    assert (protocol._raw is not None) == raw
+
+def test_read_write(sim, protocol):
+    protocol.write(sim, 3, 4, 0x12345678)
+    assert sim.target[3] == 0x12345678
+    sim.target[7] = 0xdeadbeef
+    assert protocol.read(sim, 7, 4) == 0xdeadbeef
+    assert sim.commands == 2
+
+def test_write_byte_enables(sim, protocol):
+    # start() enables all byte lanes.
+    sim.poke('wr_byte_en', 0)
+    protocol.start(sim)
+    protocol.write(sim, 0, 4, 0xa5a5a5a5)
+    assert sim.target[0] == 0xa5a5a5a5
+
+def test_read_many_write_many(sim, protocol):
+    pairs = [(offset, offset * 0x01010101) for offset in range(0, 64, 3)]
+    protocol.write_many(sim, pairs)
+    assert [sim.target[offset] for (offset, _) in pairs] == [value for (_, value) in pairs]
+    assert protocol.read_many(sim, [offset for (offset, _) in pairs]) == [value for (_, value) in pairs]
+    assert sim.commands == 2 * len(pairs)
+
+def test_batch_skips_ready_polls(sim, protocol):
+    offsets = list(range(32))
+    sim.reset_counters()
+    for offset in offsets:
+        protocol.read(sim, offset, 4)
+    single = sim.reads
+    sim.reset_counters()
+    protocol.read_many(sim, offsets)
+    assert sim.reads == single - (len(offsets) - 1)
+
+def test_empty_batches(sim, protocol):
+    assert protocol.read_many(sim, []) == []
+    protocol.write_many(sim, [])
+    assert sim.commands == 0
+
+def test_transaction_error(sim, protocol):
+    # Beyond the proxied register space.
+    with pytest.raises(IOError, match='Transaction error'):
+        protocol.read(sim, 1024, 4)
+    with pytest.raises(IOError, match='writing value 0x1'):
+        protocol.write(sim, 1024, 4, 1)
+    # The controller is usable again after an error.
+    protocol.write(sim, 1, 4, 2)
+    assert protocol.read(sim, 1, 4) == 2
+
+@pytest.mark.parametrize('fault', ['error', 'timeout'])
+def test_fault(sim, protocol, fault):
+    # The reg_proxy has no timeout flag: a transaction timeout is reported as an error.
+    sim.fail_next(fault)
+    with pytest.raises(IOError):
+        protocol.read(sim, 0, 4)
+    assert protocol.read(sim, 0, 4) == 0
+
+def test_batch_error(sim, protocol):
+    sim.fail_next('error')
+    with pytest.raises(IOError):
+        protocol.write_many(sim, [(0, 1), (1, 2)])
+    assert sim.target[:2] == [0, 0]
+
+def test_controller_timeout(as_proxy):
+    sim = as_proxy(RegProxySim(op_delay=50e-3))
+    protocol = reg_proxy_protocol.Protocol(None, 'reg_proxy', timeout=5e-3, delay=1e-3)
+    protocol.start(sim)
+    with pytest.raises(TimeoutError, match='Controller timeout'):
+        protocol.write(sim, 0, 4, 1)
+    with pytest.raises(TimeoutError, match='not ready'):
+        protocol.read(sim, 0, 4)
+
+def test_slow_controller(as_proxy):
+    sim = as_proxy(RegProxySim(op_delay=2e-3))
+    protocol = reg_proxy_protocol.Protocol(None, 'reg_proxy')
+    protocol.start(sim)
+    protocol.write(sim, 5, 4, 55)
+    assert protocol.read(sim, 5, 4) == 55
+
+def test_timeout_validation():
+    with pytest.raises(ValueError):
+        reg_proxy_protocol.Protocol(None, 'reg_proxy', timeout=1e-4, delay=1e-3)
+    reg_proxy_protocol.Protocol(None, 'reg_proxy', timeout=None)
+
+def test_wait_policy(sim):
+    policy = WaitPolicy(10e-3)
+    calls = []
+    wait = policy.wait
+    policy.wait = lambda *args: calls.append(args) or wait(*args)
+    protocol = reg_proxy_protocol.Protocol(None, 'reg_proxy', wait_policy=policy)
+    protocol.start(sim)
+    protocol.write(sim, 0, 4, 1)
+    assert len(calls) == 2
+
+def test_metrics(sim):
+    metrics = ProtocolMetrics()
+    protocol = reg_proxy_protocol.Protocol(None, 'reg_proxy', metrics=metrics)
+    protocol.start(sim)
+    protocol.write_many(sim, [(0, 1), (1, 2)])
+    protocol.read(sim, 0, 4)
+    stats = metrics.as_dict()
+    assert stats['reg_write']['count'] == 2
+    assert stats['reg_read']['count'] == 1
+
+def test_metrics_accesses(sim):
+    # The recorded register accesses (status polls included) match those seen by the controller.
+    metrics = ProtocolMetrics()
+    protocol = reg_proxy_protocol.Protocol(None, 'reg_proxy', metrics=metrics)
+    protocol.start(sim)
+    sim.reset_counters()
+    protocol.write_many(sim, [(0, 1), (1, 2)])
+    protocol.read(sim, 0, 4)
+    protocol.read_many(sim, [0, 1])
+    stats = metrics.as_dict()
+    assert sum(op['reg_reads'] for op in stats.values()) == sim.reads
+    assert sum(op['reg_writes'] for op in stats.values()) == sim.writes
+    assert sum(op['polls'] for op in stats.values()) == sim.polls
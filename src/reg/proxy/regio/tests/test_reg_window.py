@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from reg_window import RegWindow
+
+# Window sizes in bits, mostly not multiples of 32.
+BITS = [1, 8, 12, 24, 31, 32, 33, 45, 64, 100, 127, 257]
+
+def _set_meta(meta, nbytes):
+    # Packet metadata registers as written by the original playback protocol, byte by byte: the
+    # most significant byte in bits 7:0 of register 0.
+    meta_bytes = []
+    for i in range(nbytes):
+        meta_bytes.append(meta & 0xff)
+        meta >>= 8
+    regs = []
+    for i in range(-(-nbytes // 4)):
+        meta_reg = 0
+        for j in range(4):
+            if i * 4 + j < nbytes:
+                meta_reg += meta_bytes.pop() << 8 * j
+        regs.append(meta_reg)
+    return regs
+
+def _get_meta(regs, nbytes):
+    # Packet metadata as read by the original capture protocol.
+    meta = 0
+    for (i, meta_reg) in enumerate(regs):
+        for j in range(4):
+            if i * 4 + j < nbytes:
+                meta = (meta << 8) + (meta_reg & 0xff)
+                meta_reg >>= 8
+    return meta
+
+def _set_data(value, nbytes):
+    # mem_proxy data window: least significant word first.
+    return [(value >> (32 * i)) & 0xffffffff for i in range(-(-nbytes // 4))]
+
+def _get_data(regs, nbytes):
+    value = 0
+    for reg in reversed(regs):
+        value = (value << 32) | reg
+    return value & ((1 << (8 * nbytes)) - 1)
+
+@pytest.mark.parametrize('bits', BITS)
+def test_big(bits):
+    nbytes = -(-bits // 8)
+    window = RegWindow(nbytes, 'big')
+    assert window.nregs == -(-nbytes // 4)
+    rand = random.Random(bits)
+    for value in [0, 1, (1 << bits) - 1] + [rand.getrandbits(bits) for _ in range(20)]:
+        words = window.to_words(value)
+        assert list(words) == _set_meta(value, nbytes)
+        assert window.from_words(words) == _get_meta(words, nbytes) == value
+
+@pytest.mark.parametrize('bits', BITS)
+def test_little(bits):
+    nbytes = -(-bits // 8)
+    window = RegWindow(nbytes)
+    rand = random.Random(bits)
+    for value in [0, 1, (1 << bits) - 1] + [rand.getrandbits(bits) for _ in range(20)]:
+        words = window.to_words(value)
+        assert list(words) == _set_data(value, nbytes)
+        assert window.from_words(words) == _get_data(words, nbytes) == value
+
+def test_big_order():
+    # 5 bytes: 0x01 is the most significant byte, in bits 7:0 of register 0.
+    window = RegWindow(5, 'big')
+    assert window.to_words(0x0102030405) == (0x04030201, 0x05)
+    assert RegWindow(5).to_words(0x0102030405) == (0x02030405, 0x01)
+
+@pytest.mark.parametrize('byteorder', ['big', 'little'])
+def test_truncate(byteorder):
+    # Values are truncated to the window, and bytes of the last register past the window ignored.
+    window = RegWindow(3, byteorder)
+    assert window.from_words(window.to_words(0xff123456)) == 0x123456
+    assert window.from_words([window.to_words(0x123456)[0] | 0xff000000]) == 0x123456
+    assert window.last_mask == 0xffffff
+
+def test_errors():
+    with pytest.raises(ValueError, match='byte order'):
+        RegWindow(4, 'middle')
+    with pytest.raises(ValueError, match='does not fit'):
+        RegWindow(9, 'big', max_regs=2)
+    assert RegWindow(8, 'big', max_regs=2).nregs == 2
+
+def test_empty():
+    window = RegWindow(0, 'big')
+    assert (window.nregs, window.to_words(5)) == (0, ())
+    assert window.from_words([]) == 0